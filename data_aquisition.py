@@ -2,5 +2,79 @@
 
 #   For the data aquisition/plotting window
 
+import Queue
+import Tkinter
+import numpy
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from qubit_shared import *
 
-from matplotlib import pyplot as pp
+class DataWindow:
+    """A window that plots the data of a sweep running in another process (see startAcquisition) straight from the shared memory, checking for new points every pollInterval ms"""
+    def __init__(self, root, dataset, process=None, pollInterval=200, title='Data'):
+        self.root = root
+        self.dataset = dataset
+        self.process = process #the AcquisitionProcess, for showing its errors
+        self.pollInterval = pollInterval
+        self.lastSequence = 0 #the sequence count of the data last drawn
+        self.errorPolls = 10 #how many more times to check for the error of a failed sweep before giving up on it
+
+        self.window = Tkinter.Toplevel(root)
+        self.window.title(title)
+        self.figure = Figure(figsize=(6, 4))
+        self.axes = self.figure.add_subplot(111)
+        self.canvas = FigureCanvasTkAgg(self.figure, master=self.window)
+        self.canvas.get_tk_widget().pack(fill='both', expand=True)
+        self.status = Tkinter.StringVar(value='Waiting for data')
+        Tkinter.Label(self.window, textvariable=self.status, anchor='w').pack(fill='x')
+
+        data = self.dataset.data
+        if data.ndim == 2:
+            self.artist = self.axes.imshow(data, aspect='auto', origin='lower', interpolation='nearest')
+        else:
+            (self.artist,) = self.axes.plot(data.reshape(-1), marker='.')
+        self.poll()
+
+    def poll(self):
+        """Redraws the plot if the data has changed since it was last drawn, and checks again in pollInterval ms until the sweep is over"""
+        finished = self.dataset.finished() #checked first, so the last points are drawn after it's over
+        sequence = self.dataset.changedSince(self.lastSequence)
+        if sequence != None:
+            self.redraw()
+            if self.dataset.unchangedSince(sequence): #otherwise a point was written while drawing; draw again next time
+                self.lastSequence = sequence
+        if finished and (sequence == None):
+            self.showFinished()
+        else:
+            self.root.after(self.pollInterval, self.poll)
+
+    def redraw(self):
+        """Draws the data as it is in the shared memory now"""
+        data = self.dataset.data
+        measured = numpy.count_nonzero(~numpy.isnan(data))
+        if data.ndim == 2:
+            self.artist.set_data(data)
+            if measured > 0:
+                self.artist.set_clim(numpy.nanmin(data), numpy.nanmax(data))
+        else:
+            self.artist.set_ydata(data.reshape(-1))
+            self.axes.relim()
+            self.axes.autoscale_view()
+        self.canvas.draw_idle()
+        self.status.set('{} of {} points'.format(measured, data.size))
+
+    def showFinished(self):
+        """Shows that the sweep is over, and why if it failed. The error is only ever checked for, never waited for, since this runs on the GUI's thread: the queue may not have it yet when the sweep's state changes, so it's checked again in pollInterval ms (until errorPolls runs out, leaving the shared status line)."""
+        if self.dataset.state.value == SharedDataset.failed:
+            if self.process == None:
+                self.status.set('Sweep failed: unknown error')
+                return
+            try:
+                self.status.set('Sweep failed: {}'.format(self.process.errors.get_nowait()))
+            except Queue.Empty:
+                self.status.set(self.dataset.statusText())
+                self.errorPolls -= 1
+                if self.errorPolls > 0:
+                    self.root.after(self.pollInterval, self.showFinished)
+        else:
+            self.status.set('Sweep done: {} points'.format(self.dataset.data.size))
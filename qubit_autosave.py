@@ -0,0 +1,176 @@
+import os
+import threading
+import Queue
+import yaml
+
+experimentKinds = ('times', 'values', 'traces') #the parts of an experiment that are lists of named objects
+generationKey = 'autosaveGeneration' #the key in a compacted save of its generation; it isn't part of the experiment
+
+def previousAutosavePath(path):
+    """Returns where an Autosaver saving to path keeps the save left by the last session"""
+    return path + '.previous'
+
+def replaceFile(path, data, mode='w'):
+    """Writes data to a temporary file and then renames it to path, so the old file stays whole if the program stops part way through"""
+    temporaryPath = path + '.tmp'
+    f = open(temporaryPath, mode)
+    f.write(data)
+    f.flush()
+    os.fsync(f.fileno())
+    f.close()
+    if os.name == 'nt' and os.path.exists(path): #rename won't replace a file on Windows
+        os.remove(path)
+    os.rename(temporaryPath, path)
+
+def experimentRecords(experiment):
+    """Splits an experiment dict (like the one Interface.toDict returns) in to records that can be saved separately: a dict of (kind, name) to each time's, value's, and trace's dict, plus ('settings', None) to everything else"""
+    records = {}
+    for kind in experimentKinds:
+        for item in experiment[kind]:
+            records[(kind, item['name'])] = item
+    settings = dict((k, v) for (k, v) in experiment.items() if k not in experimentKinds)
+    settings['order'] = dict((kind, [item['name'] for item in experiment[kind]]) for kind in experimentKinds)
+    records[('settings', None)] = settings
+    return records
+
+def experimentFromRecords(records):
+    """Puts the records made by experimentRecords back together in to an experiment dict"""
+    experiment = dict(records[('settings', None)])
+    order = experiment.pop('order')
+    for kind in experimentKinds:
+        experiment[kind] = [records[(kind, name)] for name in order[kind]]
+    return experiment
+
+def changedRecords(old, new):
+    """Returns a list of (key, record) for the records that are different in new than in old. Records that are gone from new are given as (key, None)."""
+    changes = [(key, record) for (key, record) in new.items() if old.get(key) != record]
+    changes.extend((key, None) for key in old if key not in new)
+    return changes
+
+def readJournal(journalPath, generation=0):
+    """Returns the list of (key, record) changes in the journal, leaving out a change that was only partly written and any made on top of a save older than the given generation"""
+    if not os.path.exists(journalPath):
+        return []
+    f = open(journalPath, 'r')
+    text = f.read()
+    f.close()
+    changes = []
+    for document in text.split('\n...\n')[:-1]: #every complete change ends with '...'; anything after the last one is incomplete
+        try:
+            change = yaml.load(document)
+        except yaml.YAMLError:
+            break
+        if change.get('generation', 0) >= generation:
+            changes.append((tuple(change['key']), change['record']))
+    return changes
+
+def loadAutosave(path):
+    """Returns the experiment dict saved by an Autosaver to path: the last compacted save with the changes from the journal applied. Returns None if nothing has been saved."""
+    if not os.path.exists(path):
+        return None
+    f = open(path, 'r')
+    saved = yaml.load(f)
+    f.close()
+    generation = saved.pop(generationKey, 0)
+    records = experimentRecords(saved)
+    for (key, record) in readJournal(path + '.journal', generation):
+        if record == None:
+            records.pop(key, None)
+        else:
+            records[key] = record
+    return experimentFromRecords(records)
+
+class Autosaver:
+    """Saves the experiment every so often without holding up the GUI: the changed times, values, and traces are appended to a journal by a background thread, and every compactEvery changes the whole experiment is saved and the journal emptied"""
+    def __init__(self, interface, path, interval=10000, compactEvery=200):
+        self.interface = interface
+        self.path = path
+        self.journalPath = path + '.journal'
+        self.previousPath = previousAutosavePath(path)
+        self.interval = interval
+        self.compactEvery = compactEvery
+        self.saved = None #the records as of the last snapshot; None until the first one is taken
+        self.journalLength = 0 #how many changes have been written to the journal since it was last compacted
+        self.generation = 0 #the generation of the last save written; only used by the background thread
+        self.jobs = Queue.Queue() #work for the background thread
+        self.afterID = None
+        self.error = None #holds the last exception the background thread ran in to, if any
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+
+    def start(self):
+        """Keeps the last session's save, then starts the background thread and the periodic snapshots"""
+        self.keepPrevious()
+        self.thread.start()
+        self.afterID = self.interface.root.after(self.interval, self.tick)
+
+    def keepPrevious(self):
+        """Moves the save and journal left by the last session to previousPath, replacing any older one"""
+        if os.path.exists(self.path):
+            for (old, new) in [(self.path, self.previousPath), (self.journalPath, self.previousPath + '.journal')]:
+                if os.path.exists(new):
+                    os.remove(new)
+                if os.path.exists(old):
+                    os.rename(old, new)
+
+    def stop(self):
+        """Saves any last changes, stops the snapshots, and waits for the background thread to finish writing"""
+        if self.afterID != None:
+            self.interface.root.after_cancel(self.afterID)
+            self.afterID = None
+        self.snapshot()
+        self.jobs.put(None)
+        self.thread.join()
+
+    def tick(self):
+        """Takes a snapshot and schedules the next one; called by Tk every interval ms"""
+        self.snapshot()
+        self.afterID = self.interface.root.after(self.interval, self.tick)
+
+    def snapshot(self):
+        """Compares the experiment with the last snapshot and queues the changes to be written. This runs on the GUI thread, so it doesn't do any dumping or writing itself."""
+        records = experimentRecords(self.interface.toDict())
+        if self.saved == None: #the first snapshot starts off a new save
+            changes = records.items()
+        else:
+            changes = changedRecords(self.saved, records)
+        if len(changes) > 0:
+            self.journalLength += len(changes)
+            if (self.saved == None) or (self.journalLength >= self.compactEvery):
+                self.jobs.put(('compact', records))
+                self.journalLength = 0
+            else:
+                self.jobs.put(('journal', changes))
+        self.saved = records
+
+    def run(self):
+        """Writes the queued changes and saves; this is what runs in the background thread"""
+        while True:
+            job = self.jobs.get()
+            if job == None:
+                return
+            (action, data) = job
+            try:
+                if action == 'journal':
+                    self.writeJournal(data)
+                else:
+                    self.compact(data)
+            except (IOError, OSError, yaml.YAMLError) as err: #keep going; the next compaction may work
+                self.error = err
+
+    def writeJournal(self, changes):
+        """Appends the changes to the journal"""
+        text = ''.join(yaml.dump({'generation': self.generation, 'key': list(key), 'record': record}, explicit_start=True, explicit_end=True) for (key, record) in changes)
+        f = open(self.journalPath, 'a')
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+        f.close()
+
+    def compact(self, records):
+        """Writes the whole experiment to the save file, numbered with the next generation so loadAutosave ignores what's left in the journal if it isn't emptied, and empties the journal"""
+        saved = experimentFromRecords(records)
+        saved[generationKey] = self.generation + 1
+        replaceFile(self.path, yaml.dump(saved))
+        self.generation += 1
+        open(self.journalPath, 'w').close()
@@ -0,0 +1,86 @@
+import numpy
+
+class RunningStats:
+    """The running mean and variance of the shots measured for one point (each element's, if the shots are arrays), kept with Welford's online algorithm so the shots themselves don't have to be kept"""
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0 #the sum of squared differences from the mean
+
+    def add(self, shot):
+        """Adds one shot"""
+        shot = numpy.asarray(shot, dtype=float)
+        self.count += 1
+        delta = shot - self.mean
+        self.mean = self.mean + delta/self.count
+        self.m2 = self.m2 + delta*(shot - self.mean)
+
+    def addShots(self, shots):
+        """Adds a batch of shots (an array with one shot per row), combining the batch's statistics with the running ones in one step rather than shot by shot"""
+        shots = numpy.asarray(shots, dtype=float)
+        if len(shots) == 0:
+            return
+        count = len(shots)
+        mean = shots.mean(axis=0)
+        m2 = ((shots - mean)**2).sum(axis=0)
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean = self.mean + delta*count/float(total)
+        self.m2 = self.m2 + m2 + delta**2*self.count*count/float(total)
+        self.count = total
+
+    def variance(self):
+        """Returns the sample variance of the shots, or None if there are fewer than two"""
+        if self.count < 2:
+            return None
+        return self.m2/(self.count - 1)
+
+    def standardError(self):
+        """Returns the standard error of the mean, or None if there are fewer than two shots"""
+        if self.count < 2:
+            return None
+        return numpy.sqrt(self.variance()/self.count)
+
+class AveragedPoint:
+    """The averaged data for one sweep point, and how well it was measured"""
+    def __init__(self, mean, standardError, shots, converged):
+        self.mean = mean
+        self.standardError = standardError
+        self.shots = shots #how many shots were averaged
+        self.converged = converged #True if the target error was reached, False if it stopped at the most shots allowed
+
+    def __eq__(self, other):
+        return isinstance(other, AveragedPoint) and (self.toDict() == other.toDict())
+
+    def __ne__(self, other):
+        return not self == other
+
+    def toDict(self):
+        """Returns a dict describing the point, for saving"""
+        return {'mean': numpy.asarray(self.mean).tolist(), 'standardError': numpy.asarray(self.standardError).tolist(), 'shots': self.shots, 'converged': self.converged}
+
+class AdaptiveAveraging:
+    """Decides how many shots to average for each sweep point: batches of batchShots until the standard error of the mean is at or under target, or maxShots have been taken"""
+    def __init__(self, target, maxShots, batchShots=100, minShots=None):
+        self.target = target
+        self.maxShots = maxShots
+        self.batchShots = batchShots
+        self.minShots = minShots if minShots != None else min(batchShots, maxShots) #too few shots give a poor estimate of the error
+        if self.minShots < 2:
+            raise ValueError('At least two shots are needed to estimate the error.')
+
+    def settings(self):
+        """Returns the settings that change what's measured, e.g. for the keys of a ResultCache"""
+        return {'targetError': self.target, 'maxShots': self.maxShots, 'minShots': self.minShots}
+
+    def average(self, acquire):
+        """Returns the AveragedPoint for one point. acquire(count) has to measure count more shots of the point and return them as an array with one shot per row. Raises a ValueError if it returns none."""
+        stats = RunningStats()
+        while stats.count < self.maxShots:
+            shots = acquire(min(self.batchShots, self.maxShots - stats.count))
+            if len(shots) == 0: #it would never get any further
+                raise ValueError('No shots were measured for the point.')
+            stats.addShots(shots)
+            if (stats.count >= self.minShots) and (numpy.max(stats.standardError()) <= self.target): #with target=0 it takes maxShots, unless the shots don't vary at all
+                return AveragedPoint(stats.mean, stats.standardError(), stats.count, True)
+        return AveragedPoint(stats.mean, stats.standardError(), stats.count, False)
@@ -0,0 +1,143 @@
+#!  /usr/bin/env python
+
+#   Runs experiments and sweeps from the command line, without the GUI
+
+import sys
+import time
+import argparse
+import yaml
+from qubit_model import *
+from qubit_sweep import *
+from qubit_validate import *
+from qubit_telemetry import *
+from qubit_cache import *
+from qubit_averaging import *
+
+def loadExperimentFile(fileName):
+    """Returns an Experiment loaded from a .qbexp file"""
+    f = open(fileName, 'r')
+    loaded = yaml.load(f)
+    f.close()
+    experiment = Experiment()
+    experiment.loadExperimentDict(loaded)
+    return experiment
+
+def loadSweepFile(experiment, fileName):
+    """Returns the Sweep over the experiment defined in a YAML file (see sweepFromDict)"""
+    f = open(fileName, 'r')
+    loaded = yaml.load(f)
+    f.close()
+    return sweepFromDict(experiment, loaded)
+
+def compiledToList(compiled):
+    """Returns a compiled trace as plain lists and floats, so that it can be written out as YAML"""
+    segments = []
+    for segment in compiled:
+        if segment[0] == 'repeat':
+            segments.append([segment[0], segment[1], segment[2], segment[3], compiledToList(segment[4])])
+        elif segment[0] == 'samples':
+            segments.append([segment[0], segment[1], segment[2], [float(x) for x in segment[3]]])
+        else:
+            segments.append([segment[0], segment[1], segment[2], float(segment[3])])
+    return segments
+
+def dataToPlain(data):
+    """Returns a point's data as plain lists, dicts and floats, so that it can be written out as YAML"""
+    if isinstance(data, AveragedPoint):
+        return data.toDict()
+    if hasattr(data, 'tolist'): #numpy arrays and numbers
+        return data.tolist()
+    return data
+
+def pointResult(step, point, sweep, compiled):
+    """Returns the result written out for one point of a sweep: its index, the swept parameters, and the compiled traces that have to be uploaded for it (a dict of trace name to compiled trace)"""
+    return {'step': step,
+            'index': list(point),
+            'parameters': dict((a.name(), a.points[i]) for (a, i) in zip(sweep.axes, point)),
+            'uploads': dict((name, compiledToList(sequence)) for (name, sequence) in compiled.items())}
+
+def runSweep(sweep, output, optimize=True, telemetry=None, cache=None, settings=None, maxAge=None):
+    """Goes through the points of the sweep, writing the compiled traces that change at each point (and its data, if it's in the cache) to output as a YAML document. The time each stage takes is recorded in telemetry, if it's given. Returns the number of points, trace uploads, and points found in the cache."""
+    if telemetry == None:
+        telemetry = Telemetry()
+    schedule = sweep.schedule(optimize)
+    uploads = 0
+    cached = 0
+    digests = {} #the sequenceDigest of each trace as it is now, by trace name, for the cache keys
+    for (step, point) in enumerate(schedule):
+        with telemetry.stage('compile'):
+            for i in schedule.changedAxes(step):
+                sweep.axes[i].apply(point[i])
+            traces = schedule.tracesToUpload(step)
+            compiled = sweep.interface.compileTraces(traces)
+            result = pointResult(step, point, sweep, compiled)
+        if cache != None:
+            with telemetry.stage('cache'):
+                for (name, sequence) in compiled.items():
+                    digests[name] = sequenceDigest(sequence)
+                data = cache.lookup(pointKey(digests, settings), maxAge)
+            if data is not None:
+                result['data'] = dataToPlain(data)
+                cached += 1
+        uploads += len(traces)
+        with telemetry.stage('write'):
+            output.write(yaml.dump(result, explicit_start=True))
+            output.flush() #so that the results so far are kept if the run is stopped part way through
+        telemetry.pointDone()
+    telemetry.finish()
+    return len(schedule), uploads, cached
+
+def main(argv=None):
+    """Loads an experiment and an optional sweep, and writes the compiled traces for every point"""
+    parser = argparse.ArgumentParser(description='Compile a qubit experiment, and optionally sweep it, without the GUI.')
+    parser.add_argument('experiment', help='the .qbexp file to run')
+    parser.add_argument('-s', '--sweep', help='YAML file defining the sweep axes')
+    parser.add_argument('-o', '--output', help='file to write the results to (by default, the experiment file name with .results.yaml)')
+    parser.add_argument('--run-code', action='store_true', help="run the experiment's code before compiling, like the Run Code button")
+    parser.add_argument('--timeout', type=float, default=None, help='seconds to let the code run for')
+    parser.add_argument('--no-optimize', action='store_true', help='run the sweep points in ordinary nested loop order')
+    parser.add_argument('--no-validate', action='store_true', help="don't check the sequence against the boards' limits before running")
+    parser.add_argument('--cache', help='ResultCache file of data already measured; points found in it are written with their data')
+    parser.add_argument('--settings', help='YAML file of the acquisition settings the cached data was measured with (e.g. the averaging settings), which are part of the cache keys')
+    parser.add_argument('--max-age', type=float, default=None, help="seconds after which cached data isn't used")
+    args = parser.parse_args(argv)
+
+    startTime = time.time()
+    experiment = loadExperimentFile(args.experiment)
+    if args.run_code:
+        experiment.executeCode(args.timeout)
+    if args.sweep != None:
+        sweep = loadSweepFile(experiment, args.sweep)
+    else:
+        sweep = Sweep(experiment, []) #a sweep with no axes has a single point
+    if not args.no_validate:
+        try:
+            SequenceValidator(experiment, sweep).check() #check every point before anything is run
+        except SequenceError as err:
+            sys.stderr.write(str(err) + '\n')
+            return 1
+    outputName = args.output if args.output != None else args.experiment + '.results.yaml'
+    cache = ResultCache(args.cache) if args.cache != None else None
+    settings = None
+    if args.settings != None:
+        f = open(args.settings, 'r')
+        settings = yaml.load(f)
+        f.close()
+
+    telemetry = Telemetry()
+    output = open(outputName, 'w')
+    try:
+        (points, uploads, cached) = runSweep(sweep, output, not args.no_optimize, telemetry, cache, settings, args.max_age)
+    finally:
+        output.close()
+        #the stage timings go next to the results
+        telemetry.writeJSON(outputName + '.telemetry.json')
+        telemetry.writeCSV(outputName + '.telemetry.csv')
+    sys.stderr.write('{} points, {} trace uploads, written to {} in {:.2f} s\n'.format(points, uploads, outputName, time.time() - startTime))
+    if cache != None:
+        sys.stderr.write('{} of the points found in the cache\n'.format(cached))
+    sys.stderr.write(telemetry.statusText() + '\n')
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+import os
+import time
+import hashlib
+import threading
+import cPickle
+from qubit_autosave import replaceFile
+
+def sequenceDigest(compiled):
+    """Returns a digest of a compiled trace (see Trace.compile) that stays the same from one run of the program to the next, unlike hash()"""
+    return hashlib.sha1(repr(compiled)).hexdigest()
+
+def pointKey(digests, settings=None):
+    """Returns the cache key for a sweep point: a digest of every trace's compiled sequence (a dict of trace name to sequenceDigest) and the acquisition settings (a dict, e.g. of the number of repetitions)"""
+    settings = settings if settings != None else {}
+    return hashlib.sha1(repr((sorted(digests.items()), sorted(settings.items())))).hexdigest()
+
+class ResultCache:
+    """Keeps the data measured for each sequence by pointKey (what was sent to the hardware and how it was measured), so running the same sequence again can reuse it; kept in fileName between runs if it's given, and safe to use from several threads"""
+    def __init__(self, fileName=None):
+        self.fileName = fileName
+        self.entries = {} #(time measured, data) by pointKey
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        if (fileName != None) and os.path.exists(fileName):
+            self.load()
+
+    def lookup(self, key, maxAge=None):
+        """Returns the data stored for key, or None if there isn't any or it was measured more than maxAge seconds ago"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if (entry is None) or ((maxAge != None) and (time.time() - entry[0] > maxAge)):
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1]
+
+    def store(self, key, data):
+        """Stores the data measured for key; None can't be stored, since lookup uses it to mean there's nothing"""
+        if data is None: #not ==, which compares a numpy array element by element
+            return
+        with self.lock:
+            self.entries[key] = (time.time(), data)
+
+    def prune(self, maxAge):
+        """Throws away everything measured more than maxAge seconds ago"""
+        with self.lock:
+            now = time.time()
+            for key in [k for (k, (stored, data)) in self.entries.items() if now - stored > maxAge]:
+                del self.entries[key]
+
+    def clear(self):
+        """Throws away everything"""
+        with self.lock:
+            self.entries = {}
+
+    def load(self):
+        """Reads the cache from its file"""
+        f = open(self.fileName, 'rb')
+        entries = cPickle.load(f)
+        f.close()
+        with self.lock:
+            self.entries.update(entries)
+
+    def save(self):
+        """Writes the cache to its file"""
+        with self.lock:
+            entries = dict(self.entries)
+        replaceFile(self.fileName, cPickle.dumps(entries, cPickle.HIGHEST_PROTOCOL), 'wb')
@@ -0,0 +1,74 @@
+import math
+import sys
+import threading
+import time
+from qubit_pulses import pulseShapes
+
+#all the functions and constants from the math library (e.g. 'sin', 'pi', etc.), so that code and functions can use them
+mathNames = dict((name, getattr(math, name)) for name in dir(math) if not name.startswith('_'))
+
+def baseNamespace():
+    """Returns a new dictionary to execute code in. It only holds the math library's names and the pulse shapes, so it's much cheaper than copying globals()."""
+    namespace = mathNames.copy()
+    namespace.update(pulseShapes)
+    return namespace
+
+def isUserVariable(name, value):
+    """Returns True if the variable is a numeric one made by the user (i.e. it isn't from the math library)"""
+    return (name not in mathNames) and isinstance(value, (int, long, float, complex))
+
+class CodeCancelled(Exception):
+    """Raised inside code run by a CodeRunner when it has been cancelled or has run out of time"""
+    pass
+
+class CodeRunner:
+    """Runs code from the code frame in a worker thread, against a namespace of plain numbers, so that the GUI doesn't freeze while it runs"""
+    def __init__(self, code, namespace, timeout=None):
+        self.code = code
+        self.namespace = namespace #Tk can only be used from its own thread, so the GUI applies the results once the code is done
+        self.timeout = timeout #in seconds; None means no limit
+        self.error = None #will hold sys.exc_info() if the code raises an exception
+        self.cancelReason = None #set when the code is cancelled
+        self.startTime = None
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True #don't keep the program open if the code is still running when the GUI quits
+
+    def start(self):
+        """Starts running the code in the worker thread"""
+        self.startTime = time.time()
+        self.thread.start()
+
+    def run(self):
+        """Runs the code; this is what runs in the worker thread"""
+        sys.settrace(self.traceMethod)
+        try:
+            exec self.code in self.namespace
+        except:
+            self.error = sys.exc_info()
+        finally:
+            sys.settrace(None)
+
+    def traceMethod(self, frame, event, arg):
+        """Trace function for the worker thread; raises CodeCancelled in the running code once it's been cancelled"""
+        #this runs on every line, so even an infinite loop can be stopped, but a single call that doesn't return (e.g. time.sleep) can't
+        if self.cancelReason != None:
+            raise CodeCancelled(self.cancelReason)
+        return self.traceMethod
+
+    def cancel(self, reason='Cancelled'):
+        """Stops the code at the next line it runs"""
+        if self.cancelReason == None:
+            self.cancelReason = reason
+
+    def elapsed(self):
+        """Returns the number of seconds the code has been running"""
+        return time.time() - self.startTime
+
+    def checkTimeout(self):
+        """Cancels the code if it has run for longer than the timeout"""
+        if (self.timeout != None) and (self.elapsed() > self.timeout):
+            self.cancel('Timed out after {} s'.format(self.timeout))
+
+    def done(self):
+        """Returns True once the code has stopped running"""
+        return not self.thread.is_alive()
@@ -0,0 +1,39 @@
+import ast
+
+parsedNames = {} #holds the names found in each function text that has been parsed, so each text only gets parsed once
+
+def referencedNames(functionText):
+    """Returns the set of names (of times, values, code variables, or math functions) used in a function's text, not including t. Text that can't be parsed uses no names."""
+    if functionText not in parsedNames:
+        try:
+            tree = ast.parse(functionText.strip(), mode='eval')
+        except SyntaxError:
+            names = set()
+        else:
+            names = set(node.id for node in ast.walk(tree) if isinstance(node, ast.Name))
+            names.discard('t')
+        parsedNames[functionText] = names
+    return parsedNames[functionText]
+
+def dependents(values, names):
+    """Returns the function mode ViewValues, out of values, that use any of the given names, directly or through other ViewValues, with each one after all the values it uses"""
+    users = {} #maps each name to the function mode values that use it
+    for value in values:
+        if value.mode != 'constant':
+            for name in referencedNames(value.functionText):
+                users.setdefault(name, []).append(value)
+
+    order = [] #values end up in here after all the values that use them
+    visited = set()
+    def visit(value):
+        if value not in visited:
+            visited.add(value)
+            for user in users.get(value.name, []):
+                visit(user)
+            order.append(value)
+
+    for name in names:
+        for value in users.get(name, []):
+            visit(value)
+    order.reverse()
+    return order
@@ -0,0 +1,86 @@
+class DragController:
+    """Handles dragging lines on the trace canvases, moving just the dragged line as a preview and setting its time or value when the button is released (or every throttle ms, if liveUpdate is True)"""
+    def __init__(self, interface, liveUpdate=False, throttle=100):
+        self.interface = interface
+        self.liveUpdate = liveUpdate
+        self.throttle = throttle
+        self.state = 'idle' #goes to 'pressed' when a line is clicked, 'dragging' when the mouse moves, and back to 'idle' on release
+        self.commitMethod = None #called with the canvas x and y of the pointer to set the dragged time or value
+        self.axis = None #'x' for lines that move sideways (times), 'y' for lines that move up and down (values)
+        self.canvas = None #the canvas the drag started on
+        self.canvases = [] #the canvases the preview is moved on
+        self.item = None #the canvas item or tag that's moved as the preview; live updates need a tag, since each one redraws the canvases and the clicked item is gone
+        self.lastX = None
+        self.lastY = None
+        self.pendingCommit = None #the root.after ID of the next live update, if one is waiting
+
+    def bind(self, canvas):
+        """Sets up a canvas so that lines on it can be dragged"""
+        canvas.bind('<B1-Motion>', self.motion)
+        canvas.bind('<ButtonRelease-1>', self.release)
+
+    def begin(self, eventObj, commitMethod, axis, tag=None):
+        """Called when a line is clicked to start dragging it. If tag is given, everything with that tag on every canvas is moved as the preview; otherwise just the clicked line is."""
+        self.cancelPendingCommit()
+        self.state = 'pressed'
+        self.commitMethod = commitMethod
+        self.axis = axis
+        self.canvas = eventObj.widget
+        if tag == None:
+            self.item = self.canvas.find_withtag('current')
+            self.canvases = [self.canvas]
+        else:
+            self.item = tag
+            self.canvases = self.interface.canvases()
+        self.lastX = self.canvas.canvasx(eventObj.x)
+        self.lastY = self.canvas.canvasy(eventObj.y)
+        self.holdScales(axis == 'y')
+
+    def holdScales(self, hold):
+        """Holds (or lets go of) the y scales of all the traces"""
+        #so that a live update doesn't rescale a trace out from under the pointer
+        for trace in self.interface.traces:
+            trace.holdScale = hold
+
+    def motion(self, eventObj):
+        """Called when the mouse moves with the button down; moves the preview"""
+        if self.state == 'idle':
+            return
+        self.state = 'dragging'
+        x = self.canvas.canvasx(eventObj.x)
+        y = self.canvas.canvasy(eventObj.y)
+        dx = (x - self.lastX) if self.axis == 'x' else 0
+        dy = (y - self.lastY) if self.axis == 'y' else 0
+        for canvas in self.canvases:
+            canvas.move(self.item, dx, dy)
+        self.lastX = x
+        self.lastY = y
+        if self.liveUpdate and (self.pendingCommit == None):
+            self.pendingCommit = self.interface.root.after(self.throttle, self.liveCommit)
+
+    def release(self, eventObj):
+        """Called when the button is released; sets the dragged time or value, which redraws everything depending on it"""
+        self.cancelPendingCommit()
+        if self.state == 'dragging':
+            self.commit(True)
+        self.holdScales(False)
+        self.state = 'idle'
+
+    def liveCommit(self):
+        """Sets the dragged time or value in the middle of a drag (only in live update mode)"""
+        self.pendingCommit = None
+        if self.state == 'dragging':
+            self.commit()
+
+    def cancelPendingCommit(self):
+        """Cancels the waiting live update, if there is one"""
+        if self.pendingCommit != None:
+            self.interface.root.after_cancel(self.pendingCommit)
+            self.pendingCommit = None
+
+    def commit(self, final=False):
+        """Sets the dragged time or value from where the pointer is now, redrawing everything once. If it's the final change, the scales are let go after it's set, so the redraw rescales the traces."""
+        with self.interface.transaction():
+            self.commitMethod(self.lastX, self.lastY) #worked out on the scales the line was dragged on
+            if final:
+                self.holdScales(False) #the redraw is put off until the end of the transaction
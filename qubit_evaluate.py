@@ -0,0 +1,134 @@
+import math
+import numpy
+from qubit_code import mathNames
+
+def gridIndices(start, end, step):
+    """Returns the first and one past the last index k for which k*step is a time from start to end (not including end)"""
+    #the small offset keeps floating point error from pushing a time that's on the grid on to the next step
+    return int(math.ceil(start/float(step) - 1e-9)), int(math.ceil(end/float(step) - 1e-9))
+
+def gridTimes(start, end, step):
+    """Returns the times from start to end (not including end) that are multiples of step"""
+    first, stop = gridIndices(start, end, step)
+    return [k*step for k in range(first, stop)]
+
+def extremum(f, start, end, largest=True, exactLimit=2048, samples=256, candidates=3):
+    """Returns the largest (or smallest) value the array function f takes at the integers from start to end (not including end), or None if there aren't any. Exact for ranges of up to exactLimit integers; longer ones are searched, which can miss a narrow peak."""
+    if end <= start:
+        return None
+    sign = 1 if largest else -1
+    if end - start <= exactLimit:
+        return sign*(sign*numpy.asarray(f(numpy.arange(start, end)), dtype=float)).max()
+
+    cache = {} #sign*f at each integer evaluated so far, so no integer is evaluated twice
+    def g(*ks):
+        missing = [k for k in ks if k not in cache]
+        if len(missing) > 0:
+            cache.update(zip(missing, sign*numpy.asarray(f(numpy.array(missing)), dtype=float)))
+        return [cache[k] for k in ks]
+
+    #coarse sampling; a peak narrower than the spacing of these samples can fall between them, so for long ranges the largest value can be underestimated
+    coarse = sorted(set(int(k) for k in numpy.round(numpy.linspace(start, end - 1, samples))))
+    values = g(*coarse)
+    ranked = sorted(range(len(coarse)), key=lambda i: values[i], reverse=True)
+
+    #refine between the neighbours of the best coarse samples with a golden section search, so it takes a few hundred evaluations of f however long the range is
+    invPhi = (5**0.5 - 1)/2
+    for i in ranked[:candidates]:
+        low = coarse[max(i - 1, 0)]
+        high = coarse[min(i + 1, len(coarse) - 1)]
+        while high - low > 3:
+            a = int(round(high - invPhi*(high - low)))
+            b = int(round(low + invPhi*(high - low)))
+            if a == b: #make sure the range keeps shrinking when it gets small
+                b = a + 1
+            (ga, gb) = g(a, b)
+            if ga < gb:
+                low = a
+            else:
+                high = b
+        g(*range(low, high + 1))
+    return sign*max(cache.values())
+
+#numpy versions of the math library's functions, so that function mode values can be evaluated on a whole array of times at once
+numpyNames = dict((name, getattr(numpy, name)) for name in mathNames if isinstance(getattr(numpy, name, None), numpy.ufunc))
+numpyNames['pow'] = numpy.power
+
+def vectorLambda(viewValue, overrides={}):
+    """Returns a version of viewValue's function that takes a numpy array of times (in s) and returns an array of values. Names in overrides are used in place of the function's own variables."""
+    viewValue.makeLambda() #makes sure viewValue.variables is up to date
+    namespace = viewValue.variables.copy()
+    namespace.update(overrides)
+    for name in namespace:
+        if name in numpyNames:
+            namespace[name] = numpyNames[name]
+    return eval('lambda t: ' + viewValue.functionText, namespace)
+
+def scalarLambda(viewValue, overrides):
+    """Returns viewValue's function of a single time (in s), with the names in overrides used in place of its own variables"""
+    viewValue.makeLambda()
+    namespace = viewValue.variables.copy()
+    namespace.update(overrides)
+    return eval('lambda t: ' + viewValue.functionText, namespace)
+
+def evaluateValue(viewValue, seconds, overrides={}):
+    """Returns the values viewValue takes at the given numpy array of times (in s), with the names in overrides used in place of its own variables. Uses numpy's functions when it can, and falls back to evaluating time by time when it can't (e.g. math.log with a base)."""
+    try:
+        values = numpy.asarray(vectorLambda(viewValue, overrides)(seconds), dtype=float)
+        if values.shape == (): #functions that don't depend on t give a single number
+            values = numpy.repeat(float(values), len(seconds))
+        if values.shape == seconds.shape:
+            return values
+    except Exception:
+        pass
+    function = viewValue.function if len(overrides) == 0 else scalarLambda(viewValue, overrides)
+    return numpy.array([function(t) for t in seconds], dtype=float)
+
+class ExperimentEvaluator:
+    """Evaluates all the traces of an experiment in one pass, on one time base, giving a single (number of traces, number of samples) array. Also compiles the traces for a point (see Experiment.compileTraces)."""
+    def __init__(self, interface, step=None, overrides=None, start=None, end=None):
+        self.interface = interface
+        if step == None:
+            step = min([t.samplePeriod for t in interface.traces] + [interface.timeResolution])
+        self.step = step
+        self.overrides = overrides if overrides != None else {} #used in place of the functions' own variables, e.g. for a sweep point that hasn't been set
+        self.first, self.stop = gridIndices(start if start != None else interface.start.time, end if end != None else interface.end.time, step)
+        self.times = numpy.arange(self.first, self.stop)*step #the shared time base, in ns
+        self.valueCache = {} #holds the arrays for the function mode ViewValues that have already been evaluated, so each is evaluated once however many traces use it
+        self.sampleCache = {} #holds the samples of the function segments that have already been evaluated, by value, sample indices, and sample period
+
+    def valueArray(self, viewValue):
+        """Returns the values viewValue takes over the whole time base, evaluating it if it hasn't been already"""
+        if viewValue not in self.valueCache:
+            self.valueCache[viewValue] = evaluateValue(viewValue, self.times*1e-9, self.overrides) #the 1e-9 coverts the time to seconds
+        return self.valueCache[viewValue]
+
+    def segmentSamples(self, segment):
+        """Returns the samples of a function mode Segment as an array, evaluating them if the same value hasn't been evaluated at the same sample times already"""
+        first, stop = gridIndices(segment.start, segment.end, segment.samplePeriod)
+        key = (segment.viewValue, first, stop, segment.samplePeriod)
+        if key not in self.sampleCache:
+            self.sampleCache[key] = evaluateValue(segment.viewValue, numpy.arange(first, stop)*segment.samplePeriod*1e-9, self.overrides)
+        return self.sampleCache[key]
+
+    def indices(self, start, end):
+        """Returns the slice of the time base from start to end"""
+        first, stop = gridIndices(start, end, self.step)
+        return slice(max(first - self.first, 0), max(stop - self.first, 0))
+
+    def evaluate(self):
+        """Returns the (number of traces, number of samples) array of all the traces' values, in the order of interface.traces"""
+        traces = self.interface.traces
+        result = numpy.zeros((len(traces), len(self.times)))
+        for (row, trace) in enumerate(traces):
+            for segment in trace.segments():
+                part = self.indices(segment.start, segment.end)
+                if segment.isConstant():
+                    result[row, part] = segment.value()
+                elif trace.samplePeriod > self.step: #hold each of the trace's samples until its next one
+                    held = numpy.floor(self.times[part]/trace.samplePeriod + 1e-9)*trace.samplePeriod
+                    heldIndices = numpy.clip(numpy.rint((held - self.times[0])/self.step).astype(int), 0, len(self.times) - 1)
+                    result[row, part] = self.valueArray(segment.viewValue)[heldIndices]
+                else:
+                    result[row, part] = self.valueArray(segment.viewValue)[part]
+        return result
@@ -4,31 +4,57 @@ import yaml
 import labrad
 import tkMessageBox
 import sys
+import os
+import contextlib
+import numpy
 from math import *
 from twisted.internet.error import ConnectionRefusedError
 from qubit_views import *
+from qubit_model import *
 from qubit_traces import *
-
-class Interface:
+from qubit_drag import *
+from qubit_autosave import *
+from qubit_telemetry import *
+from qubit_validate import *
+from qubit_shard import *
+from qubit_averaging import *
+from qubit_shared import *
+
+class Interface(Experiment):
     """The class for the GUI interface"""
   
     viewWidth = 500 #width of the view canvas
     viewHeight = 100 #height of the view canvas
+    stackedTraces = True #if True, all the traces are drawn as rows of one scrollable canvas; otherwise each trace gets its own canvas
+    rasterTraces = False #if True, each trace's waveform is drawn as one image rather than a canvas item per value and duration, which keeps the canvas small for dense traces
+    codePollInterval = 50 #how often, in ms, to check whether code from the code frame is done running
+    autosavePath = os.path.join(os.path.expanduser('~'), 'qubit_autosave.qbexp') #where the experiment is autosaved
+    autosaveInterval = 10000 #how often, in ms, to autosave the experiment
+    telemetryPollInterval = 500 #how often, in ms, to update the sweep telemetry shown on the command tab
 
     def __init__(self):
+        Experiment.__init__(self)
+
         #The LabRAD connection
         self.labRADconnection = None #don't connect until later
 
-        #Will hold the variables for executing code
-        self.variables = globals().copy()    
+        self.codeRunner = None #the CodeRunner running the code from the code frame, if it's running
+        self.traceStack = None #the TraceStack the traces are drawn in, if they're stacked
+        self.autosaver = None #the Autosaver; made once there's an experiment to save
+        self.sweep = None #the Sweep loaded with Load Sweep
+        self.sweepRun = None #the (SharedDataset, AcquisitionProcess) of the sweep that's running, if any
     
         #The root. This has to come before the other GUI stuff, because 'StringVar's and 'IntVar's in the 'View____'s need it to be initialized before they can be created.
         self.root = Tkinter.Tk()
         self.root.title('Qubit Command Center')
         self.root.geometry('+3+10')
 
+        self.drag = DragController(self) #handles dragging lines on the canvases
+
         #set some variables used by the GUI
         self.mode = 'select' #mode determines what clikcing on the canvas will do. Options are 'select', 'addTime', 'deleteTime', 'merge', 'newValue', and 'rename'
+        self.transactionDepth = 0 #how many transactions are open; redrawing is put off until the outermost one is done
+        self.pendingRedraws = set() #the redraws put off during the current transaction
 
    
         #The menubar and menus
@@ -39,6 +65,7 @@ class Interface:
         self.filemenu.add_command(label="New Experiment", accelerator="Ctrl+N", state='disabled', command=self.newExperiment)
         self.filemenu.add_command(label="Save Experiment As", accelerator="Ctrl+S", state='disabled', command=self.saveExperiment)
         self.filemenu.add_command(label="Load Experiment", accelerator="Ctrl+O", state='disabled', command=self.loadExperiment)
+        self.filemenu.add_command(label="Recover Autosave", state='disabled', command=self.recoverAutosave)
         self.filemenu.add_separator()
         self.filemenu.add_command(label="Exit", accelerator="Ctrl+Q", command=self.root.quit)
         #bind keys to the actions
@@ -53,6 +80,12 @@ class Interface:
         editmenu.add_command(label="Copy", accelerator="Ctrl+C", command=lambda: self.noteBook.event_generate('<Control-c>'))
         editmenu.add_command(label="Paste", accelerator="Ctrl+V", command=lambda: self.noteBook.event_generate('<Control-v>'))
         menubar.add_cascade(label="Edit", menu=editmenu)
+
+        #the view menu
+        viewmenu = Tkinter.Menu(menubar, tearoff=0)
+        self.rasterVar = Tkinter.BooleanVar(value=self.rasterTraces)
+        viewmenu.add_checkbutton(label="Draw Traces as Images", variable=self.rasterVar, command=lambda: self.setRasterTraces(self.rasterVar.get()))
+        menubar.add_cascade(label="View", menu=viewmenu)
         self.root.config(menu=menubar)
 
 	#the notebook has two pages, one for setup and one for the experiment
@@ -62,9 +95,12 @@ class Interface:
         self.settingsTab.pack()
         self.commandTab = ttk.Frame(self.noteBook)
         self.commandTab.pack()
+        self.experimentTab = ttk.Frame(self.noteBook)
+        self.experimentTab.pack()
         #names for the tabs
         self.noteBook.add(self.settingsTab, text='Settings')
         self.noteBook.add(self.commandTab, text='Command')
+        self.noteBook.add(self.experimentTab, text='Experiment')
     
 	
 
@@ -123,18 +159,6 @@ class Interface:
         def newSweep():
             return
 
-        def loadSweep():
-            return
-
-        def runSweep():
-            return
-
-        def stopSweep():
-            return
-
-        def stopSweepSave():
-            return
-
         ttk.Label(self.commandTab, text='Current Experiment: ').grid(column=0,row=0,padx=5, pady=5) 
 
         ttk.Button(self.commandTab, text = 'New experiment',command = self.newExperiment).grid(column=0,row=1, sticky='nsew',padx=5,pady=5)
@@ -146,7 +170,16 @@ class Interface:
         
         self.data_param= ttk.Labelframe(self.commandTab, text='Data Parameters')
         self.data_param.grid(column=0,row=3,sticky='nsew',padx=5,pady=5,columnspan=3)
-        ttk.Label(self.data_param, text='More Stuff').grid(column=0,row=0)
+        #adaptive averaging (see AdaptiveAveraging); with no max shots, each point's data is just what the setup returns
+        self.targetError = Tkinter.StringVar(value='0')
+        self.maxShots = Tkinter.StringVar(value='')
+        self.batchShots = Tkinter.StringVar(value='100')
+        for (column, (label, variable)) in enumerate([('Target error:', self.targetError), ('Max shots:', self.maxShots), ('Shots per batch:', self.batchShots)]):
+            ttk.Label(self.data_param, text=label).grid(column=2*column,row=0,sticky='e',padx=5,pady=5)
+            ttk.Entry(self.data_param, textvariable=variable, width=8).grid(column=2*column+1,row=0,sticky='w',padx=5,pady=5)
+        #sending each point's traces to all their boards at once (see ParallelUploader) rather than one board after another
+        self.parallelUpload = Tkinter.BooleanVar(value=True)
+        ttk.Checkbutton(self.data_param, text='Upload to all boards at once', variable=self.parallelUpload).grid(column=0,row=1,columnspan=6,sticky='w',padx=5,pady=5)
         
         ttk.Button(self.commandTab, text ='Run Once',command=runOnce).grid(column=0,row=4,sticky='nsew',padx=5,pady=5)
        
@@ -154,13 +187,23 @@ class Interface:
         self.sweeps = ttk.Labelframe(self.commandTab, text ='Sweeps') 
         self.sweeps.grid(column=0,row=4,padx=5,pady=5,columnspan=3)
         ttk.Button(self.sweeps, text ='New Sweep',command=newSweep).grid(column=0,row=0,sticky='nsew',padx=5,pady=5)
-        ttk.Button(self.sweeps, text ='Load Sweep',command=loadSweep).grid(column=1,row=0,sticky='nsew',padx=5,pady=5)
+        ttk.Button(self.sweeps, text ='Load Sweep',command=self.loadSweep).grid(column=1,row=0,sticky='nsew',padx=5,pady=5)
     
-        ttk.Button(self.sweeps, text ='Run Sweep',command=runSweep,state='disabled').grid(sticky='nsew',padx=5,pady=5,column=0,row=1)
-        ttk.Button(self.sweeps, text ='Stop Sweep',command=runSweep,state='disabled').grid(column=1,row=1,sticky='nsew',padx=5,pady=5)
-        ttk.Button(self.sweeps, text ='Stop & Save Sweep',command=runSweep,state='disabled').grid(column=2,row=1,sticky='nsew',padx=5,pady=5)
+        self.runSweepButton = ttk.Button(self.sweeps, text ='Run Sweep',command=self.runSweep,state='disabled')
+        self.runSweepButton.grid(sticky='nsew',padx=5,pady=5,column=0,row=1)
+        self.stopSweepButton = ttk.Button(self.sweeps, text ='Stop Sweep',command=self.stopSweep,state='disabled')
+        self.stopSweepButton.grid(column=1,row=1,sticky='nsew',padx=5,pady=5)
+        ttk.Button(self.sweeps, text ='Stop & Save Sweep',state='disabled').grid(column=2,row=1,sticky='nsew',padx=5,pady=5) #todo: saving sweep data
+
+        #how fast the running sweep is going, and which stage is holding it up
+        self.telemetryText = Tkinter.StringVar()
+        self.telemetryText.set('No sweep running')
+        ttk.Label(self.sweeps, textvariable=self.telemetryText).grid(column=0,row=2,columnspan=3,sticky='w',padx=5,pady=5)
 
         ttk.Label(self.commandTab, text ='Save Path:').grid(column=0,row=7,padx=5,pady=5)
+
+        #the experiment tab starts out with a default experiment, which can be replaced by loading one
+        self.populateExperimentTab()
         
         
         '''
@@ -204,59 +247,121 @@ class Interface:
         """Loads the experiment from a file using a dialog box and YAML"""
         fileName = tkFileDialog.askopenfilename(filetypes=[('Qubit Experiment File','*.qbexp')], title="Open experiment...")
     
-        if fileName != '': #'' is returned if the user hits cancel
-            #load the information from the file
-            f = open(fileName, 'r')
-            loaded = yaml.load(f)
-            f.close()
-  
-        #first, make the times
-        self.times = []
-        for time in loaded['times']:
-	    t = ViewTime(time['name'], time['time'], time['locked'], self)
-	    self.times.append(t)
-	    #if it's start or end, take special care of it
-	    if t.name == 'start':
-	        self.start = t
-	    elif t.name == 'end':
-	        self.end = t
-	
-        #next, handle the values
-        self.values = []
-        for value in loaded['values']:
-	    v = ViewValue(value['name'], value['value'], value['locked'], self, mode = value['mode'], functionText = value['functionText'])
-	    self.values.append(v)
-  
-        #finally take care of the traces and their durations
-        #todo: only have this work if the trace names match up with the already existing trace names
-        self.traces = []
-        row = 0
-        initialValue0 = ViewValue('initial',1,False,self) #temp value for setting up traces
-        for trace in loaded['traces']:
-	    t = ViewTrace(trace['name'], self, row, initialValue0)
-	    self.traces.append(t)
-	    row = row + 1
-	
-	    t.durations = [] #an initial duration is made when the trace is created; get rid of it
-	    for duration in trace['durations']:
-	        dur = ViewDuration(duration['name'], self.timeNamed(duration['start']), self.timeNamed(duration['end']), self.valueNamed(duration['value']), self, t, locked=duration['locked'])
-	        t.durations.append(dur)
-	
-        #add the variables in to our dictionary; apparently this is the cleanest way to do this
-        self.variables = dict(self.variables.items() + loaded['variables'].items())
+        if fileName == '': #'' is returned if the user hits cancel
+            return
+
+        #load the information from the file
+        f = open(fileName, 'r')
+        loaded = yaml.load(f)
+        f.close()
+        self.loadExperimentDict(loaded)
+
+    def loadSweep(self):
+        """Loads a sweep over the experiment from a YAML file (see sweepFromDict) using a dialog box, and enables Run Sweep"""
+        fileName = tkFileDialog.askopenfilename(filetypes=[('Sweep','*.yaml')], title="Open sweep...")
+        if fileName == '': #'' is returned if the user hits cancel
+            return
+        f = open(fileName, 'r')
+        loaded = yaml.load(f)
+        f.close()
+        try:
+            self.sweep = sweepFromDict(self, loaded)
+        except (KeyError, NameError, TypeError) as err: #a missing key, a parameter the experiment doesn't have, or a malformed axis
+            tkMessageBox.showerror("Sweep Error", "{!s}: {!s}".format(type(err).__name__, err))
+            return
+        self.telemetryText.set('Sweep of {} points loaded'.format(int(numpy.prod(self.sweep.shape()))))
+        if self.sweepRun == None:
+            self.runSweepButton.config(state='normal')
+
+    def sweepAveraging(self):
+        """Returns the AdaptiveAveraging set on the command tab, or None if no max shots is set. Raises a ValueError if the settings aren't numbers."""
+        if self.maxShots.get().strip() == '':
+            return None
+        return AdaptiveAveraging(float(self.targetError.get()), int(self.maxShots.get()), int(self.batchShots.get()))
+
+    def runSweep(self):
+        """Runs the loaded sweep on the workers from sweepWorkers, with the averaging set on the command tab, after checking that every point would work on the hardware"""
+        try:
+            averaging = self.sweepAveraging()
+            SequenceValidator(self, self.sweep).check()
+        except (ValueError, SequenceError) as err:
+            tkMessageBox.showerror("Sweep Error", str(err))
+            return
+        self.startSweep(self.sweep, self.sweepWorkers(), averaging=averaging)
+
+    def sweepWorkers(self):
+        """Returns what makes the workers a sweep runs on, in the sweep's process (see startAcquisition). There's no worker for real setups yet, so these are two simulated setups (see FakeSetups), each with a board for every trace that's uploaded to in parallel if that's set on the command tab."""
+        boards = dict((t.name, t.name) for t in self.traces) if self.parallelUpload.get() else None
+        return FakeSetups(2, boards=boards)
+
+    def stopSweep(self):
+        """Stops the running sweep; the points measured so far are kept in its SharedDataset"""
+        if self.sweepRun == None:
+            return
+        dataset, process = self.sweepRun
+        process.terminate()
+        process.join()
+        if not dataset.finished():
+            dataset.setStatus('Sweep stopped')
+            dataset.state.value = SharedDataset.failed
+
+    def startSweep(self, sweep, makeWorkers, optimize=True, averaging=None):
+        """Starts running the sweep in a process of its own (see startAcquisition) and shows how it's going on the command tab until it's done. Returns the SharedDataset its data is published in and the AcquisitionProcess."""
+        dataset, process = startAcquisition(sweep, makeWorkers, optimize, averaging)
+        self.sweepRun = (dataset, process)
+        self.runSweepButton.config(state='disabled')
+        self.stopSweepButton.config(state='normal')
+        self.watchTelemetry(dataset, self.sweepFinished)
+        return dataset, process
+
+    def sweepFinished(self):
+        """Called once the running sweep is over, however it ended"""
+        self.sweepRun = None
+        self.stopSweepButton.config(state='disabled')
+        self.runSweepButton.config(state='normal' if self.sweep != None else 'disabled')
+
+    def watchTelemetry(self, telemetry, whenFinished=None):
+        """Shows the status of a sweep on the command tab, updating it until the sweep is finished, and then calls whenFinished if it's given. telemetry is the sweep's Telemetry, or the SharedDataset of a sweep running in its own process; either has statusText and finished."""
+        finished = telemetry.finished() #checked first, so the last status is shown once it's over
+        self.telemetryText.set(telemetry.statusText())
+        if not finished:
+            self.root.after(self.telemetryPollInterval, self.watchTelemetry, telemetry, whenFinished)
+        elif whenFinished != None:
+            whenFinished()
+
+    def recoverAutosave(self):
+        """Loads the experiment as it was last autosaved by the previous session, e.g. before a crash"""
+        loaded = loadAutosave(previousAutosavePath(self.autosavePath))
+        if loaded == None:
+            tkMessageBox.showinfo("Recover Autosave", "There's no autosaved experiment to recover.")
+        else:
+            self.loadExperimentDict(loaded)
+
+    def makeTrace(self, name, row, samplePeriod, clockGranularity):
+        """Returns a new, empty ViewTrace for loadExperimentDict; it isn't drawn until the whole experiment is loaded"""
+        return ViewTrace(name, self, row, None, samplePeriod, clockGranularity, stack=self.traceStack, render=False)
+
+    def loadExperimentDict(self, loaded):
+        """Replaces the experiment with the one described by loaded (a dict like the one toDict returns), building everything with drawing turned off and then drawing the GUI once"""
+        if self.traceStack != None:
+            self.traceStack.clear()
+        Experiment.loadExperimentDict(self, loaded)
 
         #put the code back in the code box
-        self.codeText.insert('end', loaded['code'])
+        self.codeText.delete('1.0', 'end')
+        self.codeText.insert('end', self.code)
       
-        #now that we've loaded the data, refresh the GUI
-        self.refresh()
-    '''
+        #now that we've loaded the data, draw the GUI; the transaction makes sure each part is only drawn once
+        with self.transaction():
+            self.refresh()
+
     def populateExperimentTab(self):
         """Populates the experiment tab with widgets; call after deciding what servers we want traces for"""
         
         #enable experiment loading and saving
         self.filemenu.entryconfigure('Save Experiment As', state="normal")    
         self.filemenu.entryconfigure('Load Experiment', state="normal")    
+        self.filemenu.entryconfigure('Recover Autosave', state="normal")
     
         #initial conditions for the traces
         self.start = ViewTime('start',0.0,True,self)
@@ -273,26 +378,26 @@ class Interface:
         def addTimeMode():
             self.mode = 'addTime'
             self.nameEntry.focus_set() #move focus to nameEntry box when clicked
-            ttk.Button(self.controlFrame, text='Add Time', command=addTimeMode).grid(column=0, row=0,sticky='w', padx=5, pady=5)
+        ttk.Button(self.controlFrame, text='Add Time', command=addTimeMode).grid(column=0, row=0,sticky='w', padx=5, pady=5)
  
         def deleteTimeMode():
             self.mode = 'deleteTime'
-            ttk.Button(self.controlFrame, text='Delete Time', command=deleteTimeMode).grid(column=1, row=0, sticky='w', padx=5, pady=5)
+        ttk.Button(self.controlFrame, text='Delete Time', command=deleteTimeMode).grid(column=1, row=0, sticky='w', padx=5, pady=5)
 
         def mergeMode():
             self.mode = 'merge'
             self.toMerge = None #need two things to merge; this holds the first one
-            ttk.Button(self.controlFrame, text='Merge', command=mergeMode).grid(column=2, row=0, sticky='w', padx=5, pady=5)    
+        ttk.Button(self.controlFrame, text='Merge', command=mergeMode).grid(column=2, row=0, sticky='w', padx=5, pady=5)    
     
         def renameMode():
             self.mode = 'rename'
             self.nameEntry.focus_set() #move focus to nameEntry box when clicked
-            ttk.Button(self.controlFrame, text='Rename', command=renameMode).grid(column=3, row=0, sticky='w', padx=5, pady=5)
+        ttk.Button(self.controlFrame, text='Rename', command=renameMode).grid(column=3, row=0, sticky='w', padx=5, pady=5)
 
         def newValueMode():
             self.mode = 'newValue'
             self.nameEntry.focus_set() #move focus to nameEntry box when clicked
-            ttk.Button(self.controlFrame, text='New Value', command=newValueMode).grid(column=4, row=0, sticky='w', padx=5, pady=5)
+        ttk.Button(self.controlFrame, text='New Value', command=newValueMode).grid(column=4, row=0, sticky='w', padx=5, pady=5)
 
       
         #now, for the name label and entry
@@ -307,17 +412,35 @@ class Interface:
         self.viewFrame.grid(column=0,row=0,sticky='nsew',padx=5,pady=5)
 
         self.traces = []
+        if self.stackedTraces:
+            self.traceStack = TraceStack(self, self.viewFrame)
     
         #todo: populate self.traces correctly
-        self.traces.append(ViewTrace('test', self, 0, initialValue0))
-        self.traces.append(ViewTrace('test2', self, 1, initialValue1))
+        self.traces.append(ViewTrace('test', self, 0, initialValue0, stack=self.traceStack))
+        self.traces.append(ViewTrace('test2', self, 1, initialValue1, stack=self.traceStack))
+        if self.traceStack != None:
+            self.traceStack.redrawTimes()
     
         #The value frame
-        self.valueFrameParts = []
-
         self.valueFrame = ttk.Labelframe(self.experimentTab,text='Values')
         self.valueFrame.grid(column=1, row=0, sticky='nsew', rowspan=3, padx=5, pady=5)
-        self.valueFrameParts = [] #will contain all the widgets in the value frame so that we can destroy them even after the object they belong to gets destroyed
+
+        #the values are listed in a treeview; it only draws the rows that are in view, and single rows can be updated in place without redrawing the rest
+        self.valueTree = ttk.Treeview(self.valueFrame, columns=('setting', 'locked', 'type'), height=30, selectmode='browse')
+        self.valueTree.heading('#0', text='Name')
+        self.valueTree.heading('setting', text='Value')
+        self.valueTree.heading('locked', text='Locked?')
+        self.valueTree.heading('type', text='Type')
+        self.valueTree.column('locked', width=60, stretch=False)
+        self.valueTree.column('type', width=70, stretch=False)
+        self.valueTree.grid(column=0, row=0, sticky='nsew', padx=5, pady=5)
+        valueScrollbar = ttk.Scrollbar(self.valueFrame, orient=Tkinter.VERTICAL, command=self.valueTree.yview)
+        valueScrollbar.grid(column=1, row=0, sticky='nsw', pady=5)
+        self.valueTree.configure(yscrollcommand=valueScrollbar.set)
+        self.valueTree.bind('<Double-Button-1>', self.editValueCell) #double click a cell to edit it
+        self.valueTree.bind('<Delete>', self.deleteSelectedVar) #delete key removes the selected numeric variable
+        self.valueTreeItems = {} #maps the treeview's row IDs to the time, value, duration, or variable name shown in that row
+        self.cellEditor = None #the entry box placed over a cell while it's being edited
         self.redrawValueFrame()
   
         #The code frame    
@@ -335,87 +458,156 @@ class Interface:
     
         ttk.Button(self.codeFrame, text='Test Code').grid(column=0, row=2, padx=5, pady=5)
     
-        def runCode():
-            #'variables' is the dictionary that will hold the variables for executing the code
-            self.variables = globals().copy() #start by just copying the global variables
-            for time in self.times:
-	        self.variables[time.name] = time #add all the times to variables
-            for value in self.values:
-        	self.variables[value.name] = value #add all the values to variables
-        #execute the code now that we've made the dictionary
-        try:
-	    exec self.codeText.get('1.0', 'end') in self.variables
-        except:
-	    #todo: better message
-	    tkMessageBox.showerror("Error", "{!s}\n{!s}\n{!s}".format(*sys.exc_info()))
-            self.redrawValueFrame() #so that we display any numeric variables in the code that has been run
-      
-        ttk.Button(self.codeFrame, text='Run Code', command=runCode).grid(column=1, row=2, padx=5, pady=5)
+        self.runCodeButton = ttk.Button(self.codeFrame, text='Run Code', command=self.runCode)
+        self.runCodeButton.grid(column=1, row=2, padx=5, pady=5)
         ttk.Button(self.codeFrame, text='Load Code').grid(column=2, row=2, padx=5, pady=5)
-    
+
+        #the code is stopped if it runs for longer than the timeout, or if the cancel button is pressed
+        ttk.Label(self.codeFrame, text='Timeout (s):').grid(column=0, row=3, sticky='e', padx=5, pady=5)
+        self.codeTimeout = Tkinter.StringVar()
+        self.codeTimeout.set('10')
+        ttk.Entry(self.codeFrame, textvariable=self.codeTimeout, width=8).grid(column=1, row=3, padx=5, pady=5)
+        self.cancelCodeButton = ttk.Button(self.codeFrame, text='Cancel', state='disabled', command=self.cancelCode)
+        self.cancelCodeButton.grid(column=2, row=3, padx=5, pady=5)
+
+        #now that there's an experiment, start autosaving it
+        if self.autosaver == None:
+            self.autosaver = Autosaver(self, self.autosavePath, self.autosaveInterval)
+            self.autosaver.start()
+
+    def runCode(self):
+        """Starts running the code in the code frame in a worker thread. The code sees the times (in ns) and values as numbers; when it's done, any that it changed are set in the GUI."""
+        if self.codeRunner != None: #only run one thing at a time
+            return
+        try:
+            timeout = float(self.codeTimeout.get())
+        except ValueError:
+            timeout = None #no limit if the entry box doesn't hold a number
+
+        self.code = self.codeText.get('1.0', 'end')
+        self.codeRunner = CodeRunner(self.code, self.codeNamespace(), timeout)
+        self.codeRunner.start()
+        self.runCodeButton.config(state='disabled')
+        self.cancelCodeButton.config(state='normal')
+        self.root.after(self.codePollInterval, self.pollCode)
+
+    def cancelCode(self):
+        """Stops the code that's running from the code frame"""
+        if self.codeRunner != None:
+            self.codeRunner.cancel()
+
+    def pollCode(self):
+        """Checks whether the code from the code frame is done running; if so, applies its results. Otherwise, checks again later."""
+        runner = self.codeRunner
+        if not runner.done():
+            runner.checkTimeout()
+            self.root.after(self.codePollInterval, self.pollCode)
+            return
+
+        self.codeRunner = None
+        self.runCodeButton.config(state='normal')
+        self.cancelCodeButton.config(state='disabled')
+        if (runner.error != None) and (runner.cancelReason != None): #stopped by the cancel button or the timeout, rather than by a bug in the code
+            tkMessageBox.showinfo("Code Stopped", runner.cancelReason)
+        elif runner.error != None:
+            #todo: better message
+            tkMessageBox.showerror("Error", "{!s}\n{!s}\n{!s}".format(*runner.error))
+        else:
+            #apply the results in a transaction so that everything gets redrawn once at the end, and nothing changes if there's an error
+            try:
+                with self.transaction():
+                    self.applyCodeResults(runner.namespace)
+            except:
+                tkMessageBox.showerror("Error", "{!s}\n{!s}\n{!s}".format(*sys.exc_info()))
+        self.redrawValueFrame() #so that we display any numeric variables in the code that has been run
+
     def redrawValueFrame(self):
-        """Completely redraws the value frame of the interface"""
+        """Completely redraws the value frame of the interface. Only needed when lots has changed; single rows update themselves with their redraw methods."""
+        if self.deferRedraw('valueFrame'):
+            return
         self.experimentTab.selection_clear()
-        #first, clear out all the old stuff from the frame
-        for l in self.valueFrameParts:
-            l.destroy()
-    
-        self.valueFrameParts = [] #array to store the parts so that we can destroy them when redrawing the frame
+        self.closeCellEditor()
+        #first, clear out all the old rows
+        self.valueTree.delete(*self.valueTree.get_children())
+        self.valueTreeItems = {}
 
-        #first, we display all the ViewTimes. A heading label comes first.
-        tmp = ttk.Label(self.valueFrame, text="Times")
-        tmp.grid(column=0, row=0, columnspan=2, padx=5, pady=5)
-        self.valueFrameParts.append(tmp)
-    
-        row = 1 #keeps track of what row we're on The heading was on row 0
-    
+        #there's a heading row for each kind of thing in the frame; everything else goes under them
+        self.valueTree.insert('', 'end', 'times', text='Times', open=True)
         for el in self.times:
-            el.disp(row)
-            row += 1
-
-        #next, we display all the ViewValues. A heading label comes first.      
-        tmp = ttk.Label(self.valueFrame, text="Values")
-        tmp.grid(column=0, row=row, columnspan=2, padx=5, pady=5)
-        self.valueFrameParts.append(tmp)  
-        row +=1
-    
+            el.disp('times')
+
+        self.valueTree.insert('', 'end', 'values', text='Values', open=True)
         for el in self.values:
-            el.disp(row)
-            row += 1
-
-        #next, we display all the ViewDurations. A heading label comes first.
-        tmp = ttk.Label(self.valueFrame, text="Durations")
-        tmp.grid(column=0, row=row, columnspan=2, padx=5, pady=5)
-        self.valueFrameParts.append(tmp)    
-        row +=1
-    
+            el.disp('values')
+
+        self.valueTree.insert('', 'end', 'durations', text='Durations', open=True)
         for el in self.durations():
-            el.disp(row)
-            row += 1
-      
+            el.disp('durations')
+
         #finally, display the numeric variables from any executed code
-        tmp = ttk.Label(self.valueFrame, text="Numeric Variables")
-        tmp.grid(column=0, row=row, columnspan=2, padx=5, pady=5)
-        self.valueFrameParts.append(tmp)    
-        row +=1
-    
+        self.valueTree.insert('', 'end', 'variables', text='Numeric Variables', open=True)
         for varName in self.variables:
-            #only display if it's not in globals and it's numeric
-            if (varName not in globals()) and isinstance(self.variables[varName], (int, long, float, complex)):
-	        tmp = ttk.Label(self.valueFrame, text=varName + ': ' + str(self.variables[varName]))
-	        tmp.grid(column=0, row=row, columnspan=2, padx=5, pady=5)
-	        self.valueFrameParts.append(tmp)
-	        #having the following work is kind of tricky; the default parameter in the lambda is critical. See <http://mail.python.org/pipermail/tutor/2005-November/043360.html>
-	        tmp = ttk.Button(self.valueFrame, text='Delete', command=lambda vn=varName: self.deleteVar(vn))
-	        tmp.grid(column=2, row=row, padx=5, pady=5)
-	        self.valueFrameParts.append(tmp)
-	        row +=1
- 
-  
+            #only display if it's numeric and made by the user
+            if isUserVariable(varName, self.variables[varName]):
+                item = self.valueTree.insert('variables', 'end', text=varName, values=(str(self.variables[varName]), '', ''))
+                self.valueTreeItems[item] = varName
+
+    def editValueCell(self, eventObj):
+        """Called when a cell in the value frame is double clicked. Places an entry box over the cell so that it can be edited in place, or toggles the cell if it's a locked or type cell."""
+        item = self.valueTree.identify_row(eventObj.y)
+        column = self.valueTree.identify_column(eventObj.x)
+        el = self.valueTreeItems.get(item)
+        if (el == None) or isinstance(el, str): #heading rows and numeric variables can't be edited
+            return
+
+        if column == '#2':
+            el.toggleLocked()
+        elif column == '#3':
+            if isinstance(el, ViewValue):
+                el.toggleMode()
+        else:
+            place = cellEditorPlace(self.valueTree, item, column, el)
+            self.closeCellEditor()
+            if place == None:
+                return
+            text, x, y, width, height = place
+            self.cellEditor = ttk.Entry(self.valueTree)
+            self.cellEditor.insert(0, text)
+            self.cellEditor.select_range(0, 'end')
+            self.cellEditor.place(x=x, y=y, width=width, height=height)
+            self.cellEditor.focus_set()
+
+            #this method updates the element when the entry box is done being edited
+            def entryMethod(eventObj):
+                newText = self.cellEditor.get()
+                self.closeCellEditor()
+                if newText != '':
+                    el.setCell(column, newText)
+            self.cellEditor.bind('<Return>', entryMethod)
+            self.cellEditor.bind('<Escape>', lambda e: self.closeCellEditor())
+            self.cellEditor.bind('<FocusOut>', lambda e: self.closeCellEditor())
+
+    def closeCellEditor(self):
+        """Gets rid of the entry box used for editing a cell in the value frame, if there is one"""
+        if self.cellEditor != None:
+            self.cellEditor.destroy()
+            self.cellEditor = None
+
+    def deleteSelectedVar(self, eventObj):
+        """Deletes the numeric variable selected in the value frame, if any"""
+        for item in self.valueTree.selection():
+            if isinstance(self.valueTreeItems.get(item), str):
+                self.deleteVar(self.valueTreeItems[item])
+
     def deleteVar(self, varName):
-        """Delete the variable named varName from the variable dictionary"""
-        del self.variables[varName] #remove the variable from the dictionary
-        self.redrawValueFrame()    
+        """Delete the variable named varName from the variable dictionary and its row from the value frame"""
+        for item in [i for i in self.valueTreeItems if self.valueTreeItems[i] == varName]:
+            self.valueTree.delete(item)
+            del self.valueTreeItems[item]
+        try:
+            Experiment.deleteVar(self, varName) #remove the variable from the dictionary, and remake the values that use it
+        except: #e.g. a function value still uses it, so its trace can't be drawn
+            tkMessageBox.showerror("Error", "{!s}\n{!s}\n{!s}".format(*sys.exc_info()))
       
     def refresh(self):
         """Redraw all the parts of the GUI that can change"""
@@ -423,17 +615,106 @@ class Interface:
         self.redrawAllXaxies()
         self.redrawAllYaxies()
         self.redrawValueFrame()
-    
-    def clearCanvasBindings(self, eventObj):
-        """Clears the <B1-Motion> binding for all canvases"""
-        for canvas in [t.canvas for t in self.traces]:
-            canvas.bind("<B1-Motion>", lambda e: None)
-    
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Context manager for making lots of changes at once, e.g. 'with interface.transaction(): ...'. Redraws are done once at the end, and everything is put back if an exception is raised."""
+        if self.transactionDepth == 0: #transactions opened inside another one are part of the outer one
+            snapshot = self.snapshot()
+        self.transactionDepth += 1
+        try:
+            yield self
+        except:
+            self.transactionDepth -= 1
+            if self.transactionDepth == 0:
+                self.pendingRedraws = set()
+                self.restore(snapshot)
+                self.refresh()
+            raise
+        else:
+            self.transactionDepth -= 1
+            if self.transactionDepth == 0:
+                self.commitRedraws()
+
+    def deferRedraw(self, *what):
+        """If a transaction is open, remembers that 'what' needs to be done when it's finished and returns True. Otherwise returns False, and the caller should go ahead."""
+        if self.transactionDepth > 0:
+            self.pendingRedraws.add(what)
+            return True
+        else:
+            return False
+
+    def commitRedraws(self):
+        """Does all the redrawing put off during a transaction"""
+        pending = self.pendingRedraws
+        self.pendingRedraws = set()
+        if ('removeUnusedValues',) in pending:
+            self.removeUnusedValues()
+        for trace in self.traces:
+            if (trace, 'canvas') in pending:
+                trace.redrawCanvas()
+            if (trace, 'xaxis') in pending:
+                trace.redrawXaxis()
+            if ((trace, 'yaxis') in pending) and not ((trace, 'canvas') in pending): #redrawing the canvas already redraws the y axis
+                trace.redrawYaxis()
+        if (self.traceStack != None) and ((self.traceStack, 'times') in pending):
+            self.traceStack.redrawTimes()
+        if ('valueFrame',) in pending:
+            self.redrawValueFrame()
+
+    def snapshot(self):
+        """Returns a record of all the times, values, durations, repeats, and variables, which can be put back with restore"""
+        return {'times': [(t, t.name, t.time, t.locked) for t in self.times],
+                'values': [(v, v.name, v.value, v.locked, v.mode, v.functionText) for v in self.values],
+                'traces': [(trace, [(d, d.name, d.startViewTime, d.endViewTime, d.assocViewValue, d.locked) for d in trace.durations]) for trace in self.traces],
+                'repeats': [(r, r.name, r.count) for r in self.repeats],
+                'variables': self.variables.copy()}
+
+    def restore(self, snapshot):
+        """Puts back the times, values, durations, repeats, and variables recorded by snapshot. Doesn't redraw anything."""
+        self.times[:] = [] #the traces share this list, so change it in place
+        for (t, name, time, locked) in snapshot['times']:
+            t.name, t.time, t.locked = name, time, locked
+            self.times.append(t)
+        self.values = []
+        for (v, name, value, locked, mode, functionText) in snapshot['values']:
+            v.name, v.value, v.locked, v.mode, v.functionText = name, value, locked, mode, functionText
+            self.values.append(v)
+        for v in self.values: #remake the lambdas once all the values they could use are back
+            if v.mode != 'constant':
+                v.makeLambda(force = True)
+        for (trace, durations) in snapshot['traces']:
+            trace.durations = []
+            for (d, name, startViewTime, endViewTime, assocViewValue, locked) in durations:
+                d.name, d.startViewTime, d.endViewTime, d.assocViewValue, d.locked = name, startViewTime, endViewTime, assocViewValue, locked
+                trace.durations.append(d)
+        self.repeats = []
+        for (r, name, count) in snapshot['repeats']:
+            r.name, r.count = name, count
+            self.repeats.append(r)
+        self.variables = snapshot['variables']
+    
+    def redrawTracesWith(self, values):
+        """Redraws only the traces that use any of the given values"""
+        for trace in self.traces:
+            if len([v for v in trace.values() if v in values]) > 0:
+                trace.redrawCanvas()
+                trace.redrawYaxis()
+
     def redrawAllCanvases(self):
         """Redraws all the canvases"""
         for trace in self.traces:
             trace.redrawCanvas()
+        if self.traceStack != None:
+            self.traceStack.redrawTimes()
       
+    def setRasterTraces(self, rasterize):
+        """Switches all the traces, and the ones made after, between drawing their waveforms as canvas items and as images"""
+        self.rasterTraces = rasterize
+        with self.transaction():
+            for trace in self.traces:
+                trace.setRasterize(rasterize)
+
     def redrawAllXaxies(self):
         """Redraws all the x axies"""
         for trace in self.traces:
@@ -444,21 +725,17 @@ class Interface:
         for trace in self.traces:
             trace.redrawYaxis() 
 
-    def durations(self):
-        """Returns a list of all the durations in all the traces"""
-        durations = []
-        for trace in self.traces:
-            durations.extend(trace.durations)
-        return durations
-    
     def canvases(self):
-        """Returns a list of all canvases"""
-        return [t.canvas for t in self.traces]
-    
-    def bindCanvasesDrag(self, method):
-        """Binds all canvases' <B1-Motion> (left mouse drag) to the given method."""
-        for canvas in self.canvases():
-            canvas.bind('<B1-Motion>', method)
+        """Returns a list of all canvases; stacked traces share one"""
+        canvases = []
+        for trace in self.traces:
+            if trace.canvas not in canvases:
+                canvases.append(trace.canvas)
+        return canvases
+
+    def traceAt(self, eventObj):
+        """Returns the trace drawn where the mouse event happened, or None"""
+        return find(lambda t: (t.canvas == eventObj.widget) and t.containsY(t.canvas.canvasy(eventObj.y)), self.traces)
     
     #all traces have the same x axis, so we can keep these functions in the interface
     def maxTime(self):
@@ -473,14 +750,6 @@ class Interface:
         """Converts from canvas x coordinate to time"""
         return float(self.maxTime())/self.viewWidth * x
   
-    def setValue(self, nameString, newValue):
-        """Sets the value with name nameString to newValue"""
-        self.valueNamed(nameString).setValue(newValue, True)
-      
-    def setTime(self, nameString, newTime):
-        """Sets the time with name nameString to newTime"""
-        self.timeNamed(nameString).setTime(newTime, True)
-      
     def addTime(self, name=None, time=None, eventObject=None):
         """Adds a time, either given by a name and time, or by a click on the canvas and the name in the entry box. Then it updates the traces."""
         if eventObject != None: #then this addTime was in response to a click
@@ -498,10 +767,11 @@ class Interface:
             newTime = ViewTime(name,time,False,self)
             self.times.append(newTime) #add this new time to the list of times
       
+            newTime.disp('times')
             for trace in self.traces:
-	        trace.addTime(newTime)
-      
-            self.redrawValueFrame() #added a new time (and thus new durations), so redraw the value frame
+	        trace.addTime(newTime) #this also updates the rows for the durations that get split
+            if self.traceStack != None:
+                self.traceStack.redrawTimes()
         else: #there's already a time with that name
             pass #todo: throw an error
       
@@ -521,6 +791,7 @@ class Interface:
     
         for trace in self.traces: #there's a duration to remove in every trace
             trace.deleteTime(viewTime)
+        self.repeats = [r for r in self.repeats if (r.startViewTime != viewTime) and (r.endViewTime != viewTime)] #a repeat can't outlive its start or end time
 
         #it could be that there are values no longer in use now that we deleted some durations. If so, remove them.
         self.removeUnusedValues()
@@ -530,49 +801,15 @@ class Interface:
   
     def removeUnusedValues(self):
         """Removes all the values that aren't used in at least one duration."""
+        if self.deferRedraw('removeUnusedValues'):
+            return
         valuesInUse = [d.assocViewValue for d in self.durations()]
+        for value in self.values:
+            if value not in valuesInUse:
+                value.undisp()
         self.values = filter(lambda v: v in valuesInUse, self.values) #values now only has values in use
   
-    def timeNamed(self, name):
-        """Returns the time with the given name"""
-        time = find(lambda t: t.name == name, self.times)
-        if time == None:
-            raise NameError("There is no time named {}.".format(name))
-        else:
-            return time
-    
-    def valueNamed(self, name):
-        """Returns the value with the given name"""
-        value = find(lambda v: v.name == name, self.values)
-        if value == None:
-            raise NameError("There is no value named {}.".format(name))
-        else:
-            return value
-    
-    def traceNamed(self, name):
-        """Returns the trace with the given name"""
-        trace = find(lambda t: t.name == name, self.traces)
-        if trace == None:
-            raise NameError("There is no trace named {}.".format(name))
-        else:
-            return trace
-      
-    def timeArray(self):
-        """Retruns array of all times, in 1ns steps, from start to end."""
-        return range(self.start.time, self.end.time)
-      
     def toDict(self):
         """Retrurns a dict that describes this Interface. For use in saving the experiment."""
-        d = {}
-        d['code'] = self.codeText.get('1.0', 'end')
-        d['times'] = [t.toDict() for t in self.times]
-        d['values'] = [v.toDict() for v in self.values]
-        d['traces'] = [t.toDict() for t in self.traces]
-        d['variables'] = {}
-        #save all numeric variables that are in self.variables but not in globals(); those are the variables the user made
-        for varName in self.variables:
-            if (varName not in globals()) and isinstance(self.variables[varName], (int, long, float, complex)):
-	        d['variables'][varName] = self.variables[varName]
-        return d
-    '''
-
+        self.code = self.codeText.get('1.0', 'end')
+        return Experiment.toDict(self)
@@ -0,0 +1,92 @@
+#!  /usr/bin/env python
+
+#   Measures how much memory the view objects take, e.g. to check what __slots__ saves
+
+import os
+import sys
+import subprocess
+import argparse
+from qubit_model import *
+
+#subclasses without __slots__, so their instances get a __dict__ like the view objects had before they used __slots__
+class DictViewTime(ViewTime):
+    pass
+
+class DictViewValue(ViewValue):
+    pass
+
+class DictViewDuration(ViewDuration):
+    pass
+
+def instanceSize(obj):
+    """Returns the bytes taken by an object and its __dict__ (if it has one), not counting the objects its attributes refer to"""
+    size = sys.getsizeof(obj)
+    if hasattr(obj, '__dict__'):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+def residentMemory():
+    """Returns the resident memory of this process in bytes, read from /proc, or None if it can't be read (e.g. not on Linux)"""
+    try:
+        f = open('/proc/self/statm', 'r')
+        pages = int(f.read().split()[1])
+        f.close()
+    except (IOError, IndexError, ValueError):
+        return None
+    return pages*os.sysconf('SC_PAGE_SIZE')
+
+def makeObjects(times, withDict=False):
+    """Makes the given number of times, one value, and two durations per time (as if each time had been added to two traces), the way loading an experiment does. Returns them in a list so they stay alive."""
+    (timeClass, valueClass, durationClass) = (DictViewTime, DictViewValue, DictViewDuration) if withDict else (ViewTime, ViewValue, ViewDuration)
+    experiment = Experiment()
+    trace = Trace('benchmark', experiment)
+    value = valueClass('value', 1.0, False, experiment)
+    objects = [value]
+    last = timeClass('t0', 0, False, experiment)
+    objects.append(last)
+    for i in range(1, times + 1):
+        time = timeClass('t{}'.format(i), i, False, experiment)
+        objects.append(time)
+        objects.append(durationClass('a{}'.format(i), last, time, value, experiment, trace))
+        objects.append(durationClass('b{}'.format(i), last, time, value, experiment, trace))
+        last = time
+    return objects
+
+def measure(times, withDict):
+    """Returns a dict of the size of each kind of view object and how much the resident memory grew making them"""
+    before = residentMemory()
+    objects = makeObjects(times, withDict)
+    after = residentMemory()
+    sizes = {}
+    for obj in objects[:4]: #a value, a time, and a duration
+        sizes[type(obj).__name__.replace('Dict', '')] = instanceSize(obj)
+    return {'sizes': sizes, 'grewBy': (after - before) if (before != None) and (after != None) else None}
+
+def report(label, result):
+    """Writes one measurement to stdout"""
+    sizes = ', '.join('{} {} bytes'.format(name, size) for (name, size) in sorted(result['sizes'].items()))
+    grewBy = '{:.1f} MB'.format(result['grewBy']/1e6) if result['grewBy'] != None else 'unknown'
+    sys.stdout.write('{}: {}; resident memory grew by {}\n'.format(label, sizes, grewBy))
+
+def main(argv=None):
+    """Measures the view objects with __slots__ and, unless --slots-only is given, without, each in a fresh process so the resident memory figures don't mix"""
+    parser = argparse.ArgumentParser(description='Measure the memory taken by the view objects of a large experiment.')
+    parser.add_argument('-n', '--times', type=int, default=200000, help='how many times to make; two durations are made for each')
+    parser.add_argument('--with-dict', action='store_true', help='measure versions of the view objects that have a __dict__ instead of __slots__')
+    parser.add_argument('--slots-only', action='store_true', help="don't also measure the versions with a __dict__, for comparison")
+    parser.add_argument('--single', action='store_true', help=argparse.SUPPRESS) #measure in this process; used for the fresh processes
+    args = parser.parse_args(argv)
+
+    if args.single:
+        report('with __dict__' if args.with_dict else 'with __slots__', measure(args.times, args.with_dict))
+        return 0
+    runs = [[]] if args.slots_only else [[], ['--with-dict']]
+    for extra in runs:
+        sys.stdout.flush()
+        code = subprocess.call([sys.executable, os.path.abspath(__file__), '--single', '-n', str(args.times)] + extra)
+        if code != 0:
+            return code
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
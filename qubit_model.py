@@ -0,0 +1,377 @@
+from qubit_views import *
+from qubit_code import *
+from qubit_evaluate import *
+
+class Repeat:
+    """A block of the experiment, from one time to another, that's played count times in a row (e.g. a Rabi train); it's only in the experiment once, and is compiled once and sent as a loop"""
+    def __init__(self, name, startViewTime, endViewTime, count):
+        self.name = name
+        self.startViewTime = startViewTime
+        self.endViewTime = endViewTime
+        self.count = count
+
+    def toDict(self):
+        """Retrurns a dict that describes this repeat. For use in saving the experiment."""
+        return {'name': self.name, 'start': self.startViewTime.name, 'end': self.endViewTime.name, 'count': self.count}
+
+    def start(self):
+        """Returns the time of the start time"""
+        return self.startViewTime.time
+
+    def end(self):
+        """Returns the time of the end time"""
+        return self.endViewTime.time
+
+    def length(self):
+        """Returns how long one pass through the block takes, in ns"""
+        return self.end() - self.start()
+
+    def extraTime(self):
+        """Returns how much later everything after the block is played because of the repeats, in ns"""
+        return (self.count - 1)*self.length()
+
+    def contains(self, time):
+        """Returns True if the given time (in ns) is in the block"""
+        return self.start() <= time < self.end()
+
+    def splits(self, start, end):
+        """Returns True if the span from start to end crosses the start or end of the block, so that it's partly in and partly out of it"""
+        return (start < self.start() < end) or (start < self.end() < end)
+
+def unrollCompiled(compiled):
+    """Returns a compiled trace with each repeated block written out count times, for hardware that can't loop"""
+    unrolled = []
+    for segment in compiled:
+        if segment[0] == 'repeat':
+            (kind, start, end, count, body) = segment
+            for k in range(count):
+                for part in unrollCompiled(body):
+                    offset = k*(end - start)
+                    if part[0] == 'samples':
+                        unrolled.append((part[0], part[1] + offset, part[2], part[3]))
+                    else:
+                        unrolled.append((part[0], part[1] + offset, part[2] + offset, part[3]))
+        else:
+            unrolled.append(segment)
+    return unrolled
+
+class Trace:
+    """One trace of an experiment: its durations, and the time grid of the board it's sent to, without the drawing that ViewTrace adds"""
+    def __init__(self, name, interface, samplePeriod=1, clockGranularity=1):
+        self.name = name
+        self.interface = interface
+        self.times = interface.times
+        self.start = interface.start
+        self.end = interface.end
+        self.durations = []
+
+        #the time grid of the board this trace is sent to. Durations are evaluated, drawn, and compiled at its sample times.
+        self.samplePeriod = samplePeriod #ns between samples, i.e. 1/(sample rate in GS/s)
+        self.clockGranularity = clockGranularity #ns; the times of durations on this board have to be multiples of this
+        self.minDuration = None #ns; the shortest duration the board can play. None means one sample period.
+        self.maxAmplitude = None #the largest value (positive or negative) the board can put out. None means there's no limit.
+
+    def toDict(self):
+        """Retrurns a dict that describes this trace. For use in saving the experiment."""
+        return {'name': self.name, 'durations': [d.toDict() for d in self.durations], 'samplePeriod': self.samplePeriod, 'clockGranularity': self.clockGranularity,
+                'minDuration': self.minDuration, 'maxAmplitude': self.maxAmplitude}
+
+    def segments(self):
+        """Returns the trace as a list of Segments from first to last, with each repeated block in it once. Neighbouring durations with the same constant value are joined in to a single run, unless they're on either side of the start or end of a repeat."""
+        boundaries = set([r.start() for r in self.interface.repeats] + [r.end() for r in self.interface.repeats])
+        segments = []
+        for dur in self.sortedDurations():
+            segment = dur.segment()
+            if (len(segments) > 0) and segments[-1].joins(segment) and (segment.start not in boundaries):
+                segments[-1] = Segment(segments[-1].start, segment.end, segments[-1].viewValue, self.samplePeriod)
+            else:
+                segments.append(segment)
+        return segments
+
+    def compile(self, evaluator=None):
+        """Returns the trace as it's sent to hardware: the compiled segments in the order they're played, with each repeated block compiled once as ('repeat', start, end, count, body). Function segments are evaluated through evaluator, if it's given. Raises a SequenceError if a duration crosses a block, or a function duration has no samples."""
+        repeats = sorted(self.interface.repeats, key=lambda r: r.start())
+        compiled = []
+        shift = 0 #how much later than its time in the experiment each segment is played, because of the blocks before it
+        block = None #the repeat the segments are being put in, if any
+        body = []
+        for segment in self.segments():
+            crossed = find(lambda r: r.splits(segment.start, segment.end), repeats)
+            if crossed != None:
+                raise SequenceError('A duration on {} crosses the start or end of the repeat {}.'.format(self.name, crossed.name))
+            if (not segment.isConstant()) and (segment.sampleCount() == 0):
+                raise SequenceError('The function duration on {} from {} to {} ns has no samples at its sample period of {} ns.'.format(self.name, segment.start, segment.end, self.samplePeriod))
+            if (block != None) and not block.contains(segment.start):
+                compiled.append(('repeat', block.start() + shift, block.end() + shift, block.count, tuple(body)))
+                shift += block.extraTime()
+                block = None
+            if block == None:
+                block = find(lambda r: r.contains(segment.start), repeats)
+                body = []
+            if block != None:
+                body.append(segment.compiled(shift, evaluator))
+            else:
+                compiled.append(segment.compiled(shift, evaluator))
+        if block != None:
+            compiled.append(('repeat', block.start() + shift, block.end() + shift, block.count, tuple(body)))
+        return compiled
+
+    def sequenceHash(self):
+        """Returns a hash of the compiled trace; traces with the same hash send the same thing to hardware"""
+        return hash((self.samplePeriod, tuple(self.compile())))
+
+    def sampleTimes(self, start=None, end=None):
+        """Returns this trace's sample times from start to end (by default, from the start to the end of the experiment)"""
+        if start == None:
+            start = self.start.time
+        if end == None:
+            end = self.end.time
+        return gridTimes(start, end, self.samplePeriod)
+
+    def values(self):
+        """Returns a list of all values associated with durations on this trace"""
+        return [d.assocViewValue for d in self.durations]
+
+    def sortedDurations(self):
+        """Returns the durations, sorted from first to last"""
+        return sorted(self.durations, key=lambda d: d.start())
+
+    def durationStartingAt(self, viewTime):
+        """Returns the duration starting at the given ViewTime"""
+        return find(lambda d: d.startViewTime == viewTime, self.durations)
+
+    def durationEndingAt(self, viewTime):
+        """Returns the duration ending at the given time"""
+        return find(lambda d: d.endViewTime == viewTime, self.durations)
+
+    def durationNamed(self, name):
+        """Returns the duration named name"""
+        return find(lambda d: d.name == name, self.durations)
+
+class Experiment:
+    """The times, values, traces, variables, and code of an experiment, without any GUI; the Interface is an Experiment that replaces its redraw methods, which do nothing here"""
+    def __init__(self):
+        #Will hold the variables for executing code: the math library's names plus any numeric variables made by the code
+        self.variables = baseNamespace()
+        self.timeResolution = 1 #ns; all times are rounded to multiples of this. The traces' boards can have coarser time grids of their own.
+        self.times = []
+        self.values = []
+        self.traces = []
+        self.repeats = [] #the blocks that are played more than once
+        self.start = None
+        self.end = None
+        self.code = '' #the code from the code frame
+
+    def makeTrace(self, name, row, samplePeriod, clockGranularity):
+        """Returns a new, empty trace for loadExperimentDict"""
+        return Trace(name, self, samplePeriod, clockGranularity)
+
+    def loadExperimentDict(self, loaded):
+        """Replaces the experiment with the one described by loaded (a dict like the one toDict returns)"""
+        self.timeResolution = loaded.get('timeResolution', 1) #need this before making the times, since they get rounded to it
+
+        #first, make the times
+        self.times = []
+        for time in loaded['times']:
+            t = ViewTime(time['name'], time['time'], time['locked'], self)
+            self.times.append(t)
+            #if it's start or end, take special care of it
+            if t.name == 'start':
+                self.start = t
+            elif t.name == 'end':
+                self.end = t
+
+        #next, handle the values
+        self.values = []
+        for value in loaded['values']:
+            v = ViewValue(value['name'], value['value'], value['locked'], self, mode = value['mode'], functionText = value['functionText'])
+            self.values.append(v)
+
+        #finally take care of the traces and their durations
+        self.traces = []
+        for (row, trace) in enumerate(loaded['traces']):
+            t = self.makeTrace(trace['name'], row, trace.get('samplePeriod', 1), trace.get('clockGranularity', 1))
+            t.minDuration = trace.get('minDuration')
+            t.maxAmplitude = trace.get('maxAmplitude')
+            self.traces.append(t)
+            for duration in trace['durations']:
+                dur = ViewDuration(duration['name'], self.timeNamed(duration['start']), self.timeNamed(duration['end']), self.valueNamed(duration['value']), self, t, locked=duration['locked'])
+                t.durations.append(dur)
+
+        self.repeats = [Repeat(r['name'], self.timeNamed(r['start']), self.timeNamed(r['end']), r['count']) for r in loaded.get('repeats', [])]
+
+        #add the variables in to our dictionary; apparently this is the cleanest way to do this
+        self.variables = dict(self.variables.items() + loaded['variables'].items())
+        self.invalidate(loaded['variables'].keys()) #any values using the variables have to be remade
+        self.code = loaded['code']
+
+    def toDict(self):
+        """Retrurns a dict that describes this experiment. For use in saving the experiment."""
+        d = {}
+        d['code'] = self.code
+        d['times'] = [t.toDict() for t in self.times]
+        d['values'] = [v.toDict() for v in self.values]
+        d['traces'] = [t.toDict() for t in self.traces]
+        d['repeats'] = [r.toDict() for r in self.repeats]
+        d['timeResolution'] = self.timeResolution
+        d['variables'] = {}
+        #save all numeric variables that are in self.variables but not from the math library; those are the variables the user made
+        for varName in self.variables:
+            if isUserVariable(varName, self.variables[varName]):
+                d['variables'][varName] = self.variables[varName]
+        return d
+
+    def codeNamespace(self):
+        """Returns a namespace to run the code in. It holds the user's numeric variables and the times (in ns) and values as numbers."""
+        namespace = baseNamespace()
+        for varName in self.variables:
+            if isUserVariable(varName, self.variables[varName]):
+                namespace[varName] = self.variables[varName]
+        for time in self.times:
+            namespace[time.name] = time.time #add all the times to variables
+        for value in self.values:
+            namespace[value.name] = value.value #add all the values to variables
+        return namespace
+
+    def executeCode(self, timeout=None):
+        """Runs the code and applies its results, waiting until it's done. Raises the code's exception if it raises one, or CodeCancelled if it runs for longer than timeout seconds."""
+        runner = CodeRunner(self.code, self.codeNamespace(), timeout)
+        runner.start()
+        while not runner.done():
+            runner.checkTimeout()
+            runner.thread.join(0.05)
+        if runner.error != None:
+            raise runner.error[0], runner.error[1], runner.error[2]
+        self.applyCodeResults(runner.namespace)
+
+    def applyCodeResults(self, namespace):
+        """Sets any times and values that the code changed, and keeps the numeric variables it made"""
+        timeNames = [t.name for t in self.times]
+        valueNames = [v.name for v in self.values]
+        changedVariables = []
+        for (varName, var) in namespace.items():
+            if varName in timeNames:
+                if var != self.timeNamed(varName).time:
+                    self.setTime(varName, var)
+            elif varName in valueNames:
+                if var != self.valueNamed(varName).value:
+                    self.setValue(varName, var)
+            elif isUserVariable(varName, var) and (self.variables.get(varName) != var):
+                self.variables[varName] = var
+                changedVariables.append(varName)
+        #only the traces with values that use the changed variables need redrawing
+        self.redrawTracesWith(self.invalidate(changedVariables))
+
+    def deleteVar(self, varName):
+        """Deletes the numeric variable named varName, and marks the function mode values that use it as needing their lambdas remade"""
+        del self.variables[varName]
+        self.redrawTracesWith(self.invalidate([varName]))
+
+    def invalidate(self, names):
+        """Marks the function mode values that use the times, values, or variables with the given names (directly or through other values) as needing their lambdas remade. Returns them, in the order they should be recomputed."""
+        stale = dependents(self.values, names)
+        for value in stale:
+            value.stale = True
+        return stale
+
+    def deferRedraw(self, *what):
+        """Returns True if drawing 'what' should be put off; the Interface puts it off during transactions. There's nothing to draw here."""
+        return False
+
+    def redrawTracesWith(self, values):
+        """Redraws only the traces that use any of the given values"""
+        pass
+
+    def redrawAllCanvases(self):
+        """Redraws all the canvases"""
+        pass
+
+    def redrawAllXaxies(self):
+        """Redraws all the x axies"""
+        pass
+
+    def redrawAllYaxies(self):
+        """Redraws all the y axies"""
+        pass
+
+    def addRepeat(self, name, startName, endName, count):
+        """Makes the block from the time named startName to the one named endName be played count times, and returns the Repeat. Raises a SequenceError if the block would overlap another one."""
+        repeat = Repeat(name, self.timeNamed(startName), self.timeNamed(endName), int(count))
+        if (repeat.length() <= 0) or (repeat.count < 1):
+            raise SequenceError('A repeat has to end after it starts and be played at least once.')
+        for other in self.repeats:
+            if (repeat.start() < other.end()) and (other.start() < repeat.end()):
+                raise SequenceError('The repeat {} would overlap the repeat {}.'.format(name, other.name))
+        self.repeats.append(repeat)
+        self.redrawAllCanvases()
+        return repeat
+
+    def repeatNamed(self, name):
+        """Returns the repeat with the given name"""
+        repeat = find(lambda r: r.name == name, self.repeats)
+        if repeat == None:
+            raise NameError("There is no repeat named {}.".format(name))
+        else:
+            return repeat
+
+    def durations(self):
+        """Returns a list of all the durations in all the traces"""
+        durations = []
+        for trace in self.traces:
+            durations.extend(trace.durations)
+        return durations
+
+    def setValue(self, nameString, newValue):
+        """Sets the value with name nameString to newValue"""
+        self.valueNamed(nameString).setValue(newValue, True)
+
+    def setTime(self, nameString, newTime):
+        """Sets the time with name nameString to newTime"""
+        self.timeNamed(nameString).setTime(newTime, True)
+
+    def timeNamed(self, name):
+        """Returns the time with the given name"""
+        time = find(lambda t: t.name == name, self.times)
+        if time == None:
+            raise NameError("There is no time named {}.".format(name))
+        else:
+            return time
+
+    def valueNamed(self, name):
+        """Returns the value with the given name"""
+        value = find(lambda v: v.name == name, self.values)
+        if value == None:
+            raise NameError("There is no value named {}.".format(name))
+        else:
+            return value
+
+    def traceNamed(self, name):
+        """Returns the trace with the given name"""
+        trace = find(lambda t: t.name == name, self.traces)
+        if trace == None:
+            raise NameError("There is no trace named {}.".format(name))
+        else:
+            return trace
+
+    def timeArray(self, step=None):
+        """Retruns array of all times from start to end that are multiples of step (in ns). By default, step is the time resolution."""
+        if step == None:
+            step = self.timeResolution
+        return gridTimes(self.start.time, self.end.time, step)
+
+    def evaluate(self, step=None):
+        """Returns the values of all the traces, in one (number of traces, number of samples) numpy array, on a shared time base with step ns between samples (by default, the finest sample period)"""
+        return ExperimentEvaluator(self, step).evaluate()
+
+    def compileTraces(self, traces=None):
+        """Returns a dict of trace name to compiled trace (see Trace.compile) for the given traces (by default, all of them), evaluating each function value only once for all of them"""
+        evaluator = ExperimentEvaluator(self)
+        return dict((t.name, t.compile(evaluator)) for t in (traces if traces != None else self.traces))
+
+    def roundTime(self, time):
+        """Rounds time to the nearest multiple of the time resolution"""
+        steps = int(round(time/float(self.timeResolution)))
+        if self.timeResolution == int(self.timeResolution):
+            return steps*int(self.timeResolution) #keep times integers when we can
+        else:
+            return steps*self.timeResolution
@@ -0,0 +1,90 @@
+import collections
+import hashlib
+import threading
+import numpy
+
+class LRUCache:
+    """A dictionary-like cache of numpy arrays holding at most maxBytes of them; when it's full, the least recently used arrays are dropped. It can be used from several threads at once."""
+    def __init__(self, maxBytes=64*2**20):
+        self.maxBytes = maxBytes
+        self.items = collections.OrderedDict()
+        self.size = 0 #the bytes taken by the arrays in the cache
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, make):
+        """Returns the array for key, calling make() to make it if it isn't in the cache"""
+        with self.lock:
+            item = self.items.pop(key, None)
+            if item is not None:
+                self.hits += 1
+                self.items[key] = item #reinserting puts it at the most recently used end
+                return item
+            self.misses += 1
+        item = make() #made outside the lock, so other threads aren't held up; if two make the same one, the second replaces the first
+        self.insert(key, item)
+        return item
+
+    def insert(self, key, item):
+        """Puts the array in the cache, dropping the least recently used ones until it fits. An array bigger than the whole cache isn't kept."""
+        with self.lock:
+            old = self.items.pop(key, None)
+            if old is not None:
+                self.size -= old.nbytes
+            self.items[key] = item
+            self.size += item.nbytes
+            while self.size > self.maxBytes:
+                (dropped, droppedItem) = self.items.popitem(last=False) #the first item is the least recently used
+                self.size -= droppedItem.nbytes
+
+    def clear(self):
+        """Empties the cache"""
+        with self.lock:
+            self.items.clear()
+            self.size = 0
+
+#sampled pulse envelopes are shared by all the pulse shapes
+envelopeCache = LRUCache()
+
+class PulseShape:
+    """A parameterized pulse envelope that can be used in function text, e.g. 'amp*gaussian(t, 50e-9, 10e-9)'; given an array of times (in s), the sampled envelope is kept in envelopeCache"""
+    def __init__(self, name, formula):
+        self.name = name
+        self.formula = formula #function of (t, *parameters) written with numpy so that it works on arrays
+
+    def __call__(self, t, *parameters):
+        if numpy.ndim(t) == 0:
+            return float(self.formula(numpy.float64(t), *parameters))
+        t = numpy.ascontiguousarray(t, dtype=float)
+        key = (self.name, parameters, t.shape, hashlib.sha1(t.tobytes()).hexdigest()) #keyed on every time, since the times needn't be evenly spaced
+        return envelopeCache.get(key, lambda: self.sample(t, parameters))
+
+    def sample(self, t, parameters):
+        """Returns the envelope at the array of times t, as an array that can't be changed (since it's shared through the cache)"""
+        envelope = numpy.array(numpy.broadcast_to(self.formula(t, *parameters), t.shape), dtype=float)
+        envelope.flags.writeable = False
+        return envelope
+
+def gaussianFormula(t, center, sigma):
+    """A gaussian with its peak (of 1) at center"""
+    return numpy.exp(-(t - center)**2/(2.0*sigma**2))
+
+def dragFormula(t, center, sigma, beta):
+    """The quadrature part of a DRAG pulse: beta times the derivative of a gaussian"""
+    return -beta*(t - center)/sigma**2 * gaussianFormula(t, center, sigma)
+
+def cosineRampFormula(t, start, rise):
+    """Rises from 0 at start to 1 at start+rise along half a cosine, and stays at 1 after that"""
+    x = numpy.clip((t - start)/float(rise), 0.0, 1.0)
+    return 0.5*(1 - numpy.cos(numpy.pi*x))
+
+def flatTopFormula(t, start, length, rise):
+    """Rises along a cosine ramp from start, stays at 1, and falls along a cosine ramp so that it's back to 0 at start+length"""
+    return cosineRampFormula(t, start, rise) * cosineRampFormula(-t, -(start + length), rise)
+
+#the pulse shapes that can be used in function text, by name
+pulseShapes = {'gaussian': PulseShape('gaussian', gaussianFormula),
+               'drag': PulseShape('drag', dragFormula),
+               'cosineRamp': PulseShape('cosineRamp', cosineRampFormula),
+               'flatTop': PulseShape('flatTop', flatTopFormula)}
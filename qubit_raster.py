@@ -0,0 +1,165 @@
+import base64
+import numpy
+from qubit_views import *
+from qubit_evaluate import *
+
+#colours of the parts of a trace, as they're drawn by ViewTrace.redrawCanvas
+colours = {'black': (0, 0, 0), 'blue': (0, 0, 255), 'green': (0, 160, 0), 'red': (255, 0, 0), 'white': (255, 255, 255)}
+
+def columnSpans(xs, ys, width, height):
+    """Returns the top and bottom row that a line through the points (xs, ys), with xs sorted, covers in each of width pixel columns, as two integer arrays. Columns the line doesn't reach have top > bottom."""
+    top = numpy.full(width, height, dtype=int)
+    bottom = numpy.full(width, -1, dtype=int)
+    columns = numpy.floor(numpy.asarray(xs, dtype=float)).astype(int)
+    ys = numpy.asarray(ys, dtype=float)
+    inView = (columns >= 0) & (columns < width)
+    if not inView.any():
+        return top, bottom
+    columns = columns[inView]
+    ys = ys[inView]
+
+    used, firsts = numpy.unique(columns, return_index=True)
+    lasts = numpy.append(firsts[1:], len(columns)) - 1
+    lows = numpy.minimum.reduceat(ys, firsts)
+    highs = numpy.maximum.reduceat(ys, firsts)
+
+    #every column from the first point to the last takes the envelope of its own points, or holds the last y before it like the boards do
+    span = slice(used[0], used[-1] + 1)
+    source = numpy.full(width, -1, dtype=int)
+    source[used] = numpy.arange(len(used))
+    source = numpy.maximum.accumulate(source)[span] #the last used column at or before each column
+    held = ys[lasts][source]
+    own = numpy.zeros(width, dtype=bool)
+    own[used] = True
+    own = own[span]
+    low = numpy.where(own, lows[source], held)
+    high = numpy.where(own, highs[source], held)
+    low[1:] = numpy.minimum(low[1:], held[:-1]) #join on to the column before
+    high[1:] = numpy.maximum(high[1:], held[:-1])
+
+    top[span] = numpy.clip(numpy.round(low), 0, height - 1)
+    bottom[span] = numpy.clip(numpy.round(high), 0, height - 1)
+    return top, bottom
+
+class Raster:
+    """An RGB image of one trace, drawn in with numpy array operations rather than as canvas items"""
+    def __init__(self, width, height, background='white'):
+        self.width = width
+        self.height = height
+        self.pixels = numpy.empty((height, width, 3), dtype=numpy.uint8)
+        self.pixels[:, :] = colours[background]
+        self.rows = numpy.arange(height)[:, None]
+
+    def dashMask(self, dash):
+        """Returns which columns are drawn for a line with the given canvas dash pattern: '' for solid, '.' for dotted, or '-' for dashed"""
+        columns = numpy.arange(self.width)
+        if dash == '.':
+            return (columns//2) % 2 == 0
+        elif dash == '-':
+            return (columns//6) % 2 == 0
+        return numpy.ones(self.width, dtype=bool)
+
+    def drawSpans(self, top, bottom, colour, width=1, dash=''):
+        """Fills each column from its top to its bottom row (see columnSpans), thickened by width - 1 pixels"""
+        grow = width//2
+        mask = (self.rows >= top - grow) & (self.rows <= bottom + (width - 1 - grow)) & self.dashMask(dash)
+        self.pixels[mask] = colours[colour]
+
+    def drawLine(self, xs, ys, colour, width=1, dash=''):
+        """Draws a line through the points (xs, ys); xs has to be sorted"""
+        top, bottom = columnSpans(xs, ys, self.width, self.height)
+        self.drawSpans(top, bottom, colour, width, dash)
+
+    def drawHorizontal(self, y, colour, width=1, dash='', x0=0, x1=None):
+        """Draws a horizontal line at y from x0 to x1 (by default, all the way across)"""
+        if x1 == None:
+            x1 = self.width
+        top = numpy.full(self.width, self.height, dtype=int)
+        bottom = numpy.full(self.width, -1, dtype=int)
+        row = int(round(y))
+        if 0 <= row < self.height:
+            top[max(int(x0), 0):max(int(x1), 0)] = row
+            bottom[max(int(x0), 0):max(int(x1), 0)] = row
+        self.drawSpans(top, bottom, colour, width, dash)
+
+    def ppm(self):
+        """Returns the image as a binary PPM"""
+        return 'P6 {} {} 255\n'.format(self.width, self.height) + self.pixels.tostring()
+
+    def photoData(self):
+        """Returns the image in a form Tkinter.PhotoImage(data=...) reads: a base64 encoded PPM. (Tk's photo images can't be given raw RGBA arrays, and binary data doesn't get through Tkinter's strings intact.)"""
+        return base64.b64encode(self.ppm())
+
+def rasterizeTrace(trace, width, height):
+    """Returns a Raster of everything ViewTrace.redrawCanvas draws for a trace apart from the time lines: the zero line, the values, and the durations"""
+    raster = Raster(width, height)
+    sampleTimes = numpy.asarray(trace.sampleTimes(), dtype=float)
+    firstIndex = gridIndices(trace.start.time, trace.end.time, trace.samplePeriod)[0]
+    xs = trace.timeToX(sampleTimes)
+    evaluated = {} #the function mode values evaluated over the sample times so far, used for both their own lines and the durations
+
+    def samples(viewValue):
+        if viewValue not in evaluated:
+            evaluated[viewValue] = evaluateValue(viewValue, sampleTimes*1e-9) #the 1e-9 coverts the time to seconds
+        return evaluated[viewValue]
+
+    #the line for y=0, if it's in range
+    raster.drawHorizontal(trace.valueToY(0), 'black', dash='-', x0=trace.timeToX(trace.start.time), x1=trace.timeToX(trace.end.time))
+
+    #the values
+    for value in distinct(trace.values()):
+        if value.mode == 'constant':
+            raster.drawHorizontal(trace.valueToY(value.value), 'blue', dash='.')
+        else:
+            raster.drawLine(xs, trace.valueToY(samples(value)), 'green', dash='.')
+
+    #the durations, over the values
+    lineXs = []
+    lineYs = []
+    for segment in trace.segments():
+        if segment.isConstant():
+            lineXs.append([trace.timeToX(segment.start), trace.timeToX(segment.end)])
+            lineYs.append(numpy.repeat(trace.valueToY(segment.value()), 2))
+        else:
+            first, stop = gridIndices(segment.start, segment.end, trace.samplePeriod)
+            part = slice(first - firstIndex, stop - firstIndex)
+            lineXs.append(xs[part])
+            lineYs.append(trace.valueToY(samples(segment.viewValue)[part]))
+    if len(lineXs) > 0:
+        raster.drawLine(numpy.concatenate(lineXs), numpy.concatenate(lineYs), 'red', width=2)
+    return raster
+
+def lineAt(trace, x, y, tolerance=4):
+    """Returns the duration or value whose line on the trace passes within tolerance pixels of (x, y), for clicks on a trace drawn as an image; or None if there isn't one"""
+    start = trace.xToTime(x - tolerance)
+    end = trace.xToTime(x + tolerance)
+
+    def distance(viewValue, segmentStart, segmentEnd):
+        #how far y is from the range of ys the value's line covers near x
+        if viewValue.mode == 'constant':
+            ys = [trace.valueToY(viewValue.value)]
+        else:
+            times = numpy.asarray(gridTimes(max(start, segmentStart), min(end, segmentEnd), trace.samplePeriod), dtype=float)
+            if len(times) == 0:
+                return None
+            ys = trace.valueToY(evaluateValue(viewValue, times*1e-9))
+        return max(numpy.min(ys) - y, y - numpy.max(ys), 0)
+
+    def closest(candidates):
+        found = [(d, i, item) for (i, (item, d)) in enumerate(candidates) if (d != None) and (d <= tolerance)]
+        return min(found)[2] if len(found) > 0 else None
+
+    duration = closest([(d, distance(d.assocViewValue, d.start(), d.end())) for d in trace.durations if (d.start() <= end) and (d.end() >= start)])
+    if duration != None: #durations are drawn over values, so they're picked first
+        return duration
+    return closest([(v, distance(v, trace.start.time, trace.end.time)) for v in distinct(trace.values())])
+
+def distinct(items):
+    """Returns items without repeats, in the order they first appear"""
+    seen = set()
+    result = []
+    for item in items:
+        if item not in seen:
+            seen.add(item)
+            result.append(item)
+    return result
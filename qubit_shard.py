@@ -0,0 +1,228 @@
+import collections
+import threading
+import time
+import numpy
+from qubit_model import *
+from qubit_sweep import *
+from qubit_validate import *
+from qubit_telemetry import *
+from qubit_cache import *
+from qubit_averaging import *
+from qubit_upload import *
+
+class WorkerDropped(Exception):
+    """Raised by a worker whose connection to its setup has been lost"""
+    pass
+
+class SweepFailed(Exception):
+    """Raised when every worker of a sharded sweep has dropped out before all the points were run"""
+    pass
+
+class FakeManager:
+    """Stands in for a LabRAD manager and the setup behind it, so that sharded sweeps can be tried out without hardware; like a real setup, what it measures depends on what's been uploaded to it"""
+    def __init__(self, name, delay=0.0, failAfter=None, noise=1.0, uploader=None):
+        self.name = name
+        self.uploader = uploader #if given, the ParallelUploader the uploads are sent to the boards through
+        self.delay = delay #s each point takes
+        self.failAfter = failAfter #if given, the connection drops (raising WorkerDropped) after this many points
+        self.noise = noise #the standard deviation of the shots from acquireShots
+        self.loaded = {} #the last sequence uploaded for each trace, by trace name
+        self.pointsRun = 0
+        self.uploads = 0
+        self.shots = 0
+        self.random = numpy.random.RandomState(0)
+
+    def runPoint(self, parameters, uploads, telemetry):
+        """Uploads the given compiled traces (a dict of trace name to compiled trace), runs the experiment, and returns the measured data. The stages are timed in telemetry."""
+        if (self.failAfter != None) and (self.pointsRun >= self.failAfter):
+            raise WorkerDropped('Lost the connection to {}'.format(self.name))
+        with telemetry.stage('upload'):
+            if self.uploader != None:
+                self.uploader.upload(uploads)
+            self.loaded.update(uploads)
+            self.uploads += len(uploads)
+        with telemetry.stage('trigger'):
+            self.pointsRun += 1
+        with telemetry.stage('acquire'):
+            time.sleep(self.delay)
+            return hash(tuple(sorted((name, tuple(sequence)) for (name, sequence) in self.loaded.items())))
+
+    def acquireShots(self, count, telemetry):
+        """Returns count single shots of the last point run, as an array"""
+        with telemetry.stage('acquire'):
+            signal = (hash(tuple(sorted((name, tuple(sequence)) for (name, sequence) in self.loaded.items()))) % 1000)/1000.0
+            self.shots += count
+            return signal + self.noise*self.random.standard_normal(count)
+
+class FakeSetups:
+    """Makes the workers for a sweep on count simulated setups (see FakeManager), for trying sweeps out without hardware. It's called in the sweep's process, so it's a class rather than a closure."""
+    def __init__(self, count=1, delay=0.0, boards=None, boardLatency=0.0):
+        self.count = count
+        self.delay = delay #s each point takes
+        self.boards = boards #the name of the board each trace is sent to, by trace name; if given, each setup uploads to its FakeBoards all at once through a ParallelUploader
+        self.boardLatency = boardLatency #s each upload to a board takes
+
+    def __call__(self):
+        workers = []
+        for i in range(self.count):
+            uploader = None
+            if self.boards != None:
+                boards = dict((name, FakeBoard(name, self.boardLatency)) for name in set(self.boards.values()))
+                uploader = ParallelUploader(dict((trace, boards[board]) for (trace, board) in self.boards.items()))
+            workers.append(FakeManager('setup {}'.format(i + 1), self.delay, uploader=uploader))
+        return workers
+
+class ShardedSweep:
+    """Runs the points of a sweep across several workers (e.g. identical setups, each behind its own manager connection) at once, each in its own thread with its own contiguous run of the schedule; a worker that runs out steals from the others, and one that fails is dropped and its points picked up by the rest"""
+    def __init__(self, sweep, workers, optimize=True, telemetry=None, cache=None, settings=None, maxAge=None, averaging=None):
+        if len(workers) == 0:
+            raise ValueError('A sharded sweep needs at least one worker.')
+        self.sweep = sweep
+        self.workers = workers #each has runPoint(parameters, uploads, telemetry), which uploads the compiled traces, runs the point, and returns its data, and acquireShots(count, telemetry) if there's averaging
+        self.telemetry = telemetry if telemetry != None else Telemetry() #times each stage of running the points, e.g. for the GUI to show
+        self.schedule = sweep.schedule(optimize)
+        self.queues = [] #the points waiting to be run by each worker
+        self.experimentDict = None #the experiment as it was when the sweep started, for the workers to make their copies from
+        self.results = {} #the data for each point, by logical index
+        self.errors = {} #the exception that made each dropped worker drop out, by worker index
+        self.inFlight = 0 #how many points are being run right now
+        self.condition = threading.Condition()
+        self.cache = cache #the ResultCache to reuse data from, or None to run every point
+        self.averaging = averaging #the AdaptiveAveraging that decides how many shots each point gets, or None to just take the data runPoint returns
+        self.settings = dict(settings) if settings != None else {} #anything besides the sequence that changes what's measured, for the cache keys
+        if averaging != None:
+            self.settings.update(averaging.settings())
+        self.maxAge = maxAge #s; data measured longer ago than this isn't reused. None means it always is.
+        self.cached = set() #the points whose data came from the cache
+        self.onResult = None #if set, called with (logical index, data) as each point's data comes in, e.g. to publish it; the calls are made one at a time
+
+    def split(self):
+        """Cuts the schedule in to one contiguous run of points for each worker"""
+        points = list(self.schedule)
+        size = len(points)/len(self.workers) + (1 if len(points) % len(self.workers) else 0)
+        self.queues = [collections.deque(points[i*size:(i + 1)*size]) for i in range(len(self.workers))]
+
+    def run(self):
+        """Runs all the points, and returns the results in logical order (see dataset). Raises a SequenceError before running anything if any point wouldn't work on the hardware, or SweepFailed if every worker drops out first."""
+        try:
+            SequenceValidator(self.sweep.interface, self.sweep).check()
+            self.experimentDict = self.sweep.interface.toDict() #taken here, since the interface can only be used from the GUI thread
+            self.split()
+            threads = [threading.Thread(target=self.work, args=(i,)) for i in range(len(self.workers))]
+            for thread in threads:
+                thread.daemon = True
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            self.telemetry.finish() #so anything watching the telemetry (e.g. Interface.watchTelemetry) stops, however the sweep ended
+        if len(self.results) < len(self.schedule):
+            raise SweepFailed('{} of {} points were not run; every worker dropped out: {}'.format(len(self.schedule) - len(self.results), len(self.schedule), self.errors))
+        return self.dataset()
+
+    def nextPoint(self, workerIndex):
+        """Returns the next point for the worker to run, stealing one if its own queue is empty. Waits while other workers' points are running, since they could come back if those workers drop out. Returns None when there's nothing left."""
+        with self.condition:
+            while True:
+                queue = self.queues[workerIndex]
+                if len(queue) > 0:
+                    point = queue.popleft()
+                else:
+                    victim = max(self.queues, key=len)
+                    point = victim.pop() if len(victim) > 0 else None #take from the far end, so both workers keep going through contiguous points
+                if point != None:
+                    self.inFlight += 1
+                    return point
+                if self.inFlight == 0:
+                    return None
+                self.condition.wait()
+
+    def finishPoint(self, point, data, cached=False):
+        """Records the data for a point that was run, or that was found in the cache"""
+        with self.condition:
+            self.results[point] = data
+            if cached:
+                self.cached.add(point)
+            if self.onResult != None:
+                self.onResult(point, data)
+
+    def releasePoint(self):
+        """Marks a point taken with nextPoint as no longer running, whether it finished or failed, and wakes the workers waiting for points"""
+        with self.condition:
+            self.inFlight -= 1
+            self.condition.notify_all()
+
+    def dropWorker(self, workerIndex, point, error):
+        """Puts a point that failed back at the front of the worker's queue (for the others to steal), unless its data was already recorded, and drops the worker"""
+        with self.condition:
+            self.errors[workerIndex] = error
+            if (point != None) and (point not in self.results):
+                self.queues[workerIndex].appendleft(point)
+
+    def work(self, workerIndex):
+        """Runs points on one worker until there are none left or it drops out; this is what runs in each worker's thread"""
+        worker = self.workers[workerIndex]
+        try:
+            #the worker changes its experiment as it goes, so it needs its own copy
+            experiment = Experiment()
+            experiment.loadExperimentDict(self.experimentDict)
+            axes = [SweepAxis(parameterNamed(experiment, a.name()), a.points) for a in self.sweep.axes]
+            sweep = Sweep(experiment, axes)
+            touched = [sweep.touchedTraces(a) for a in axes]
+        except Exception as err: #its points are left in its queue for the others to steal
+            self.dropWorker(workerIndex, None, err)
+            return
+        lastPoint = None #the point the worker's setup was last set up for
+        digests = {} #the sequenceDigest of each trace as it is now, by trace name, for the cache keys
+        pending = {} #uploads for points that came from the cache, which haven't been sent to the worker's setup yet
+        while True:
+            point = self.nextPoint(workerIndex)
+            if point == None:
+                return
+            try:
+                self.workPoint(worker, point, lastPoint, experiment, axes, touched, digests, pending)
+            except Exception as err: #anything going wrong with a point (e.g. compiling it, or the connection) drops the worker, not the sweep
+                self.dropWorker(workerIndex, point, err)
+                return
+            finally:
+                self.releasePoint()
+            lastPoint = point
+
+    def workPoint(self, worker, point, lastPoint, experiment, axes, touched, digests, pending):
+        """Sets up, runs (or finds in the cache), and records one point on a worker. pending holds the uploads not yet sent to the worker's setup, and is updated in place."""
+        with self.telemetry.stage('compile'):
+            if lastPoint == None:
+                changed = range(len(axes))
+                traces = experiment.traces
+            else:
+                changed = [i for i in range(len(axes)) if point[i] != lastPoint[i]]
+                traces = [t for t in experiment.traces if len([i for i in changed if t in touched[i]]) > 0]
+            for i in changed:
+                axes[i].apply(point[i])
+            parameters = dict((a.name(), a.points[i]) for (a, i) in zip(axes, point))
+            uploads = experiment.compileTraces(traces)
+        if self.cache != None:
+            with self.telemetry.stage('cache'):
+                for (name, sequence) in uploads.items():
+                    digests[name] = sequenceDigest(sequence)
+                key = pointKey(digests, self.settings)
+                data = self.cache.lookup(key, self.maxAge)
+            if data is not None:
+                pending.update(uploads)
+                self.finishPoint(point, data, cached=True)
+                self.telemetry.pointDone()
+                return
+        pending.update(uploads)
+        data = worker.runPoint(parameters, dict(pending), self.telemetry)
+        if self.averaging != None:
+            data = self.averaging.average(lambda count: worker.acquireShots(count, self.telemetry))
+        pending.clear()
+        with self.telemetry.stage('process'):
+            if self.cache != None:
+                self.cache.store(key, data)
+            self.finishPoint(point, data)
+        self.telemetry.pointDone()
+
+    def dataset(self):
+        """Returns a list of (logical index, data) for all the points that have been run, in logical order (the last index moving fastest)"""
+        return [(point, self.results[point]) for point in nestedOrder(self.sweep.shape()) if point in self.results]
@@ -0,0 +1,122 @@
+import multiprocessing
+import numpy
+from qubit_model import *
+from qubit_sweep import *
+from qubit_shard import *
+
+class SharedDataset:
+    """The averaged data and status line of a sweep, in memory shared between the sweep's process and the GUI's, so the GUI can plot it without it being copied. It has to be made before the sweep's process is started."""
+    running, done, failed = range(3)
+
+    def __init__(self, shape):
+        self.shape = tuple(shape)
+        size = int(numpy.prod(self.shape)) if len(self.shape) > 0 else 1
+        self.buffer = multiprocessing.RawArray('d', size)
+        self.sequence = multiprocessing.RawValue('L', 0) #odd while a point is being written, so a reader that sees the same even count before and after knows its read wasn't torn
+        self.state = multiprocessing.RawValue('i', self.running)
+        self.status = multiprocessing.RawArray('c', 256) #the status line; the lock keeps it from being read half written
+        self.statusLock = multiprocessing.Lock()
+        self.data = self.view()
+        self.data[...] = numpy.nan #points that haven't been measured yet
+
+    def __getstate__(self):
+        #the view can't be pickled; it's remade from the shared buffer
+        state = self.__dict__.copy()
+        del state['data']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.data = self.view()
+
+    def view(self):
+        """Returns a numpy array of the sweep's shape that uses the shared memory, without copying it"""
+        return numpy.frombuffer(self.buffer, dtype=numpy.float64).reshape(self.shape)
+
+    def publish(self, point, value):
+        """Writes the value for one point (given by its logical index). Only one process or thread should write."""
+        self.sequence.value += 1 #odd: being written
+        self.data[point] = value
+        self.sequence.value += 1 #even: done
+
+    def changedSince(self, sequence):
+        """Returns the sequence count if the data has changed since the given count and isn't being written right now, or None otherwise"""
+        current = self.sequence.value
+        if (current == sequence) or (current % 2 == 1):
+            return None
+        return current
+
+    def unchangedSince(self, sequence):
+        """Returns True if nothing has been written since the given count, i.e. a read done since changedSince returned it wasn't torn"""
+        return self.sequence.value == sequence
+
+    def finished(self):
+        """Returns True once the sweep's process has stopped, whether or not it finished all the points"""
+        return self.state.value != self.running
+
+    def setStatus(self, text):
+        """Sets the status line, cut down to fit in the shared memory"""
+        with self.statusLock:
+            self.status.value = text[:len(self.status) - 1]
+
+    def statusText(self):
+        """Returns the status line last set by the sweep's process"""
+        with self.statusLock:
+            text = self.status.value
+        return text if text != '' else 'Starting sweep'
+
+def pointValue(data):
+    """Returns the number plotted for a point's data: its mean over the channels if it's an array (or an AveragedPoint of arrays), or the data itself if it's a number"""
+    if isinstance(data, AveragedPoint):
+        data = data.mean
+    return float(numpy.mean(data))
+
+class AcquisitionProcess(multiprocessing.Process):
+    """Runs a sweep in a process of its own, so it and the GUI don't hold each other up, and publishes each point's data in a SharedDataset. Any error is put on the errors queue."""
+    def __init__(self, experimentDict, axes, makeWorkers, dataset, optimize=True, averaging=None):
+        multiprocessing.Process.__init__(self)
+        self.daemon = True
+        self.experimentDict = experimentDict #the GUI's objects can't go to another process, so the experiment and the sweep are sent as a dict and a list of (parameter name, points)
+        self.axes = axes
+        self.makeWorkers = makeWorkers #called in the new process, since connections to the setups can't be shared between processes
+        self.dataset = dataset
+        self.optimize = optimize
+        self.averaging = averaging
+        self.errors = multiprocessing.Queue()
+
+    def run(self):
+        """Runs the sweep; this is what runs in the new process"""
+        try:
+            experiment = Experiment()
+            experiment.loadExperimentDict(self.experimentDict)
+            sweep = Sweep(experiment, [SweepAxis(parameterNamed(experiment, name), points) for (name, points) in self.axes])
+            sharded = ShardedSweep(sweep, self.makeWorkers(), self.optimize, averaging=self.averaging)
+            unplotted = [] #the points whose data couldn't be turned in to a number to plot
+            def status():
+                if len(unplotted) > 0:
+                    return '{} ({} points could not be plotted)'.format(sharded.telemetry.statusText(), len(unplotted))
+                return sharded.telemetry.statusText()
+            def onResult(point, data):
+                try:
+                    value = pointValue(data)
+                except Exception: #the data is still measured; it just can't be plotted, which shouldn't stop the sweep
+                    value = numpy.nan
+                    unplotted.append(point)
+                self.dataset.publish(point, value)
+                self.dataset.setStatus(status())
+            sharded.onResult = onResult
+            sharded.run()
+            self.dataset.setStatus('Sweep done: ' + status())
+            self.dataset.state.value = SharedDataset.done
+        except Exception as err:
+            error = '{}: {}'.format(type(err).__name__, err)
+            self.errors.put(error)
+            self.dataset.setStatus('Sweep failed: ' + error)
+            self.dataset.state.value = SharedDataset.failed
+
+def startAcquisition(sweep, makeWorkers, optimize=True, averaging=None):
+    """Starts running the sweep in a process of its own, and returns the SharedDataset its data is published in and the AcquisitionProcess"""
+    dataset = SharedDataset(sweep.shape())
+    process = AcquisitionProcess(sweep.interface.toDict(), [(a.name(), a.points) for a in sweep.axes], makeWorkers, dataset, optimize, averaging)
+    process.start()
+    return dataset, process
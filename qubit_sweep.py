@@ -0,0 +1,166 @@
+from qubit_views import *
+
+class SweepAxis:
+    """One parameter of a sweep: a ViewTime or ViewValue, and the points it's swept over"""
+    def __init__(self, parameter, points):
+        self.parameter = parameter
+        self.points = list(points)
+
+    def name(self):
+        """Returns the name of the swept time or value"""
+        return self.parameter.name
+
+    def apply(self, index):
+        """Sets the swept time or value to the point with the given index"""
+        if isinstance(self.parameter, ViewTime):
+            self.parameter.setTime(self.points[index], True)
+        else:
+            self.parameter.setValue(self.points[index], True)
+
+def snakeOrder(sizes):
+    """Returns all the index tuples of a grid with the given sizes in snake order (a reflected Gray code), where the last index moves fastest and each index turns around at the end of its range, so exactly one index changes per step"""
+    if 0 in sizes:
+        return []
+    index = [0]*len(sizes)
+    directions = [1]*len(sizes)
+    order = [tuple(index)]
+    while True:
+        for axis in reversed(range(len(sizes))):
+            nextIndex = index[axis] + directions[axis]
+            if 0 <= nextIndex < sizes[axis]:
+                index[axis] = nextIndex
+                order.append(tuple(index))
+                break
+            directions[axis] = -directions[axis] #this index is at the end of its range; turn it around and move the next one out
+        else: #every index is at the end of its range, so we're done
+            return order
+
+def nestedOrder(sizes):
+    """Returns all the index tuples of a grid with the given sizes, in ordinary nested loop order (the last index moves fastest)"""
+    order = [()]
+    for size in sizes:
+        order = [i + (j,) for i in order for j in range(size)]
+    return order
+
+class Sweep:
+    """A multi-dimensional sweep over the times and values of an experiment, which can run its points so that the parameters that touch the most samples change the least often"""
+    def __init__(self, interface, axes):
+        self.interface = interface
+        self.axes = axes
+
+    def shape(self):
+        """Returns the number of points along each axis"""
+        return tuple(len(a.points) for a in self.axes)
+
+    def touchedTraces(self, axis):
+        """Returns the traces that have to be recompiled when the given axis's parameter changes"""
+        parameter = axis.parameter
+        affectedValues = dependents(self.interface.values, [parameter.name])
+        touched = []
+        for trace in self.interface.traces:
+            if isinstance(parameter, ViewTime):
+                usesParameter = len([d for d in trace.durations if (d.startViewTime == parameter) or (d.endViewTime == parameter)]) > 0
+                #moving the start or end of a repeat changes when everything after it is played, on every trace
+                usesParameter = usesParameter or (len([r for r in self.interface.repeats if (r.startViewTime == parameter) or (r.endViewTime == parameter)]) > 0)
+            else:
+                usesParameter = parameter in trace.values()
+            if usesParameter or (len([v for v in trace.values() if v in affectedValues]) > 0):
+                touched.append(trace)
+        return touched
+
+    def traceSamples(self, trace):
+        """Returns the number of samples uploaded for the given trace"""
+        return len(trace.sampleTimes())
+
+    def cost(self, axis):
+        """Returns the number of samples that have to be uploaded when the given axis's parameter changes"""
+        return sum(self.traceSamples(t) for t in self.touchedTraces(axis))
+
+    def runAxisOrder(self):
+        """Returns the indices of the axes in the order their loops are nested when the sweep is run: most expensive (outermost) first"""
+        return sorted(range(len(self.axes)), key=lambda i: -self.cost(self.axes[i]))
+
+    def schedule(self, optimize=True):
+        """Returns a SweepSchedule of the points in the order to run them. If optimize is False, the points run in the order the axes were given, in ordinary nested loops."""
+        if optimize:
+            axisOrder = self.runAxisOrder()
+            runOrder = snakeOrder([len(self.axes[i].points) for i in axisOrder])
+        else:
+            axisOrder = range(len(self.axes))
+            runOrder = nestedOrder(self.shape())
+        #map the indices back from the run order of the axes to the user's order
+        points = []
+        for runIndex in runOrder:
+            logical = [0]*len(self.axes)
+            for (position, axis) in enumerate(axisOrder):
+                logical[axis] = runIndex[position]
+            points.append(tuple(logical))
+        return SweepSchedule(self, points)
+
+class SweepSchedule:
+    """The points of a sweep, as logical index tuples, in the order they're run"""
+    def __init__(self, sweep, points):
+        self.sweep = sweep
+        self.points = points
+        self.touched = [sweep.touchedTraces(a) for a in sweep.axes] #the traces each axis touches, worked out once
+
+    def __iter__(self):
+        return iter(self.points)
+
+    def __len__(self):
+        return len(self.points)
+
+    def changedAxes(self, step):
+        """Returns the indices of the axes whose point changes going in to the given step of the schedule (all of them for the first step)"""
+        if step == 0:
+            return range(len(self.sweep.axes))
+        return [i for i in range(len(self.sweep.axes)) if self.points[step][i] != self.points[step - 1][i]]
+
+    def tracesToUpload(self, step):
+        """Returns the traces that have to be recompiled and uploaded at the given step of the schedule (all of them for the first step)"""
+        if step == 0:
+            return list(self.sweep.interface.traces)
+        traces = []
+        for i in self.changedAxes(step):
+            for trace in self.touched[i]:
+                if trace not in traces:
+                    traces.append(trace)
+        return traces
+
+    def predictedUploads(self):
+        """Returns a dict with the predicted number of trace uploads and uploaded samples for the whole schedule"""
+        traceSamples = dict((t, self.sweep.traceSamples(t)) for t in self.sweep.interface.traces)
+        uploads = 0
+        samples = 0
+        for step in range(len(self.points)):
+            traces = self.tracesToUpload(step)
+            uploads += len(traces)
+            samples += sum(traceSamples[t] for t in traces)
+        return {'points': len(self.points), 'traceUploads': uploads, 'samples': samples}
+
+def parameterNamed(experiment, name):
+    """Returns the time or value of the experiment with the given name"""
+    if name in [t.name for t in experiment.times]:
+        return experiment.timeNamed(name)
+    return experiment.valueNamed(name)
+
+#a sweep definition looks like:
+#axes:
+#- parameter: t1
+#  points: [10, 20, 30]
+#- parameter: amplitude
+#  start: 0.0
+#  stop: 1.0
+#  steps: 11
+def sweepFromDict(experiment, d):
+    """Returns the Sweep described by d, e.g. as loaded from a YAML sweep definition. Each axis names a time or value of the experiment, and gives either its points, or steps from start to stop (including both)."""
+    axes = []
+    for axis in d['axes']:
+        parameter = parameterNamed(experiment, axis['parameter'])
+        if 'points' in axis:
+            points = axis['points']
+        else:
+            steps = axis['steps']
+            points = [axis['start'] + i*(axis['stop'] - axis['start'])/float(max(steps - 1, 1)) for i in range(steps)]
+        axes.append(SweepAxis(parameter, points))
+    return Sweep(experiment, axes)
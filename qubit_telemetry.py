@@ -0,0 +1,154 @@
+import collections
+import contextlib
+import csv
+import json
+import math
+import threading
+import time
+
+class StageHistogram:
+    """A histogram of how long one stage of running a sweep point takes, with logarithmically spaced buckets so it stays small however many points are run"""
+    smallest = 1e-6 #s; everything faster goes in the first bucket
+    decades = 8 #so the last bucket starts at 100 s
+    bucketsPerDecade = 5 #percentiles are good to within a bucket's width
+
+    def __init__(self):
+        self.counts = [0]*(self.decades*self.bucketsPerDecade + 1)
+        self.count = 0
+        self.total = 0.0
+        self.shortest = None
+        self.longest = None
+
+    def bucket(self, seconds):
+        """Returns the index of the bucket seconds goes in"""
+        if seconds <= self.smallest:
+            return 0
+        return min(int(math.log10(seconds/self.smallest)*self.bucketsPerDecade) + 1, len(self.counts) - 1)
+
+    def bucketEdge(self, index):
+        """Returns the upper edge, in s, of the bucket with the given index"""
+        return self.smallest*10**(index/float(self.bucketsPerDecade))
+
+    def record(self, seconds):
+        """Adds one measurement"""
+        self.counts[self.bucket(seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.shortest = seconds if self.shortest == None else min(self.shortest, seconds)
+        self.longest = seconds if self.longest == None else max(self.longest, seconds)
+
+    def mean(self):
+        """Returns the average time in s, or None if there are no measurements"""
+        return self.total/self.count if self.count > 0 else None
+
+    def percentile(self, q):
+        """Returns the time in s that q percent of the measurements are at or under (the upper edge of the bucket it falls in), or None if there are no measurements"""
+        if self.count == 0:
+            return None
+        needed = q/100.0*self.count
+        seen = 0
+        for (index, count) in enumerate(self.counts):
+            seen += count
+            if seen >= needed and count > 0:
+                return min(self.bucketEdge(index), self.longest)
+        return self.longest
+
+    def toDict(self):
+        """Returns a dict describing the histogram, for writing out as JSON"""
+        return {'count': self.count, 'total_s': self.total, 'mean_s': self.mean(), 'min_s': self.shortest, 'max_s': self.longest,
+                'p50_s': self.percentile(50), 'p90_s': self.percentile(90), 'p99_s': self.percentile(99),
+                'buckets': [{'upTo_s': self.bucketEdge(i), 'count': c} for (i, c) in enumerate(self.counts) if c > 0]}
+
+class Telemetry:
+    """Collects how long each stage of running sweep points takes, timed with 'with telemetry.stage(name): ...', and how many points a second are being run"""
+    stages = ('compile', 'upload', 'trigger', 'acquire', 'process', 'write') #a worker that can't tell some of them apart can time them as one
+    rateWindow = 50 #the current rate is worked out from the last this many points
+
+    def __init__(self):
+        self.histograms = collections.OrderedDict((name, StageHistogram()) for name in self.stages)
+        self.points = 0
+        self.startTime = time.time()
+        self.endTime = None
+        self.recentPoints = collections.deque(maxlen=self.rateWindow) #when the last few points finished
+        self.lock = threading.Lock() #the workers of a ShardedSweep record from several threads at once
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Context manager that times the code in it as one run of the named stage"""
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.record(name, time.time() - start)
+
+    def record(self, name, seconds):
+        """Records that the named stage took seconds"""
+        with self.lock:
+            if name not in self.histograms:
+                self.histograms[name] = StageHistogram()
+            self.histograms[name].record(seconds)
+
+    def pointDone(self):
+        """Records that a point has been run"""
+        with self.lock:
+            self.points += 1
+            self.recentPoints.append(time.time())
+
+    def finish(self):
+        """Records that the sweep is over, which stops the clock for pointsPerSecond"""
+        self.endTime = time.time()
+
+    def finished(self):
+        """Returns True once the sweep is over"""
+        return self.endTime != None
+
+    def pointsPerSecond(self):
+        """Returns the average number of points run a second since the sweep started"""
+        elapsed = (self.endTime if self.endTime != None else time.time()) - self.startTime
+        return self.points/elapsed if elapsed > 0 else 0.0
+
+    def currentPointsPerSecond(self):
+        """Returns the number of points run a second over the last few points"""
+        with self.lock:
+            recent = list(self.recentPoints)
+        if len(recent) < 2 or recent[-1] == recent[0]:
+            return self.pointsPerSecond()
+        return (len(recent) - 1)/(recent[-1] - recent[0])
+
+    def slowestStage(self):
+        """Returns the name of the stage that has taken the most time in total, or None if nothing has been timed"""
+        with self.lock:
+            timed = [(h.total, name) for (name, h) in self.histograms.items() if h.count > 0]
+        return max(timed)[1] if len(timed) > 0 else None
+
+    def statusText(self):
+        """Returns a line describing how the sweep is going, for showing in the GUI"""
+        slowest = self.slowestStage()
+        text = '{} points, {:.1f} points/s'.format(self.points, self.currentPointsPerSecond())
+        if slowest != None:
+            text += ', slowest stage: {} ({:.1f} ms mean)'.format(slowest, self.histograms[slowest].mean()*1e3)
+        return text
+
+    def toDict(self):
+        """Returns a dict describing everything collected, for writing out as JSON"""
+        with self.lock:
+            return {'points': self.points,
+                    'elapsed_s': (self.endTime if self.endTime != None else time.time()) - self.startTime,
+                    'pointsPerSecond': self.pointsPerSecond(),
+                    'stages': collections.OrderedDict((name, h.toDict()) for (name, h) in self.histograms.items() if h.count > 0)}
+
+    def writeJSON(self, fileName):
+        """Writes everything collected to a JSON file"""
+        f = open(fileName, 'w')
+        json.dump(self.toDict(), f, indent=2)
+        f.close()
+
+    def writeCSV(self, fileName):
+        """Writes a CSV file with a row of statistics (in ms) for each stage, so runs can be compared in a spreadsheet"""
+        summary = self.toDict()
+        f = open(fileName, 'wb')
+        writer = csv.writer(f)
+        writer.writerow(['stage', 'count', 'total_ms', 'mean_ms', 'min_ms', 'p50_ms', 'p90_ms', 'p99_ms', 'max_ms', 'points', 'points_per_s'])
+        for (name, stats) in summary['stages'].items():
+            writer.writerow([name, stats['count']] + [stats[key]*1e3 for key in ('total_s', 'mean_s', 'min_s', 'p50_s', 'p90_s', 'p99_s', 'max_s')] + [summary['points'], summary['pointsPerSecond']])
+        f.close()
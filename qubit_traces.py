@@ -1,18 +1,20 @@
 import ttk
 import Tkinter
-from qubit_views import *
+from qubit_model import *
+from qubit_raster import *
 
 
-class ViewTrace:
+class ViewTrace(Trace):
     """Handles all the widgets for one trace and the durations that go with it"""
-    def __init__(self, name, interface, row, initialValue):
-        self.name = name
-        self.interface = interface
+    def __init__(self, name, interface, row, initialValue, samplePeriod=1, clockGranularity=1, stack=None, render=True):
+        """If initialValue is None, the trace starts with no durations. If render is False, nothing is drawn until the trace is redrawn, so that a trace can be filled in before it's drawn for the first time."""
+        Trace.__init__(self, name, interface, samplePeriod, clockGranularity)
         self.row = row
-        self.times = interface.times
-    
-        self.viewFrame = ttk.Labelframe(self.interface.viewFrame, text=name)
-        self.viewFrame.grid (column=0, row=self.row, sticky='nsew', padx=5, pady=5)
+        self.stack = stack #the TraceStack this trace is drawn in as one row, or None if it has a canvas of its own
+        self.tag = 'trace' + str(id(self)) #everything this trace draws on the canvas has this tag
+        self.rasterize = self.interface.rasterTraces #if True, the waveform is drawn as one image rather than a canvas item per value and duration
+        self.image = None #the PhotoImage of the waveform when it's rasterized; the canvas doesn't keep it alive by itself
+        self.selected = None #the duration or value last clicked on a rasterized trace; it's drawn over the image as a canvas item so it can be dragged
     
         self.xAxisLables = [] #will store all the widgets for the x-axis
         self.yAxisLables = [] #will store all the widgets for the y-axis
@@ -23,83 +25,150 @@ class ViewTrace:
         self.minY = None
         self.updateMaxY = True #can make false to supress updating maxY; will make drawing faster
         self.updateMinY = True
+        self.holdScale = False #set while a line is dragged up or down, so the scale stays put while the drag updates the value
 
         #to save typing '.interface' a bazillion times:
         self.timeToX = self.interface.timeToX
         self.xToTime = self.interface.xToTime
         self.viewWidth = self.interface.viewWidth
         self.viewHeight = self.interface.viewHeight
-        self.start = self.interface.start
-        self.end = self.interface.end    
     
         #creat a duration with the initial value
-        self.durations = [ViewDuration('initial', self.start, self.end, initialValue, self.interface, self)]
+        if initialValue != None:
+            self.durations = [ViewDuration('initial', self.start, self.end, initialValue, self.interface, self)]
     
-        self.canvas = Tkinter.Canvas(self.viewFrame, width=self.interface.viewWidth, height=self.interface.viewHeight) #todo: make array so that we can have more than one view
-        self.canvas.grid(column=1, row=0, columnspan=3, rowspan=3, sticky='nsew', padx=5, pady=5)
+        if self.stack != None: #draw in our row of the stack's canvas
+            self.canvas = self.stack.canvas
+            self.yOffset = self.stack.addTrace(self)
+        else:
+            self.yOffset = 0
+            self.viewFrame = ttk.Labelframe(self.interface.viewFrame, text=name)
+            self.viewFrame.grid (column=0, row=self.row, sticky='nsew', padx=5, pady=5)
+
+            self.canvas = Tkinter.Canvas(self.viewFrame, width=self.interface.viewWidth, height=self.interface.viewHeight) #todo: make array so that we can have more than one view
+            self.canvas.grid(column=1, row=0, columnspan=3, rowspan=3, sticky='nsew', padx=5, pady=5)
   
-        self.canvas.bind("<Button-1>",  self.canvasClick)  
-    
-        #make it so that, after dragging an element has ceased, the binding is reset so that further dragging won't move the element unless it gets clicked again first
-        #we do this by binding to any motion on any canvas
-        self.canvas.bind("<Motion>", self.interface.clearCanvasBindings)
+            self.canvas.bind("<Button-1>",  self.canvasClick)  
+            self.interface.drag.bind(self.canvas) #so that lines on the canvas can be dragged
     
+        if render:
+            self.redrawCanvas()
+            self.redrawXaxis()
+            self.redrawYaxis() 
+
+    def setSampling(self, samplePeriod=None, clockGranularity=None):
+        """Sets the sample period and/or clock granularity (both in ns) of the board this trace is sent to, and redraws the trace"""
+        if samplePeriod != None:
+            self.samplePeriod = samplePeriod
+        if clockGranularity != None:
+            self.clockGranularity = clockGranularity
+        self.redrawCanvas()
+
+    def setRasterize(self, rasterize):
+        """Switches between drawing the waveform as canvas items and as an image, and redraws the trace"""
+        self.rasterize = rasterize
+        self.selected = None
+        self.image = None
         self.redrawCanvas()
-        self.redrawXaxis()
-        self.redrawYaxis() 
 
-    def toDict(self):
-        """Retrurns a dict that describes this ViewTrace. For use in saving the experiment."""
-        return {'name': self.name, 'durations': [d.toDict() for d in self.durations]}
-    
     def redrawCanvas(self):
         """Clears the canvas and redraws everything on it"""
+        if self.interface.deferRedraw(self, 'canvas'):
+            return
+        if (self.stack != None) and not self.stack.isVisible(self): #rows that are scrolled out of view get drawn when they come in to view
+            self.stack.markDirty(self)
+            return
     
         self.redrawYaxis() #needed?
         self.updateMaxY = False #to speed up drawing
         self.updateMinY = False #to speed up drawing
     
-        #first, clear everything off the canvas (but don't delete the canvas itself)
-        self.canvas.delete('all')
+        #first, clear everything this trace drew off the canvas (but don't delete the canvas itself)
+        self.canvas.delete(self.tag)
+    
+        if self.rasterize:
+            self.drawRaster()
+        else:
+            self.drawItems()
+
+        #mark the repeated blocks, which are drawn once, with how many times they're played
+        for repeat in self.interface.repeats:
+            (x0, x1) = (self.timeToX(repeat.start()), self.timeToX(repeat.end()))
+            self.canvas.create_line(x0, 8, x0, 2, x1, 2, x1, 8, width=1, fill='purple', tags=self.tag)
+            self.canvas.create_text((x0 + x1)/2.0, 4, text='x{}'.format(repeat.count), anchor='n', fill='purple', tags=self.tag)
+
+        #finally, draw all the ViewTimes; this mean's they're drawn over everything. Traces in a stack share the time lines the stack draws.
+        if self.stack == None:
+            for time in self.interface.times:
+                if (time.name != 'start') and (time.name != 'end'): #don't display anything for start or stop times; that way they can't be edited through the canvas
+                    lineID = self.canvas.create_line(self.timeToX(time.time), 0, self.timeToX(time.time), self.viewHeight, width=2, dash='.', tags=(self.tag, time.canvasTag)) #draw the line
+                    self.canvas.tag_bind(lineID, "<Button-1>",  time.clickMethod) #bind the line to it's clickMethod so that it can be interacted with
+        else:
+            self.canvas.move(self.tag, 0, self.yOffset) #everything was drawn at the top of the canvas; move it down to our row
+            self.canvas.tag_raise('times')
+            self.stack.markDrawn(self)
+	  
+        self.updateMaxY = True #reenable now that we're done drawing
+        self.updateMinY = True
     
-        #next, draw a line for y=0 if it's in range
+    def drawItems(self):
+        """Draws the zero line, the values, and the durations as canvas items, each bound to its clickMethod"""
+        #first, draw a line for y=0 if it's in range
         yorig = self.valueToY(0)
         if (yorig >= 0) and (yorig <= self.interface.viewHeight):
-            coords = [(self.timeToX(self.interface.start.time), yorig), (self.timeToX(self.interface.end.time), yorig)]
-        self.canvas.create_line(*coords, width=1, fill='black', dash='-')
-    
+            self.canvas.create_line(self.timeToX(self.interface.start.time), yorig, self.timeToX(self.interface.end.time), yorig, width=1, fill='black', dash='-', tags=self.tag)
+        
         #next, draw all the ViewValues
         for value in self.values():
             if value.mode == 'constant':
-	        y = self.valueToY(value.maxValue())
-	        lineID = self.canvas.create_line(0, y, self.viewWidth, y, width=1, fill='blue', dash='.')
+                y = self.valueToY(value.maxValue())
+                lineID = self.canvas.create_line(0, y, self.viewWidth, y, width=1, fill='blue', dash='.', tags=(self.tag, self.lineTag(value)))
             else:
-	        times = self.interface.timeArray() #all times from start to end
-	        coords = zip([self.timeToX(t) for t in times], [self.valueToY(v) for v in value.values(times)])
-	        lineID = self.canvas.create_line(*coords, width=1, fill='green', dash='.') #draw ViewValues with functions in green
-        self.canvas.tag_bind(lineID, "<Button-1>",  value.clickMethod)
+                times = self.sampleTimes() #all sample times from start to end
+                coords = zip([self.timeToX(t) for t in times], [self.valueToY(v) for v in value.values(times)])
+                lineID = self.canvas.create_line(*coords, width=1, fill='green', dash='.', tags=(self.tag, self.lineTag(value))) #draw ViewValues with functions in green
+            self.canvas.tag_bind(lineID, "<Button-1>",  value.clickMethod)
  
         #next, draw all the ViewDurations. Because this comes after ViewValues, it's drawn over the ViewValues. That means that when you click a duration, you don't get the ViewValue underneath.
         for dur in self.durations:
-            if dur.assocViewValue.mode == 'constant':
-	        lineID = self.canvas.create_line(self.timeToX(dur.start()), self.valueToY(dur.value()), self.timeToX(dur.end()), self.valueToY(dur.value()), width=2, fill='red')
-            else:
-	        coords = zip([self.timeToX(t) for t in dur.times()], [self.valueToY(v) for v in dur.values()])
-	        lineID = self.canvas.create_line(*coords, width=2, fill='red')
+            lineID = self.canvas.create_line(*dur.segment().coords(self), width=2, fill='red', tags=(self.tag, self.lineTag(dur))) #constant durations are just their two end points
             self.canvas.tag_bind(lineID, "<Button-1>",  dur.clickMethod)
 
-        #finally, draw all the ViewTimes; this mean's they're drawn over everything
-        for time in self.interface.times:
-            if (time.name != 'start') and (time.name != 'end'): #don't display anything for start or stop times; that way they can't be edited through the canvas
-	        lineID = self.canvas.create_line(self.timeToX(time.time), 0, self.timeToX(time.time), self.viewHeight, width=2, dash='.') #draw the line
-	        self.canvas.tag_bind(lineID, "<Button-1>",  time.clickMethod) #bind the line to it's clickMethod so that it can be interacted with
+    def drawRaster(self):
+        """Draws the zero line, the values, and the durations as a single image, plus the selected duration or value as a canvas item. Clicks on the image are matched to a line from the model, by canvasClick."""
+        raster = rasterizeTrace(self, self.viewWidth, self.viewHeight)
+        self.image = Tkinter.PhotoImage(width=raster.width, height=raster.height, data=raster.photoData())
+        self.canvas.create_image(0, 0, image=self.image, anchor='nw', tags=(self.tag, self.tag + 'Image'))
+        if (self.selected not in self.durations) and (self.selected not in self.values()): #it's been deleted or merged away
+            self.selected = None
+        self.drawSelected(0)
+
+    def drawSelected(self, yOffset):
+        """Draws the selected duration or value of a rasterized trace as a canvas item, replacing the one drawn before. yOffset is where the trace's row is on the canvas right now."""
+        tag = self.tag + 'Selected'
+        self.canvas.delete(tag)
+        if self.selected in self.durations:
+            self.canvas.create_line(*self.selected.segment().coords(self), width=2, fill='red', tags=(self.tag, tag))
+        elif (self.selected != None) and (self.selected.mode == 'constant'):
+            y = self.valueToY(self.selected.value)
+            self.canvas.create_line(0, y, self.viewWidth, y, width=1, fill='blue', dash='.', tags=(self.tag, tag))
+        self.canvas.move(tag, 0, yOffset)
+
+    def lineTag(self, line):
+        """Returns the tag of the canvas item drawn for the given value or duration on this trace"""
+        return self.tag + 'Line' + str(id(line))
+
+    def dragTag(self, line):
+        """Returns the tag of what should be moved when the given value or duration on this trace is dragged: its own line if the trace is drawn as canvas items, or the selected line if it's drawn as an image. Redrawing tags the new items the same way, so a drag in live update mode keeps moving the line as it is after each update."""
+        return (self.tag + 'Selected') if self.rasterize else self.lineTag(line)
 
-	  
-        self.updateMaxY = True #reenable now that we're done drawing
-        self.updateMinY = True
-    
     def redrawXaxis(self):
         """Redraws the x-axis lables"""
+        if self.interface.deferRedraw(self, 'xaxis'):
+            return
+        if self.stack != None: #the traces in a stack share one x axis
+            self.stack.redrawXaxis()
+            return
     
         #only redraw if something has changed
         if (self.startTime != self.start.time) or (self.endTime != self.end.time):
@@ -124,6 +193,16 @@ class ViewTrace:
   
     def redrawYaxis(self):
         """Redraws the y-axis lables"""
+        if self.interface.deferRedraw(self, 'yaxis'):
+            return
+        if self.stack != None: #stacked traces have their axis labels drawn on the canvas, next to their row
+            if self.stack.isVisible(self):
+                self.maxY = self.maxValue()
+                self.minY = self.minValue()
+                self.stack.drawRowLabels(self)
+            else:
+                self.stack.markDirty(self)
+            return
     
         #only redraw if the max value has changed; the bottom of the plot is always at zero
         if (self.maxY != self.maxValue()) or (self.minY != self.minValue()):
@@ -146,20 +225,38 @@ class ViewTrace:
         tmp.grid(column=0, row=2,sticky='se', padx=0, pady=5)
         self.yAxisLables.append(tmp)
   
-    def values(self):
-        """Returns a list of all values associated with durations drawn on this trace"""
-        return [d.assocViewValue for d in self.durations]
+    def containsY(self, y):
+        """Returns True if the given canvas y coordinate is in this trace's part of its canvas"""
+        if self.stack == None:
+            return True
+        return self.yOffset <= y < self.yOffset + self.stack.rowHeight
 
     def canvasClick(self, eventObj):
         """This is called when the canvas is clicked"""
         if (self.interface.mode == 'addTime'):
             self.interface.addTime(eventObject=eventObj)
+        elif self.rasterize and self.waveformClicked():
+            #the image has no bindings for its lines, so work out which line was clicked from the model
+            line = lineAt(self, self.canvas.canvasx(eventObj.x), self.canvas.canvasy(eventObj.y) - self.yOffset)
+            if line != None:
+                self.selected = line
+                self.drawSelected(self.yOffset)
+                line.clickMethod(eventObj)
+
+    def waveformClicked(self):
+        """Returns True if the click being handled was on this trace's image or selected line, rather than on a time line (which has its own binding) or nothing"""
+        tags = self.canvas.gettags('current')
+        return (self.tag + 'Image' in tags) or (self.tag + 'Selected' in tags)
 
     def addTime(self, newTime):
         """Adds a new time to the canvas and adjust the durations to fit."""
         toSplit = find(lambda d: (d.start() < newTime.time) and (d.end() > newTime.time), self.durations)
         self.durations.remove(toSplit) #remove the duration that's getting chopped by this
-        self.durations.extend(toSplit.split(newTime)) #add the two new durations
+        toSplit.undisp()
+        newDurations = toSplit.split(newTime)
+        self.durations.extend(newDurations) #add the two new durations
+        for dur in newDurations:
+            dur.disp('durations')
         self.redrawCanvas() #we've added a new time, so have to redraw canvas
      
     def deleteTime(self, viewTime):
@@ -172,10 +269,10 @@ class ViewTrace:
      
     def maxValue(self):
         """Returns 1.25 times the value of the largest ViewValue so that the trace can be scaled directly on the canvas"""
-        if self.updateMaxY: #only run if it's true
-            rawvalues =  [d.maxValue() for d in self.durations]
+        if self.updateMaxY and not (self.holdScale and (self.maxY != None)): #only run if it's true
+            rawvalues =  [v for v in (s.maxValue() for s in self.segments()) if v != None] #function segments without samples don't have a value
             rawvalues.sort()
-            maxValue = rawvalues[-1]
+            maxValue = rawvalues[-1] if len(rawvalues) > 0 else 0
             if maxValue == 0:
 	        return 1.0 #returning zero would result in divide by zero errors later
             else:
@@ -185,10 +282,10 @@ class ViewTrace:
 
     def minValue(self):
         """Returns 1.25 times the value of the smallest ViewValue or zero (whichever is smaller) so that the trace can be scaled directly on the canvas"""
-        if self.updateMinY: #only run if it's true
-            rawvalues =  [d.minValue() for d in self.durations]
+        if self.updateMinY and not (self.holdScale and (self.minY != None)): #only run if it's true
+            rawvalues =  [v for v in (s.minValue() for s in self.segments()) if v != None]
             rawvalues.sort()
-            minValue = rawvalues[0]
+            minValue = rawvalues[0] if len(rawvalues) > 0 else 0.0
             if minValue >= 0.0:
 	        return 0.0
             else:
@@ -203,19 +300,127 @@ class ViewTrace:
     def yToValue(self, y):
         """Converts from canvas y coordinate to value"""
         return (self.minValue()-self.maxValue())/self.interface.viewHeight * y + self.maxValue() 
-    
-    def sortedDurations(self):
-        """Returns the durations, sorted from first to last"""
-        return sorted(self.durations, lambda d: d.startViewTime.value)
-    
-    def durationStartingAt(self, viewTime):
-        """Returns the duration starting at the given ViewTime"""
-        return find(lambda d: d.startViewTime == viewTime, self.durations)
-    
-    def durationEndingAt(self, viewTime):
-        """Returns the duration ending at the given time"""
-        return find(lambda d: d.endViewTime == viewTime, self.durations)
-    
-    def durationNamed(self, name):
-        """Returns the duration named name"""  
-        return find(lambda d: d.name == name, self.durations)
+
+
+class TraceStack:
+    """Draws many traces as rows of a single scrollable canvas, drawing only the rows that are in view, with one set of time lines and one time axis for all of them"""
+    rowGap = 10 #pixels between rows
+    labelWidth = 80 #pixels to the right of the traces for the row labels
+    visibleRows = 5 #how many rows tall the canvas is
+
+    def __init__(self, interface, parent):
+        self.interface = interface
+        self.traces = []
+        self.dirty = set() #traces that have to be drawn when they come in to view
+        self.drawn = set() #traces that are currently drawn
+        self.rowHeight = interface.viewHeight + self.rowGap
+        self.startTime = None
+        self.endTime = None
+
+        self.frame = ttk.Frame(parent)
+        self.frame.grid(column=0, row=0, sticky='nsew', padx=5, pady=5)
+        self.canvas = Tkinter.Canvas(self.frame, width=interface.viewWidth + self.labelWidth, height=self.visibleRows*self.rowHeight)
+        self.canvas.grid(column=0, row=0, columnspan=3, sticky='nsew')
+        scrollbar = ttk.Scrollbar(self.frame, orient=Tkinter.VERTICAL, command=self.yview)
+        scrollbar.grid(column=3, row=0, sticky='nsw')
+        self.canvas.configure(yscrollcommand=scrollbar.set)
+
+        #the shared time axis
+        self.startLabel = ttk.Label(self.frame)
+        self.startLabel.grid(column=0, row=1, sticky='w', padx=0, pady=5)
+        ttk.Label(self.frame, text='Time (ns)').grid(column=1, row=1, sticky='ew', padx=0, pady=5)
+        self.endLabel = ttk.Label(self.frame)
+        self.endLabel.grid(column=2, row=1, sticky='e', padx=0, pady=5)
+
+        self.canvas.bind("<Button-1>", self.canvasClick)
+        self.interface.drag.bind(self.canvas) #so that lines on the canvas can be dragged
+        self.canvas.bind("<Configure>", lambda eventObj: self.drawVisible())
+
+    def addTrace(self, trace):
+        """Adds a row for the trace to the bottom of the stack, and returns the y coordinate of the top of the row"""
+        self.traces.append(trace)
+        self.dirty.add(trace)
+        self.canvas.configure(scrollregion=(0, 0, self.interface.viewWidth + self.labelWidth, len(self.traces)*self.rowHeight))
+        return (len(self.traces) - 1)*self.rowHeight
+
+    def clear(self):
+        """Removes all the traces from the stack"""
+        self.canvas.delete('all')
+        self.traces = []
+        self.dirty = set()
+        self.drawn = set()
+
+    def visibleRange(self):
+        """Returns the top and bottom canvas y coordinates that are in view"""
+        top = self.canvas.canvasy(0)
+        return top, top + self.visibleRows*self.rowHeight
+
+    def isVisible(self, trace):
+        """Returns True if any of the trace's row is in view"""
+        top, bottom = self.visibleRange()
+        return (trace.yOffset < bottom) and (trace.yOffset + self.rowHeight > top)
+
+    def markDirty(self, trace):
+        """Records that the trace needs to be drawn when it comes in to view"""
+        self.dirty.add(trace)
+
+    def markDrawn(self, trace):
+        """Records that the trace has just been drawn"""
+        self.dirty.discard(trace)
+        self.drawn.add(trace)
+
+    def yview(self, *args):
+        """Scrolls the canvas (this is the scrollbar's command), then draws the rows that have come in to view"""
+        self.canvas.yview(*args)
+        self.drawVisible()
+
+    def drawVisible(self):
+        """Draws the rows in view that need drawing, and erases the ones that have gone out of view"""
+        for trace in self.traces:
+            if self.isVisible(trace):
+                if trace in self.dirty:
+                    trace.redrawCanvas()
+            elif trace in self.drawn:
+                self.canvas.delete(trace.tag)
+                self.canvas.delete(trace.tag + 'Labels')
+                self.drawn.discard(trace)
+                self.dirty.add(trace)
+
+    def drawRowLabels(self, trace):
+        """Draws the name and the y axis labels of the trace to the right of its row"""
+        tag = trace.tag + 'Labels'
+        self.canvas.delete(tag)
+        x = self.interface.viewWidth + 5
+        self.canvas.create_text(x, trace.yOffset, text=str(trace.maxY), anchor='nw', tags=tag)
+        self.canvas.create_text(x, trace.yOffset + self.interface.viewHeight/2, text=trace.name, anchor='w', tags=tag)
+        self.canvas.create_text(x, trace.yOffset + self.interface.viewHeight, text=str(trace.minY), anchor='sw', tags=tag)
+
+    def redrawTimes(self):
+        """Redraws the time lines, which run down through all the rows"""
+        if self.interface.deferRedraw(self, 'times'):
+            return
+        self.canvas.delete('times')
+        height = max(len(self.traces)*self.rowHeight, self.visibleRows*self.rowHeight)
+        for time in self.interface.times:
+            if (time.name != 'start') and (time.name != 'end'): #don't display anything for start or stop times; that way they can't be edited through the canvas
+                x = self.interface.timeToX(time.time)
+                lineID = self.canvas.create_line(x, 0, x, height, width=2, dash='.', tags=('times', time.canvasTag))
+                self.canvas.tag_bind(lineID, "<Button-1>",  time.clickMethod)
+
+    def redrawXaxis(self):
+        """Redraws the shared x axis labels if the start or end time has changed"""
+        if (self.startTime != self.interface.start.time) or (self.endTime != self.interface.end.time):
+            self.startTime = self.interface.start.time
+            self.endTime = self.interface.end.time
+            self.startLabel.configure(text=str(self.startTime))
+            self.endLabel.configure(text=str(self.endTime))
+
+    def traceAt(self, y):
+        """Returns the trace whose row contains the given canvas y coordinate, or None"""
+        return find(lambda t: t.containsY(y), self.traces)
+
+    def canvasClick(self, eventObj):
+        """Passes clicks on the canvas on to the trace that was clicked"""
+        trace = self.traceAt(self.canvas.canvasy(eventObj.y))
+        if trace != None:
+            trace.canvasClick(eventObj)
@@ -0,0 +1,78 @@
+import time
+import threading
+from multiprocessing.pool import ThreadPool
+from qubit_telemetry import *
+
+class UploadFailed(Exception):
+    """Raised when some boards couldn't be sent their sequences; errors holds the exception from each board that failed, by board name"""
+    def __init__(self, errors):
+        Exception.__init__(self, 'Upload failed on {}: {}'.format(', '.join(sorted(errors)), '; '.join('{}: {}'.format(name, errors[name]) for name in sorted(errors))))
+        self.errors = errors
+
+class FakeBoard:
+    """Stands in for one board, so that uploads can be tried out without hardware. Each upload takes latency seconds; if failOn is given, uploading that trace raises an IOError."""
+    def __init__(self, name, latency=0.0, failOn=None):
+        self.name = name
+        self.latency = latency
+        self.failOn = failOn
+        self.loaded = {} #the last sequence uploaded for each trace, by trace name
+        self.lock = threading.Lock()
+
+    def upload(self, sequences):
+        """Loads the given compiled traces (a dict of trace name to compiled trace) on to the board"""
+        time.sleep(self.latency)
+        if self.failOn in sequences:
+            raise IOError('{} rejected {}'.format(self.name, self.failOn))
+        with self.lock:
+            self.loaded.update(sequences)
+
+class ParallelUploader:
+    """Sends the compiled traces for a point to all the boards at once, from a pool of threads kept for the whole sweep, so uploading takes about as long as the slowest board"""
+    def __init__(self, boards, threads=None):
+        self.boards = boards #maps each trace's name to its board, which has a name and an upload(sequences) method; traces on one board are sent together
+        self.distinctBoards = []
+        for board in boards.values():
+            if board not in self.distinctBoards:
+                self.distinctBoards.append(board)
+        self.pool = ThreadPool(threads if threads != None else max(len(self.distinctBoards), 1))
+        self.histograms = dict((board.name, StageHistogram()) for board in self.distinctBoards) #how long each board takes to upload to
+
+    def uploadBoard(self, board, sequences):
+        """Uploads to one board; this is what runs in the pool's threads. Returns the exception if it fails, so that it doesn't stop the other boards."""
+        start = time.time()
+        try:
+            board.upload(sequences)
+            return None
+        except Exception as err:
+            return err
+        finally:
+            self.histograms[board.name].record(time.time() - start)
+
+    def upload(self, uploads):
+        """Sends the compiled traces (a dict of trace name to compiled trace) to their boards, all at once, and waits until every board is done. Raises an UploadFailed if any of them failed."""
+        unknown = [name for name in uploads if name not in self.boards]
+        if len(unknown) > 0:
+            raise UploadFailed(dict((name, KeyError('no board for this trace')) for name in unknown))
+        byBoard = []
+        for board in self.distinctBoards:
+            sequences = dict((name, sequence) for (name, sequence) in uploads.items() if self.boards[name] == board)
+            if len(sequences) > 0:
+                byBoard.append((board, sequences))
+        pending = [(board, self.pool.apply_async(self.uploadBoard, (board, sequences))) for (board, sequences) in byBoard]
+        errors = {}
+        for (board, result) in pending: #the barrier: every board has to be done before this returns
+            error = result.get()
+            if error != None:
+                errors[board.name] = error
+        if len(errors) > 0:
+            raise UploadFailed(errors)
+
+    def slowestBoard(self):
+        """Returns the name of the board that has taken the longest to upload to on average, or None if nothing has been uploaded"""
+        timed = [(h.mean(), name) for (name, h) in self.histograms.items() if h.count > 0]
+        return max(timed)[1] if len(timed) > 0 else None
+
+    def close(self):
+        """Stops the pool's threads"""
+        self.pool.close()
+        self.pool.join()
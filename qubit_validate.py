@@ -0,0 +1,145 @@
+import numpy
+from qubit_model import *
+from qubit_sweep import *
+
+class Violation:
+    """One problem with one part of the sequence (a duration or a pair of times), and the sweep points it happens at"""
+    def __init__(self, check, where, count, firstPoint, message):
+        self.check = check #which check found it: 'duration', 'samples', 'granularity', 'amplitude', 'repeat', or 'order'
+        self.where = where #e.g. 'xy/pulse' for a duration, or 't1 < t2' for a pair of times
+        self.count = count #how many sweep points it happens at
+        self.firstPoint = firstPoint #the logical index of the first sweep point it happens at
+        self.message = message
+
+    def __str__(self):
+        return '{}: {} at {} point(s), first at {}'.format(self.where, self.message, self.count, self.firstPoint)
+
+class SequenceValidator:
+    """Checks that an experiment would work on its hardware at every point of a sweep over it, before anything is uploaded, doing each check as one array operation over all the points"""
+    def __init__(self, experiment, sweep=None):
+        self.experiment = experiment
+        self.sweep = sweep if sweep != None else Sweep(experiment, [])
+        shape = self.sweep.shape()
+        #the logical index of every point, one row per point, in nested order
+        self.indices = numpy.indices(shape).reshape(len(shape), -1).T if len(shape) > 0 else numpy.zeros((1, 0), dtype=int)
+        self.times = self.timeArray()
+        self.values = self.valueArray()
+
+    def sweptColumn(self, base, parameters, kind):
+        """Returns base (a list of numbers, one per time or value) as a (number of points, len(base)) array with the swept ones filled in at each point"""
+        result = numpy.tile(numpy.asarray(base, dtype=float), (len(self.indices), 1))
+        for (a, axis) in enumerate(self.sweep.axes):
+            if isinstance(axis.parameter, kind):
+                column = parameters.index(axis.parameter)
+                result[:, column] = numpy.asarray(axis.points, dtype=float)[self.indices[:, a]]
+        return result
+
+    def timeArray(self):
+        """Returns the times (in ns) at every point, rounded to the time resolution like they are when they're set"""
+        times = self.sweptColumn([t.time for t in self.experiment.times], self.experiment.times, ViewTime)
+        resolution = float(self.experiment.timeResolution)
+        return numpy.round(times/resolution)*resolution
+
+    def valueArray(self):
+        """Returns the values at every point"""
+        return self.sweptColumn([v.value for v in self.experiment.values], self.experiment.values, ViewValue)
+
+    def violations(self, check, mask, labels, message):
+        """Turns a (number of points, len(labels)) array that's True where a check fails in to a list of Violations, one per label that fails anywhere"""
+        found = []
+        counts = mask.sum(axis=0)
+        for column in numpy.nonzero(counts)[0]:
+            first = numpy.argmax(mask[:, column])
+            found.append(Violation(check, labels[column], int(counts[column]), tuple(int(i) for i in self.indices[first]), message(column)))
+        return found
+
+    def validate(self):
+        """Returns a list of Violations; it's empty if the sequence is fine at every point"""
+        found = self.checkOrder()
+        durations = [(trace, d) for trace in self.experiment.traces for d in trace.durations]
+        if len(durations) == 0:
+            return found
+        labels = ['{}/{}'.format(trace.name, d.name) for (trace, d) in durations]
+        starts = self.times[:, [self.experiment.times.index(d.startViewTime) for (trace, d) in durations]]
+        ends = self.times[:, [self.experiment.times.index(d.endViewTime) for (trace, d) in durations]]
+
+        #minimum duration
+        minDurations = numpy.array([trace.minDuration if trace.minDuration != None else trace.samplePeriod for (trace, d) in durations], dtype=float)
+        found += self.violations('duration', (ends - starts) < minDurations - 1e-9, labels,
+                                 lambda k: 'shorter than {} ns'.format(minDurations[k]))
+
+        #function durations have to have samples to play; a short one can fall between two sample times
+        periods = numpy.array([trace.samplePeriod for (trace, d) in durations], dtype=float)
+        functions = numpy.array([d.assocViewValue.mode != 'constant' for (trace, d) in durations])
+        sampleCounts = numpy.ceil(ends/periods - 1e-9) - numpy.ceil(starts/periods - 1e-9) #like gridIndices
+        found += self.violations('samples', functions & (sampleCounts < 1), labels,
+                                 lambda k: 'has no samples at the {} ns sample period'.format(periods[k]))
+
+        #clock granularity
+        granularities = numpy.array([trace.clockGranularity for (trace, d) in durations], dtype=float)
+        def offGrid(times):
+            remainders = numpy.remainder(times, granularities)
+            return numpy.minimum(remainders, granularities - remainders) > 1e-6
+        found += self.violations('granularity', offGrid(starts) | offGrid(ends), labels,
+                                 lambda k: 'not on the {} ns clock grid'.format(granularities[k]))
+
+        #amplitude
+        limits = numpy.array([trace.maxAmplitude if trace.maxAmplitude != None else numpy.inf for (trace, d) in durations], dtype=float)
+        peaks = numpy.zeros(starts.shape)
+        for (column, (trace, d)) in enumerate(durations):
+            if numpy.isinf(limits[column]):
+                continue
+            value = d.assocViewValue
+            if value.mode == 'constant':
+                peaks[:, column] = numpy.abs(self.values[:, self.experiment.values.index(value)])
+            else:
+                peaks[:, column] = self.functionPeaks(value, trace, starts[:, column].min(), ends[:, column].max()) #over the whole span the duration covers at any point, which is on the safe side
+        found += self.violations('amplitude', peaks > limits, labels,
+                                 lambda k: 'goes past the largest amplitude of {}'.format(limits[k]))
+
+        #repeats; a duration has to be all in or all out of each repeated block
+        for repeat in self.experiment.repeats:
+            blockStart = self.times[:, [self.experiment.times.index(repeat.startViewTime)]]
+            blockEnd = self.times[:, [self.experiment.times.index(repeat.endViewTime)]]
+            crosses = ((starts < blockStart) & (blockStart < ends)) | ((starts < blockEnd) & (blockEnd < ends))
+            found += self.violations('repeat', crosses, labels,
+                                     lambda k: 'crosses the start or end of the repeat {}'.format(repeat.name))
+        return found
+
+    def checkOrder(self):
+        """Returns Violations for any times that end up out of order, i.e. that don't stay strictly between their neighbours"""
+        order = sorted(range(len(self.experiment.times)), key=lambda i: self.experiment.times[i].time)
+        if len(order) < 2:
+            return []
+        gaps = numpy.diff(self.times[:, order], axis=1)
+        labels = ['{} < {}'.format(self.experiment.times[order[i]].name, self.experiment.times[order[i + 1]].name) for i in range(len(order) - 1)]
+        return self.violations('order', gaps <= 0, labels, lambda k: 'the times are out of order')
+
+    def functionPeaks(self, value, trace, start, end):
+        """Returns the largest size of a function mode value from start to end (in ns) at every point. The function is only evaluated once for each distinct setting of the swept parameters it uses."""
+        names = referencedNames(value.functionText)
+        axes = [a for (a, axis) in enumerate(self.sweep.axes) if axis.name() in names]
+        settings, which = unique(self.indices[:, axes])
+        peaks = numpy.zeros(len(settings))
+        for (s, setting) in enumerate(settings):
+            overrides = {}
+            for (a, i) in zip(axes, setting):
+                axis = self.sweep.axes[a]
+                overrides[axis.name()] = axis.points[i]*1e-9 if isinstance(axis.parameter, ViewTime) else axis.points[i] #functions see times in s
+            samples = ExperimentEvaluator(self.experiment, trace.samplePeriod, overrides, start, end).valueArray(value) #on the trace's sample times over the span
+            peaks[s] = numpy.abs(samples).max() if len(samples) > 0 else 0.0
+        return peaks[which]
+
+    def check(self):
+        """Raises a SequenceError describing the problems if there are any"""
+        found = self.validate()
+        if len(found) > 0:
+            shown = '\n'.join(str(v) for v in found[:10])
+            more = '\n...and {} more'.format(len(found) - 10) if len(found) > 10 else ''
+            raise SequenceError('The sequence would not work on its hardware:\n' + shown + more)
+
+def unique(rows):
+    """Returns the distinct rows of a 2D integer array, and for each row, the index of its distinct row"""
+    if rows.shape[1] == 0:
+        return numpy.zeros((1, 0), dtype=int), numpy.zeros(len(rows), dtype=int)
+    return numpy.unique(rows, axis=0, return_inverse=True)
@@ -1,5 +1,5 @@
-import Tkinter
-import ttk
+from qubit_dependencies import *
+from qubit_evaluate import *
 
 def find(f, seq):
     """Return first item in sequence where f(item) == True. Returns None if there aren't any such items."""
@@ -7,22 +7,97 @@ def find(f, seq):
         if f(item): 
             return item
 
-class ViewTime:
+def cellEditorPlace(tree, item, column, el):
+    """Returns (text, x, y, width, height) for an entry box to edit the given cell of the value frame's tree with, or None if the cell can't be edited or isn't in view"""
+    text = el.cellText(column)
+    if text == None: #not editable (e.g. it's locked)
+        return None
+    box = tree.bbox(item, column)
+    if box == '': #the cell isn't in view, so there's nowhere to put the entry box
+        return None
+    x, y, width, height = box
+    return (text, x, y, width, height)
+
+class SequenceError(ValueError):
+    """Raised when a time or value can't be set as asked, or when a sequence wouldn't work on its hardware"""
+    pass
+
+class Segment(object):
+    """A piece of a trace from start to end (in ns) that takes a single ViewValue: a run of a constant, described only by its end points and value, or a function of time sampled every samplePeriod ns"""
+    __slots__ = ('start', 'end', 'viewValue', 'samplePeriod')
+
+    def __init__(self, start, end, viewValue, samplePeriod):
+        self.start = start
+        self.end = end
+        self.viewValue = viewValue
+        self.samplePeriod = samplePeriod
+
+    def isConstant(self):
+        """Returns True if the segment takes a constant value"""
+        return self.viewValue.mode == 'constant'
+
+    def value(self):
+        """Returns the value of a constant segment"""
+        return self.viewValue.value
+
+    def times(self):
+        """Returns the sample times of the segment"""
+        return gridTimes(self.start, self.end, self.samplePeriod)
+
+    def samples(self):
+        """Returns the values at the sample times of a function segment"""
+        return self.viewValue.values(self.times())
+
+    def sampleCount(self):
+        """Returns how many sample times the segment covers; a function segment shorter than the sample period may not cover any"""
+        first, stop = gridIndices(self.start, self.end, self.samplePeriod)
+        return max(stop - first, 0)
+
+    def maxValue(self):
+        """Returns the maximum value taken during the segment, or None if it's a function segment without any samples"""
+        return self.viewValue.extremeValue(self.start, self.end, True, self.samplePeriod)
+
+    def minValue(self):
+        """Returns the minimum value taken during the segment, or None if it's a function segment without any samples"""
+        return self.viewValue.extremeValue(self.start, self.end, False, self.samplePeriod)
+
+    def compiled(self, shift=0, evaluator=None):
+        """Returns the segment as it's sent to hardware: ('constant', start, end, value) or ('samples', start, samplePeriod, samples). shift (in ns) is added to the times, for segments that are played later than their time in the experiment. If an ExperimentEvaluator is given, a function segment's samples come from it, so they're shared with any other trace playing the same thing."""
+        if self.isConstant():
+            return ('constant', self.start + shift, self.end + shift, self.value())
+        samples = evaluator.segmentSamples(self).tolist() if evaluator != None else self.samples()
+        return ('samples', self.start + shift, self.samplePeriod, tuple(samples))
+
+    def coords(self, trace):
+        """Returns the canvas coordinates of the line for this segment on the given trace"""
+        if self.isConstant():
+            y = trace.valueToY(self.value())
+            return [(trace.timeToX(self.start), y), (trace.timeToX(self.end), y)]
+        samples = self.samples()
+        if len(samples) < 2: #a line needs two points; draw it flat, at its one sample or at zero if it has none
+            y = trace.valueToY(samples[0] if len(samples) > 0 else 0.0)
+            return [(trace.timeToX(self.start), y), (trace.timeToX(self.end), y)]
+        return zip([trace.timeToX(t) for t in self.times()], [trace.valueToY(v) for v in samples])
+
+    def joins(self, other):
+        """Returns True if other is a constant segment that starts where this constant segment ends and has the same value, so the two make one run"""
+        return self.isConstant() and other.isConstant() and (self.end == other.start) and (self.value() == other.value())
+
+class ViewTime(object):
     """The class for a time drawn on the trace"""
-    def __init__(self, name, time, locked, interface, row=None):
+    __slots__ = ('name', 'time', 'locked', 'interface', 'treeItem') #there can be a lot of these, so no __dict__, and nothing Tk is made until they're shown in the value frame
+
+    def __init__(self, name, time, locked, interface):
         self.name = name
-        self.time = int(round(time)) #only allow integer times
+        self.time = interface.roundTime(time) #only allow times that are multiples of the interface's time resolution
         self.locked = locked
         self.interface = interface
-        self.row = row
-    
-        self.stringVar = Tkinter.StringVar()
-        self.stringVar.set(str(self.time))
-        self.intVar = Tkinter.IntVar()
-        self.intVar.set(1 if self.locked else 0)
-        self.tkLabel = None
-        self.tkEntry = None
-        self.tkCheck = None
+        self.treeItem = None #the ID of this time's row in the value frame's treeview; None until it's displayed
+
+    @property
+    def canvasTag(self):
+        """The tag of this time's lines on the canvases"""
+        return 'time' + str(id(self))
   
     def toDict(self):
         """Retrurns a dict that describes this ViewTime. For use in saving the experiment."""
@@ -32,96 +107,94 @@ class ViewTime:
         """
         The time of a ViewTime is a time. It can only be set if it isn't locked.
     
-        If errorIfImpossible is set to True, the method will throw an error if it can't be set to the requested time.
+        If errorIfImpossible is set to True, the method raises a SequenceError if it can't be set to the requested time.
         """
-        if (self.time != time) and (not self.locked):
-            sortedTimes =  [t.time for t in self.interface.times]
-            sortedTimes.sort()
+        time = self.interface.roundTime(time) #can only take multiples of the time resolution
+        error = None
+        if (self.time != time) and self.locked:
+            error = "{} is locked, so it can't be set to {} ns.".format(self.name, time)
+        elif self.time != time:
+            #find the limits for what this time can be set to: it has to stay between the times before and after it
+            sortedTimes = sorted(t.time for t in self.interface.times)
             index = sortedTimes.index(self.time)
-        #find the limits for what this time can be set to. maxTime is the largest time it can be and minTime is the smallest time it can be
-        if index == 0: #in this case, self is the smallest time, don't let it move
-	    if errorIfImpossible:
-	        pass #todo: raise error
-	    else:
-	        maxTime = minTime = 0
-        elif index == (len(sortedTimes)-1): #in this case, self is the largest time
-	    minTime = sortedTimes[index-1]
-	    maxTime = None
-        else:
-	    minTime = sortedTimes[index-1]
-	    maxTime = sortedTimes[index+1]
-	
-        if ((maxTime == None) and (time > minTime)) \
-	    or ((maxTime != None) and (minTime != None) and (time > minTime) and (time < maxTime)):
-	    self.time = int(round(time)) #can only take integer times
-	    #since times are on every trace, need to update all of them
-	    self.interface.redrawAllCanvases()
-	    self.interface.redrawAllXaxies()
-        elif errorIfImpossible: #can't be set to the requested time
-	    pass #todo: throw an error
-        elif (self.time != time) and errorIfImpossible: #can't be set to the requested time because it's locked
-	    pass #todo: throw an error
+            minTime = sortedTimes[index-1] if index > 0 else None
+            maxTime = sortedTimes[index+1] if index < len(sortedTimes) - 1 else None
+            if (minTime != None) and (time > minTime) and ((maxTime == None) or (time < maxTime)):
+                self.time = time
+                self.interface.invalidate([self.name]) #functions using this time have to be remade
+                #since times are on every trace, need to update all of them
+                self.interface.redrawAllCanvases()
+                self.interface.redrawAllXaxies()
+            elif minTime == None: #self is the smallest time, so don't let it move
+                error = "{} is the first time, so it can't be moved.".format(self.name)
+            else:
+                error = "{} can't be set to {} ns; it has to stay after {} ns{}.".format(self.name, time, minTime, '' if maxTime == None else ' and before {} ns'.format(maxTime))
 	
-        #by keeping this outside the previous if statement, the tkEntry is restored to the old time if an unacceptable time was entered
-        self.stringVar.set(str(self.time))
+        #by keeping this outside the previous if statement, the row is restored to the old time if an unacceptable time was entered
+        self.redraw()
+        if (error != None) and errorIfImpossible:
+            raise SequenceError(error)
   
     def setName(self, name):
         """Sets the time's name and redraws the value frame. The name can only be changed if the time isn't locked."""
         if (self.name != name): #prevents needless refresh if the name hasn't changed
             if (not self.locked) and (name not in [t.name for t in self.interface.times]):
+	        self.interface.invalidate([self.name, name]) #functions using either name have to be remade
 	        self.name = name
-	        self.interface.redrawValueFrame() #the description of any associated durations will have to be redrawn to reflect this time's new name
+	        self.redraw()
+	        #the description of any associated durations will have to be redrawn to reflect this time's new name
+	        for duration in self.interface.durations():
+	            if (duration.startViewTime == self) or (duration.endViewTime == self):
+	                duration.redraw()
             else:
 	        pass #todo: throw an error
   
-    def disp(self, row):
-        """Draws the widgets associated with this time in the value frame: a label with the name, an entry box with the value, and a checkbox for locking it."""
-        self.row = row
-
-        #get rid of old widgets if they exsist
-        if self.tkLabel != None:
-            self.tkLabel.destroy()
-        if self.tkEntry != None:
-            self.tkEntry.destroy()
-        if self.tkCheck != None:
-            self.tkCheck.destroy()
-      
-        #the label
-        self.tkLabel = ttk.Label(self.interface.valueFrame, text=self.name)
-        self.tkLabel.grid(column=0, row=row, sticky='w', padx=5, pady=5)
-        self.interface.valueFrameParts.append(self.tkLabel)
-    
-        #the entry box
-        self.tkEntry = ttk.Entry(self.interface.valueFrame, textvariable=self.stringVar) #todo: get validation working for tkEntry
-        self.tkEntry.grid(column=1, row=row, sticky='w', padx=5, pady=5)
-        self.interface.valueFrameParts.append(self.tkEntry)
-    
-        self.tkEntry.config(state = 'disabled' if self.locked else 'normal')
-    
-        #this method updates the time if it's changed in the entry box
-        def entryMethod(eventObj):
-            if self.tkEntry.get() != '':
-	        self.setTime(float(self.tkEntry.get()))
-            return 1
-        self.tkEntry.bind("<Return>",entryMethod)
-    
-        #the checkbox handles locking the time
-        def checkMethod():
-            self.locked = (self.intVar.get() == 1)
-            self.tkEntry.config(state = 'disabled' if self.locked else 'normal')
-      
-        self.tkCheck = ttk.Checkbutton(self.interface.valueFrame, text='Locked?', command=checkMethod, variable=self.intVar)
-        self.tkCheck.grid(column=2, row=row,sticky='w', padx=5, pady=5)   
-        self.interface.valueFrameParts.append(self.tkCheck)
-  
+    def rowValues(self):
+        """Returns the text for the value, locked, and type columns of this time's row in the value frame"""
+        return (str(self.time), 'Locked' if self.locked else '', '')
+
+    def cellText(self, column):
+        """Returns the text to start editing the given column of this time's row with, or None if the column can't be edited"""
+        if self.locked:
+            return None
+        elif column == '#0':
+            return self.name
+        elif column == '#1':
+            return str(self.time)
+
+    def setCell(self, column, text):
+        """Called when the given column of this time's row has been edited in the value frame"""
+        if column == '#0':
+            self.setName(text)
+        elif column == '#1':
+            self.setTime(float(text))
+
+    def toggleLocked(self):
+        """Locks the time if it's unlocked, and vice versa"""
+        self.locked = not self.locked
+        self.redraw()
+
+    def disp(self, parent):
+        """Adds a row for this time to the value frame's treeview, under the given parent row"""
+        self.treeItem = self.interface.valueTree.insert(parent, 'end', text=self.name, values=self.rowValues())
+        self.interface.valueTreeItems[self.treeItem] = self
+
+    def undisp(self):
+        """Removes this time's row from the value frame"""
+        if self.treeItem != None:
+            if self.interface.valueTree.exists(self.treeItem):
+                self.interface.valueTree.delete(self.treeItem)
+            del self.interface.valueTreeItems[self.treeItem]
+            self.treeItem = None
+
     def redraw(self):
-        """Redraw the widgets in the value frame in the same row as it was before"""
-        if self.row != None:
-            self.disp(self.row)
+        """Updates this time's row in the value frame in place"""
+        if (self.treeItem != None) and self.interface.valueTree.exists(self.treeItem):
+            self.interface.valueTree.item(self.treeItem, text=self.name, values=self.rowValues())
   
-    def dragMethod(self, eventObj):
-        """Used for changing the time by dragging the line on the canvas"""
-        self.setTime(self.interface.xToTime(eventObj.x))
+    def dragTo(self, x):
+        """Used for changing the time by dragging the line on the canvas; x is the canvas x coordinate it was dragged to"""
+        self.setTime(self.interface.xToTime(x))
     
     def clickMethod(self, eventObj):
         """Used when the line on the canvas is clicked"""
@@ -130,39 +203,29 @@ class ViewTime:
             self.setName(iface.nameEntry.get()) #set the name if we're in rename mode
             iface.mode = 'select'
         elif iface.mode == 'select':
-            iface.bindCanvasesDrag(self.dragMethod) #allow the line on the canvas to be dragged after it's clicked on
+            iface.drag.begin(eventObj, lambda x, y: self.dragTo(x), 'x', self.canvasTag) #allow the line on the canvas to be dragged after it's clicked on; the time's line is moved on every trace
         elif (iface.mode == 'deleteTime') and not self.locked:
             self.interface.deleteTime(viewTime=self)
             iface.mode = 'select' #go back to select mode
   
-class ViewValue:
+class ViewValue(object):
     """The class for a value drawn on the trace"""
-    def __init__(self, name, value, locked, interface, functionText='1.0', mode="constant", row=None):
+    __slots__ = ('name', 'locked', 'interface', 'treeItem', 'mode', 'value', 'functionText', 'variables', 'lda', 'stale')
+
+    def __init__(self, name, value, locked, interface, functionText='1.0', mode="constant"):
         self.name = name
         self.locked = locked
         self.interface = interface
-        self.row = row
+        self.treeItem = None #the ID of this value's row in the value frame's treeview; None until it's displayed
     
         #can either be in constant mode -- which allows GUI dragging -- or in function mode, which allows more complicated values but doesn't allow dragging
         self.mode = mode
         self.value = value
         self.functionText = functionText
         self.variables = {} #will hold the variables for the lambda
-        if self.mode != 'constant':
-            self.makeLambda() #don't run initially because you can run in to trouble when the interface is still being initialized
-    
-        self.stringVar = Tkinter.StringVar()
-        #text we display depends on what mode we're in
-        if self.mode == 'constant':
-            self.stringVar.set(str(value))
-        else:
-            self.stringVar.set(functionText)
-        self.intVar = Tkinter.IntVar()
-        self.intVar.set(1 if self.locked else 0)
-        self.tkLabel = None
-        self.tkEntry = None
-        self.tkCheck = None
-        self.tkMenubutton = None
+        self.lda = None
+        self.stale = True #True when something the lambda uses has changed, so it has to be remade
+        #the lambda isn't made until the function is first used, since the times and values it uses may not have been made yet (e.g. when loading an experiment)
 
     def toDict(self):
         """Retrurns a dict that describes this ViewValue. For use in saving the experiment."""
@@ -171,26 +234,30 @@ class ViewValue:
     def makeLambda(self, force = False):
         """make a function using the text in self.functionText. If force is True, remakes lambda even if variables are unchanged, which you want to do sometimes (e.g. '1.0' and '5.0' have the same dictionary)"""   
         variables = {'self': self} #dictionary to hold variables
+        #only the names that actually appear in the function's parsed text get added, so e.g. 'ceil' doesn't pull in 'e'
+        names = referencedNames(self.functionText)
         #look though the variables in interface to see if any of them are used
         #these include any variables made when running the code in the code frame
         #and all the functions/variables from the math libary (e.g. 'sin', 'pi', etc.)
-        for globalVariableName in self.interface.variables.keys():
-            if globalVariableName in self.functionText: #only add it to the dictionary if it's needed -- note that this isn't foolproof, the text may be in the string even if the function/variable isn't used (e.g. if you use 'ceil()', 'e' will also be added to the dictionary)
-	        variables[globalVariableName] = self.interface.variables[globalVariableName]
+        for name in names:
+            if name in self.interface.variables:
+                variables[name] = self.interface.variables[name]
         for time in self.interface.times:
-            if time.name in self.functionText: #only add it to the dictionary if it's needed -- same caveat as above
-	        variables[time.name] = time.time * 1e-9 #add all the times to variables, and make them in nS
+            if time.name in names:
+                variables[time.name] = time.time * 1e-9 #add all the times to variables, and make them in nS
         for value in self.interface.values:
-            if value.name in self.functionText: #only add it to the dictionary if it's needed -- same caveat as above
-	        variables[value.name] = value.value #add all the values to variables
-        if force or (variables != self.variables): #only exectute if variables have changed since last time or if it's forced
+            if value.name in names:
+                variables[value.name] = value.value #add all the values to variables
+        if force or (self.lda == None) or (variables != self.variables): #only exectute if variables have changed since last time or if it's forced
             self.variables = variables.copy()
-        #don't have to import math because all those functions will end up in variables
-        exec "self.lda = lambda t: " + self.functionText in variables
+            #don't have to import math because all those functions will end up in variables
+            exec "self.lda = lambda t: " + self.functionText in variables
+        self.stale = False
     
     def function(self, t):
         """returns the value of self.lda for the given t (in seoncds)"""
-        self.makeLambda() #need to call in case something has changed. todo: find way to avoid this
+        if self.stale: #only remake the lambda if something it uses has changed
+            self.makeLambda()
         return self.lda(t)
     
     def setFunction(self, string):
@@ -203,59 +270,64 @@ class ViewValue:
             self.updateTraces()
         else:
             pass #todo: throw error
+        self.redraw()
     
     def values(self, times):
         """Returns the value this ViewValue takes at the given times. The value this takes at a given time is self.value*self.function(time)"""
         if self.mode == 'constant':
             return len(times)*[self.value]
         else:
-            return [self.function(t*1e-9) for t in times] #the 1e-9 coverts the time to nanoseconds
+            #evaluated as one array, so pulse shapes in the function use their cached envelopes
+            return evaluateValue(self, numpy.asarray(times, dtype=float)*1e-9).tolist() #the 1e-9 coverts the time to seconds
   
-    def maxValue(self):
-        """Returns the maximum value this takes over the whole period from start to end"""
+    def extremeValue(self, start, end, largest=True, step=1):
+        """Returns the largest (or smallest, if largest is False) value this takes at the times from start to end that are multiples of step (in ns), or None if a function mode value has no such times"""
         if self.mode == 'constant':
             return self.value
         else:
-            times = self.interface.timeArray()
-            return max(self.values(times))
+            first, stop = gridIndices(start, end, step)
+            return extremum(lambda k: evaluateValue(self, k*step*1e-9), first, stop, largest) #the 1e-9 coverts the time to seconds
+
+    def maxValue(self):
+        """Returns the maximum value this takes over the whole period from start to end"""
+        return self.extremeValue(self.interface.start.time, self.interface.end.time, True, self.interface.timeResolution)
 
     def minValue(self):
         """Returns the minimum value this takes over the whole period from start to end"""
-        if self.mode == 'constant':
-            return self.value
-        else:
-            times = self.interface.timeArray()
-            return min(self.values(times))
+        return self.extremeValue(self.interface.start.time, self.interface.end.time, False, self.interface.timeResolution)
       
-    def updateTraces(self):
-        """Updates all traces this value appears on"""
-        for trace in [t for t in self.interface.traces if self in t.values()]:
-            trace.redrawCanvas()
-            trace.redrawYaxis()
+    def updateTraces(self, dependentValues=[]):
+        """Updates all traces this value, or any of the given values that depend on it, appears on"""
+        self.interface.redrawTracesWith([self] + dependentValues)
       
     def setValue(self, value, errorIfImpossible=False):
         """
         The value of a ViewValue is a voltage. It can only be set if it isn't locked
         
-        If errorIfImpossible is set to True, the method will throw an error if it can't be set to the requested value.
+        If errorIfImpossible is set to True, the method raises a SequenceError if it can't be set to the requested value.
         """
         if (self.value != value) and (not self.locked):
             self.value = value
       
-            #update all the traces which have this value
-            self.updateTraces()
-        elif (self.value != value) and errorIfImpossible: #can't be set to the requested time because it's locked
-	    pass #todo: throw an error
+            #update all the traces which have this value or a value that depends on it
+            self.updateTraces(self.interface.invalidate([self.name]))
 	
-        #by keeping this outside the previous if statement, the tkEntry is restored to the old value if an unacceptable value was entered
-        self.stringVar.set(str(value))
+        #by keeping this outside the previous if statement, the row is restored to the old value if an unacceptable value was entered
+        self.redraw()
+        if (self.value != value) and errorIfImpossible: #can't be set to the requested value because it's locked
+            raise SequenceError("{} is locked, so it can't be set to {}.".format(self.name, value))
 	
     def setName(self, name):
         """Sets the value's name and redraws the value frame. The name can only be changed if the value isn't locked."""
         if (self.name != name): #don't needlessly refresh if name hasn't changed
             if (not self.locked) and (name not in [v.name for v in self.interface.values]):
+	        self.interface.invalidate([self.name, name]) #functions using either name have to be remade
 	        self.name = name
-	        self.interface.redrawValueFrame() #the description of any associated durations will have to be redrawn to reflect this value's new name
+	        self.redraw()
+	        #the description of any associated durations will have to be redrawn to reflect this value's new name
+	        for duration in self.interface.durations():
+	            if duration.assocViewValue == self:
+	                duration.redraw()
         else:
 	    pass #todo: throw error
 	
@@ -271,85 +343,76 @@ class ViewValue:
         self.interface.removeUnusedValues() #could be unused values now
         self.interface.refresh()
     
-    def disp(self, row):
-        """Draws the widgets associated with this value in the value frame: a label with the name, an entry box with the value, and a checkbox for locking it."""
-        self.row = row
-
-        #get rid of old widgets if they exsist
-        if self.tkLabel != None:
-            self.tkLabel.destroy()
-        if self.tkEntry != None:
-            self.tkEntry.destroy()
-        if self.tkCheck != None:
-            self.tkCheck.destroy()
-        if self.tkMenubutton != None:
-            self.tkMenubutton.destroy()
-    
-        #the label
-        self.tkLabel = ttk.Label(self.interface.valueFrame, text=self.name)
-        self.tkLabel.grid(column=0, row=row, sticky='w', padx=5, pady=5)
-        self.interface.valueFrameParts.append(self.tkLabel)
-    
-        #the entry box
-        self.tkEntry = ttk.Entry(self.interface.valueFrame, textvariable=self.stringVar) #todo: get validation working for tkEntry
-        self.tkEntry.grid(column=1, row=row,sticky='w', padx=5, pady=5)
-        self.interface.valueFrameParts.append(self.tkEntry)
-
-        self.tkEntry.config(state = 'disabled' if self.locked else 'normal')
-
-        #this method updates the value if it's changed in the entry box
-        def entryMethod(eventObj):
-            if self.tkEntry.get() != '':
-	        if self.mode == "constant":
-	            self.setValue(float(self.tkEntry.get()))
-	        else: #function mode
-	            self.setFunction(str(self.tkEntry.get()))
-            return 1
-        self.tkEntry.bind("<Return>",entryMethod)
-    
-        #the checkbox handles locking the value
-        def checkMethod():
-            self.locked = (self.intVar.get() == 1)
-            self.tkEntry.config(state = 'disabled' if self.locked else 'normal')
-      
-            self.tkCheck = ttk.Checkbutton(self.interface.valueFrame, text='Locked?', command=checkMethod, variable=self.intVar)
-            self.tkCheck.grid(column=2, row=row,sticky='w', padx=5, pady=5)   
-            self.interface.valueFrameParts.append(self.tkCheck)
-    
-        #the menubutton slects whether this ViewValue takes a constant or a function
-        def setConstant():
-            self.mode = 'constant'
-            self.stringVar.set(str(self.value))
-            self.updateTraces()
-    
-        def setFunction():
-            self.mode = 'function'
-            self.stringVar.set(str(self.functionText))
-            self.makeLambda(force = True)
-            self.updateTraces()
-      
-    
-        self.tkMenubutton = ttk.Menubutton(self.interface.valueFrame, text="Type")
-        self.tkMenubutton.grid(column=3, row=row,sticky='ew', padx=5, pady=5) 
-        menu = Tkinter.Menu(self.tkMenubutton, tearoff = 0)
-        self.tkMenubutton["menu"] = menu
-    
-        #todo: make the selected option depend on self.mode; at present, neither are selected by default
-        menu.add_radiobutton(label="Constant", command=setConstant)
-        menu.add_radiobutton(label="Function", command=setFunction)
-    
-        self.interface.valueFrameParts.append(self.tkMenubutton)
+    def rowValues(self):
+        """Returns the text for the value, locked, and type columns of this value's row in the value frame. The text displayed depends on what mode we're in."""
+        return (str(self.value) if self.mode == 'constant' else self.functionText, 'Locked' if self.locked else '', self.mode)
+
+    def cellText(self, column):
+        """Returns the text to start editing the given column of this value's row with, or None if the column can't be edited"""
+        if self.locked:
+            return None
+        elif column == '#0':
+            return self.name
+        elif column == '#1':
+            return self.rowValues()[0]
+
+    def setCell(self, column, text):
+        """Called when the given column of this value's row has been edited in the value frame"""
+        if column == '#0':
+            self.setName(text)
+        elif column == '#1':
+            if self.mode == "constant":
+                self.setValue(float(text))
+            else: #function mode
+                self.setFunction(str(text))
+
+    def toggleLocked(self):
+        """Locks the value if it's unlocked, and vice versa"""
+        self.locked = not self.locked
+        self.redraw()
+
+    def setConstantMode(self):
+        """Makes this value take a constant"""
+        self.mode = 'constant'
+        self.updateTraces()
+        self.redraw()
+
+    def setFunctionMode(self):
+        """Makes this value take a function of time"""
+        self.mode = 'function'
+        self.makeLambda(force = True)
+        self.updateTraces()
+        self.redraw()
+
+    def toggleMode(self):
+        """Switches between constant and function mode"""
+        if self.mode == 'constant':
+            self.setFunctionMode()
+        else:
+            self.setConstantMode()
+
+    def disp(self, parent):
+        """Adds a row for this value to the value frame's treeview, under the given parent row"""
+        self.treeItem = self.interface.valueTree.insert(parent, 'end', text=self.name, values=self.rowValues())
+        self.interface.valueTreeItems[self.treeItem] = self
+
+    def undisp(self):
+        """Removes this value's row from the value frame"""
+        if self.treeItem != None:
+            if self.interface.valueTree.exists(self.treeItem):
+                self.interface.valueTree.delete(self.treeItem)
+            del self.interface.valueTreeItems[self.treeItem]
+            self.treeItem = None
 
-    
     def redraw(self):
-        """Redraw the widgets in the value frame in the same row as it was before"""
-        if self.row != None:
-            self.disp(self.row)
+        """Updates this value's row in the value frame in place"""
+        if (self.treeItem != None) and self.interface.valueTree.exists(self.treeItem):
+            self.interface.valueTree.item(self.treeItem, text=self.name, values=self.rowValues())
   
-    def dragMethod(self, eventObj, trace):
-        """Used for changing the value by dragging the line on the canvas. Needs to know the trace it's attached to because they can have different y scales."""
+    def dragTo(self, y, trace):
+        """Used for changing the value by dragging the line on the canvas; y is the y coordinate it was dragged to, measured from the top of the trace. Needs to know the trace it's attached to because they can have different y scales."""
         if self.mode == "constant":
-            self.setValue(trace.yToValue(eventObj.y))
+            self.setValue(trace.yToValue(y))
     
     def clickMethod(self, eventObj):
         """Used when the line on the canvas is clicked"""
@@ -364,45 +427,47 @@ class ViewValue:
 	        self.merge(iface.toMerge)
 	        iface.mode = 'select'
         elif iface.mode == 'select':
-            for trace in iface.traces:
-	        trace.canvas.bind('<B1-Motion>', lambda eventObj: self.dragMethod(eventObj, trace)) #allow the line on the canvas to be dragged after it's clicked on. Need to let it know which trace it's connected to since they have different y scales
+            trace = iface.traceAt(eventObj) #need to let the drag know which trace was clicked since they have different y scales
+            if (trace != None) and (self.mode == "constant"):
+                iface.drag.begin(eventObj, lambda x, y: self.dragTo(y - trace.yOffset, trace), 'y', trace.dragTag(self)) #allow the line on the canvas to be dragged after it's clicked on
 
-class ViewDuration:
+class ViewDuration(object):
     """The class for a duration drawn on the trace"""
-    def __init__(self, name, startViewTime, endViewTime, assocViewValue, interface, trace, row=None, locked=False):
+    __slots__ = ('name', 'startViewTime', 'endViewTime', 'assocViewValue', 'interface', 'trace', 'locked', 'treeItem')
+
+    def __init__(self, name, startViewTime, endViewTime, assocViewValue, interface, trace, locked=False):
         self.name = name
         self.startViewTime = startViewTime
         self.endViewTime = endViewTime
         self.assocViewValue = assocViewValue
         self.interface = interface
         self.trace = trace
-        self.row = row
         self.locked = locked #when a duration is locked, it cannot be renamed or dragged, but the value and times it's attached to can still be changed
-   
-        self.tkLabel = None
-        self.tkCheck = None
-        self.intVar = Tkinter.IntVar()
-        self.intVar.set(0)
+        self.treeItem = None #the ID of this duration's row in the value frame's treeview; None until it's displayed
 
     def toDict(self):
         """Retrurns a dict that describes this ViewDuration. For use in saving the experiment."""
         return {'name': self.name, 'start': self.startViewTime.name, 'end': self.endViewTime.name, 'value': self.assocViewValue.name, 'trace': self.trace.name, 'locked': self.locked}
     
     def times(self):
-        """Returns an array of the times coverd by this duration: from startTime to endTime in 1ns steps"""
-        return range(self.start(), self.end())
+        """Returns an array of the times coverd by this duration: the sample times of its trace from startTime to endTime"""
+        return self.trace.sampleTimes(self.start(), self.end())
     
     def values(self):
-        """Returns the values this takes at 1ns times from startTime to endTime"""
+        """Returns the values this takes at its trace's sample times from startTime to endTime"""
         return self.assocViewValue.values(self.times())
       
+    def segment(self):
+        """Returns the Segment of the trace covered by this duration"""
+        return Segment(self.start(), self.end(), self.assocViewValue, self.trace.samplePeriod)
+
     def maxValue(self):
-        """Returns the maximum value taken during this duration"""
-        return max(self.values())
+        """Returns the maximum value taken during this duration, or None if it's a function without any samples"""
+        return self.segment().maxValue()
 
     def minValue(self):
-        """Returns the minimum value taken during this duration"""
-        return min(self.values())
+        """Returns the minimum value taken during this duration, or None if it's a function without any samples"""
+        return self.segment().minValue()
     
     def setName(self, name):
         """Sets the duration's name and redraws the value frame."""
@@ -441,32 +506,46 @@ class ViewDuration:
         self.trace.redrawCanvas()
         self.redraw()
   
-    def disp(self, row):
-        """Draws a label in the value frame listing the start time name, end time name, and associated value's name"""
-        self.row = row
-        labelText = self.trace.name + ', ' + self.name + ': ' + self.startViewTime.name + ' ' + self.endViewTime.name + ' ' + self.assocViewValue.name
-    
-        if self.tkLabel != None:
-            self.tkLabel.destroy()
-        if self.tkCheck != None:
-            self.tkCheck.destroy()
-
-        self.tkLabel = ttk.Label(self.interface.valueFrame, text=labelText)
-        self.tkLabel.grid(column=0, row=row, sticky='w', columnspan=2, padx=5, pady=5)
-        self.interface.valueFrameParts.append(self.tkLabel)
-
-        #the checkbox handles locking the value
-        def checkMethod():
-            self.locked = (self.intVar.get() == 1)
-      
-        self.tkCheck = ttk.Checkbutton(self.interface.valueFrame, text='Locked?', command=checkMethod, variable=self.intVar)
-        self.tkCheck.grid(column=2, row=row,sticky='w', padx=5, pady=5)   
-        self.interface.valueFrameParts.append(self.tkCheck)    
-    
+    def rowValues(self):
+        """Returns the text for the value, locked, and type columns of this duration's row in the value frame: the start time name, end time name, and associated value's name"""
+        return (self.startViewTime.name + ' ' + self.endViewTime.name + ' ' + self.assocViewValue.name, 'Locked' if self.locked else '', '')
+
+    def rowText(self):
+        """Returns the text for the name column of this duration's row in the value frame"""
+        return self.trace.name + ', ' + self.name
+
+    def cellText(self, column):
+        """Returns the text to start editing the given column of this duration's row with, or None if the column can't be edited"""
+        if (column == '#0') and not self.locked:
+            return self.name
+
+    def setCell(self, column, text):
+        """Called when the given column of this duration's row has been edited in the value frame"""
+        if column == '#0':
+            self.setName(text)
+
+    def toggleLocked(self):
+        """Locks the duration if it's unlocked, and vice versa"""
+        self.locked = not self.locked
+        self.redraw()
+
+    def disp(self, parent):
+        """Adds a row for this duration to the value frame's treeview, under the given parent row"""
+        self.treeItem = self.interface.valueTree.insert(parent, 'end', text=self.rowText(), values=self.rowValues())
+        self.interface.valueTreeItems[self.treeItem] = self
+
+    def undisp(self):
+        """Removes this duration's row from the value frame"""
+        if self.treeItem != None:
+            if self.interface.valueTree.exists(self.treeItem):
+                self.interface.valueTree.delete(self.treeItem)
+            del self.interface.valueTreeItems[self.treeItem]
+            self.treeItem = None
+
     def redraw(self):
-        """Redraw the widgets in the value frame in the same row as it was before"""    
-        if self.row != None:
-            self.disp(self.row)
+        """Updates this duration's row in the value frame in place"""
+        if (self.treeItem != None) and self.interface.valueTree.exists(self.treeItem):
+            self.interface.valueTree.item(self.treeItem, text=self.rowText(), values=self.rowValues())
   
     def split(self, middleViewTime):
         """Returns the two durations that would result from splitting this duration in to two parts at the time given by middleViewTime"""
@@ -484,9 +563,9 @@ class ViewDuration:
         """Returns the value of the associated value"""
         return self.assocViewValue.value
   
-    def dragMethod(self, eventObj):
-        """Used for changing the value by dragging the line on the canvas"""
-        self.assocViewValue.setValue(self.trace.yToValue(eventObj.y))
+    def dragTo(self, y):
+        """Used for changing the value by dragging the line on the canvas; y is the y coordinate it was dragged to, measured from the top of the trace"""
+        self.assocViewValue.setValue(self.trace.yToValue(y))
     
     def clickMethod(self, eventObj):
         """Used when the line on the canvas is clicked"""
@@ -499,8 +578,9 @@ class ViewDuration:
 	        newValue = ViewValue(iface.nameEntry.get(), self.assocViewValue.value, self.assocViewValue.locked, iface, functionText=self.assocViewValue.functionText, mode=self.assocViewValue.mode)
 	        self.assocViewValue = newValue
 	        iface.values.append(newValue)
+	        newValue.disp('values')
+	        self.redraw()
 	        iface.removeUnusedValues() #in case we replaced the last place this value was in use
-	        iface.redrawValueFrame() #added a new thing to value frame, so need to redraw it from scratch    
 	        iface.mode = 'select'
         elif iface.mode == 'merge':
             if iface.toMerge == None:
@@ -518,7 +598,8 @@ class ViewDuration:
 	            newValue = ViewValue(self.assocViewValue.name + str(count), self.assocViewValue.value, self.assocViewValue.locked, iface, functionText=self.assocViewValue.functionText, mode=self.assocViewValue.mode)
                     iface.values.append(newValue)
 	            self.assocViewValue = newValue
-	            iface.redrawValueFrame() #added a new thing to value frame, so need to redraw it from scratch
+	            newValue.disp('values')
+	            self.redraw()
 	
-            #the folllwing proc and binding allows the duration's value to be changed. We need to bind to the canvas. Binding to the duration's line alone doesn't cut it; the mouse will move off the line before the refresh and it'll stop working.
-            self.trace.canvas.bind('<B1-Motion>', self.dragMethod) #bind the proc to change the value to the canvas
+            #start dragging the duration's line; the value is set when the mouse button is released
+            iface.drag.begin(eventObj, lambda x, y: self.dragTo(y - self.trace.yOffset), 'y', self.trace.dragTag(self))
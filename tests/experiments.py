@@ -0,0 +1,32 @@
+#   The experiment the tests run on, and putting the modules being tested on the path
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from qubit_model import *
+
+def sampleExperimentDict():
+    """Returns a small experiment, as the dict loadExperimentDict takes: a constant trace and a trace with a gaussian pulse, both split at the time t1"""
+    return {'code': 'amp = 0.5\nt1 = 300\n',
+            'timeResolution': 1,
+            'variables': {'scale': 2.0},
+            'times': [{'name': 'start', 'time': 0, 'locked': True},
+                      {'name': 't1', 'time': 200, 'locked': False},
+                      {'name': 'end', 'time': 1000, 'locked': True}],
+            'values': [{'name': 'amp', 'value': 1.0, 'locked': False, 'functionText': '1.0', 'mode': 'constant'},
+                       {'name': 'pulse', 'value': 1.0, 'locked': False, 'functionText': 'scale*amp*gaussian(t, 250e-9, 20e-9)', 'mode': 'function'},
+                       {'name': 'zero', 'value': 0.0, 'locked': False, 'functionText': '1.0', 'mode': 'constant'}],
+            'traces': [{'name': 'xy', 'samplePeriod': 4, 'clockGranularity': 4,
+                        'durations': [{'name': 'a', 'start': 'start', 'end': 't1', 'value': 'zero', 'locked': False},
+                                      {'name': 'b', 'start': 't1', 'end': 'end', 'value': 'pulse', 'locked': False}]},
+                       {'name': 'z',
+                        'durations': [{'name': 'c', 'start': 'start', 'end': 't1', 'value': 'amp', 'locked': False},
+                                      {'name': 'd', 'start': 't1', 'end': 'end', 'value': 'zero', 'locked': False}]}]}
+
+def sampleExperiment():
+    """Returns the sample experiment, loaded"""
+    experiment = Experiment()
+    experiment.loadExperimentDict(sampleExperimentDict())
+    return experiment
@@ -0,0 +1,94 @@
+import os
+import shutil
+import tempfile
+import unittest
+from experiments import *
+from qubit_autosave import *
+
+class AutosaverTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'experiment.autosave')
+        self.experiment = sampleExperiment()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def startSaver(self, compactEvery=200):
+        """Returns a running Autosaver whose snapshots are taken by calling snapshot, rather than by Tk"""
+        saver = Autosaver(self.experiment, self.path, compactEvery=compactEvery)
+        saver.keepPrevious()
+        saver.thread.start()
+        return saver
+
+    def journal(self):
+        f = open(self.path + '.journal', 'r')
+        text = f.read()
+        f.close()
+        return text
+
+    def testReplay(self):
+        saver = self.startSaver()
+        saver.snapshot()
+        self.experiment.setValue('amp', 0.25)
+        saver.snapshot()
+        self.experiment.setTime('t1', 400)
+        self.experiment.code = 'amp = 0.75\n'
+        saver.stop()
+        self.assertEqual(saver.error, None)
+        self.assertNotEqual(self.journal(), '')
+        self.assertEqual(loadAutosave(self.path), self.experiment.toDict())
+
+    def testNothingSaved(self):
+        self.assertEqual(loadAutosave(self.path), None)
+
+    def testCompacts(self):
+        saver = self.startSaver(compactEvery=2)
+        saver.snapshot()
+        for amp in [0.1, 0.2, 0.3]:
+            self.experiment.setValue('amp', amp)
+            saver.snapshot()
+        saver.stop()
+        self.assertEqual(saver.generation, 2) #the first save, and the one after the second change
+        self.assertEqual(loadAutosave(self.path), self.experiment.toDict())
+
+    def testOldJournalIgnored(self):
+        #as if the program stopped after writing a new save but before emptying the journal
+        saver = self.startSaver()
+        saver.snapshot()
+        self.experiment.setValue('amp', 0.25)
+        saver.snapshot()
+        saver.stop()
+        oldJournal = self.journal()
+        self.experiment.setValue('amp', 0.5)
+        saver.compact(experimentRecords(self.experiment.toDict()))
+        f = open(self.path + '.journal', 'w')
+        f.write(oldJournal)
+        f.close()
+        self.assertEqual(loadAutosave(self.path)['values'][0]['value'], 0.5)
+
+    def testPartlyWrittenChange(self):
+        saver = self.startSaver()
+        saver.snapshot()
+        self.experiment.setValue('amp', 0.25)
+        saver.snapshot()
+        saver.stop()
+        f = open(self.path + '.journal', 'a')
+        f.write('--- {generation: 1, key: [values, amp], record: {name: amp, val') #cut off part way through
+        f.close()
+        self.assertEqual(loadAutosave(self.path), self.experiment.toDict())
+
+    def testKeepsPrevious(self):
+        saver = self.startSaver()
+        saver.snapshot()
+        saver.stop()
+        previous = self.experiment.toDict()
+        self.experiment.setValue('amp', 0.25)
+        saver = self.startSaver()
+        saver.snapshot()
+        saver.stop()
+        self.assertEqual(loadAutosave(previousAutosavePath(self.path)), previous)
+        self.assertEqual(loadAutosave(self.path), self.experiment.toDict())
+
+if __name__ == '__main__':
+    unittest.main()
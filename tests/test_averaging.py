@@ -0,0 +1,65 @@
+import unittest
+import numpy
+from experiments import *
+from qubit_averaging import *
+
+def noisyShots(signal, noise, seed=0):
+    """Returns an acquire function for AdaptiveAveraging.average that takes shots scattered around signal"""
+    random = numpy.random.RandomState(seed)
+    def acquire(count):
+        return signal + noise*random.standard_normal((count,) + numpy.shape(signal))
+    return acquire
+
+class RunningStatsTest(unittest.TestCase):
+    def testMatchesNumpy(self):
+        shots = numpy.random.RandomState(1).standard_normal((250, 2))
+        stats = RunningStats()
+        stats.addShots(shots[:100])
+        stats.addShots(shots[100:])
+        for shot in shots[:10]:
+            stats.add(shot)
+        everything = numpy.concatenate([shots, shots[:10]])
+        self.assertEqual(stats.count, 260)
+        self.assertTrue(numpy.allclose(stats.mean, everything.mean(axis=0)))
+        self.assertTrue(numpy.allclose(stats.variance(), everything.var(axis=0, ddof=1)))
+
+    def testTooFewShots(self):
+        stats = RunningStats()
+        stats.add(1.0)
+        self.assertEqual(stats.standardError(), None)
+
+class AdaptiveAveragingTest(unittest.TestCase):
+    def testStopsAtTarget(self):
+        point = AdaptiveAveraging(0.05, 10000, batchShots=100).average(noisyShots(0.3, 1.0))
+        self.assertTrue(point.converged)
+        self.assertTrue(point.standardError <= 0.05)
+        self.assertTrue(point.shots < 10000)
+        self.assertEqual(point.shots % 100, 0) #it only stops between batches
+
+    def testQuietPointsStopSooner(self):
+        averaging = AdaptiveAveraging(0.05, 10000, batchShots=100)
+        self.assertTrue(averaging.average(noisyShots(0.3, 0.5)).shots < averaging.average(noisyShots(0.3, 2.0)).shots)
+
+    def testStopsAtMaxShots(self):
+        point = AdaptiveAveraging(0.001, 450, batchShots=100).average(noisyShots(0.3, 1.0))
+        self.assertFalse(point.converged)
+        self.assertEqual(point.shots, 450)
+
+    def testZeroTarget(self):
+        self.assertEqual(AdaptiveAveraging(0, 300, batchShots=100).average(noisyShots(0.3, 1.0)).shots, 300)
+
+    def testMinShots(self):
+        self.assertEqual(AdaptiveAveraging(1.0, 1000, batchShots=10, minShots=200).average(noisyShots(0.3, 0.1)).shots, 200)
+        self.assertRaises(ValueError, AdaptiveAveraging, 0.1, 1000, 10, 1)
+
+    def testNoShots(self):
+        self.assertRaises(ValueError, AdaptiveAveraging(0.05, 1000).average, lambda count: numpy.zeros(0))
+
+    def testLargestErrorOfArrays(self):
+        #the quiet channel alone would stop after the first batch; the noisy one keeps it going
+        point = AdaptiveAveraging(0.05, 10000, batchShots=100).average(noisyShots(numpy.array([0.3, 0.3]), numpy.array([0.1, 1.0])))
+        self.assertTrue(point.shots > 100)
+        self.assertTrue(numpy.max(point.standardError) <= 0.05)
+
+if __name__ == '__main__':
+    unittest.main()
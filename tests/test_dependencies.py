@@ -0,0 +1,40 @@
+import unittest
+from experiments import *
+
+class InvalidateTest(unittest.TestCase):
+    def setUp(self):
+        self.experiment = sampleExperiment()
+
+    def pulsePeak(self):
+        """Returns the largest sample of the pulse on the xy trace, as compiled"""
+        return max(self.experiment.compileTraces()['xy'][1][3])
+
+    def testVariable(self):
+        before = self.pulsePeak()
+        self.experiment.variables['scale'] = 4.0
+        stale = self.experiment.invalidate(['scale'])
+        self.assertEqual([v.name for v in stale], ['pulse'])
+        self.assertTrue(self.experiment.valueNamed('pulse').stale)
+        self.assertAlmostEqual(self.pulsePeak(), 2*before)
+
+    def testValue(self):
+        self.assertEqual([v.name for v in self.experiment.invalidate(['amp'])], ['pulse'])
+        self.assertEqual(self.experiment.invalidate(['t1']), [])
+        before = self.pulsePeak()
+        self.experiment.setValue('amp', 0.5)
+        self.assertAlmostEqual(self.pulsePeak(), before/2)
+
+    def testDeleteVariable(self):
+        self.pulsePeak() #makes the pulse's lambda
+        self.experiment.deleteVar('scale')
+        self.assertFalse('scale' in self.experiment.variables)
+        self.assertTrue(self.experiment.valueNamed('pulse').stale)
+        self.assertRaises(NameError, self.experiment.compileTraces) #rather than using the deleted variable's last value
+
+    def testRename(self):
+        self.pulsePeak()
+        self.experiment.valueNamed('amp').setName('height')
+        self.assertTrue(self.experiment.valueNamed('pulse').stale)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,29 @@
+import unittest
+import numpy
+from experiments import *
+from qubit_evaluate import *
+
+class ExtremumTest(unittest.TestCase):
+    def testShortRangeExact(self):
+        narrow = lambda k: numpy.where(k == 517, 5.0, numpy.sin(k*0.01))
+        self.assertEqual(extremum(narrow, 0, 2000), 5.0)
+        self.assertEqual(extremum(narrow, 0, 2000, False), numpy.sin(numpy.arange(2000)*0.01).min())
+
+    def testEmpty(self):
+        self.assertEqual(extremum(numpy.sin, 5, 5), None)
+
+    def testLongRangeFewEvaluations(self):
+        evaluated = []
+        def slow(k): #as if it had to be evaluated one time at a time
+            evaluated.extend(k)
+            return numpy.array([numpy.sin(x*0.1) if x > 100 else 0.0 for x in k])
+        self.assertAlmostEqual(extremum(slow, 0, 500000), 1.0, places=4)
+        self.assertTrue(len(evaluated) < 1000)
+        self.assertEqual(len(evaluated), len(set(evaluated)))
+
+    def testLongRangePeak(self):
+        gaussian = lambda k: numpy.exp(-(k - 300000.3)**2/2e6)
+        self.assertAlmostEqual(extremum(gaussian, 0, 1000000), 1.0, places=6)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import os
+import subprocess
+import sys
+import unittest
+from experiments import *
+
+class ExperimentTest(unittest.TestCase):
+    def setUp(self):
+        self.experiment = sampleExperiment()
+
+    def testCompileConstant(self):
+        self.assertEqual(self.experiment.traceNamed('z').compile(), [('constant', 0, 200, 1.0), ('constant', 200, 1000, 0.0)])
+
+    def testCompileFunction(self):
+        compiled = self.experiment.traceNamed('xy').compile()
+        self.assertEqual(compiled[0], ('constant', 0, 200, 0.0))
+        (kind, start, period, samples) = compiled[1]
+        self.assertEqual((kind, start, period, len(samples)), ('samples', 200, 4, 200))
+        self.assertAlmostEqual(max(samples), 2.0, places=1) #scale*amp at the top of the pulse
+
+    def testCompileTracesMatchesCompile(self):
+        compiled = self.experiment.compileTraces()
+        for trace in self.experiment.traces:
+            self.assertEqual(compiled[trace.name], trace.compile())
+        self.assertEqual(self.experiment.compileTraces([self.experiment.traceNamed('z')]).keys(), ['z'])
+
+    def testFunctionWithoutSamples(self):
+        self.experiment.setTime('t1', 999)
+        self.assertRaises(SequenceError, self.experiment.traceNamed('xy').compile)
+
+    def testExecuteCode(self):
+        self.experiment.executeCode(5)
+        self.assertEqual(self.experiment.timeNamed('t1').time, 300)
+        self.assertEqual(self.experiment.valueNamed('amp').value, 0.5)
+        self.assertEqual(self.experiment.traceNamed('z').compile()[0], ('constant', 0, 300, 0.5))
+
+    def testRoundTrip(self):
+        copy = Experiment()
+        copy.loadExperimentDict(self.experiment.toDict())
+        self.assertEqual(copy.compileTraces(), self.experiment.compileTraces())
+
+class ImportTest(unittest.TestCase):
+    def testWithoutTk(self):
+        #the model can be used without a display, e.g. by the batch runner and the sweep's processes
+        modules = ['qubit_model', 'qubit_sweep', 'qubit_validate', 'qubit_shard', 'qubit_autosave', 'qubit_averaging', 'qubit_cache', 'qubit_batch', 'qubit_shared']
+        check = 'import sys\nsys.modules["Tkinter"] = sys.modules["ttk"] = None\nimport ' + ', '.join(modules) #a None module can't be imported
+        process = subprocess.Popen([sys.executable, '-c', check], cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), stderr=subprocess.PIPE)
+        error = process.communicate()[1]
+        self.assertEqual(process.returncode, 0, error)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import threading
+import unittest
+import numpy
+from experiments import *
+from qubit_pulses import *
+
+class LRUCacheTest(unittest.TestCase):
+    def testBoundedByBytes(self):
+        cache = LRUCache(maxBytes=3*800)
+        for i in range(5):
+            cache.get(i, lambda: numpy.zeros(100)) #800 bytes each
+        self.assertEqual(cache.items.keys(), [2, 3, 4])
+        self.assertEqual(cache.size, 2400)
+        cache.get(2, lambda: None) #now the most recently used
+        cache.get(5, lambda: numpy.zeros(100))
+        self.assertEqual(cache.items.keys(), [4, 2, 5])
+        self.assertEqual((cache.hits, cache.misses), (1, 6))
+
+    def testTooBigToKeep(self):
+        cache = LRUCache(maxBytes=100)
+        self.assertEqual(len(cache.get('big', lambda: numpy.zeros(100))), 100)
+        self.assertEqual((len(cache.items), cache.size), (0, 0))
+
+    def testThreads(self):
+        cache = LRUCache(maxBytes=10*800)
+        errors = []
+        def work(seed):
+            try:
+                for i in numpy.random.RandomState(seed).randint(0, 30, 2000):
+                    self.assertEqual(cache.get(i, lambda: numpy.full(100, i, dtype=float))[0], i)
+            except Exception as err:
+                errors.append(err)
+        threads = [threading.Thread(target=work, args=(seed,)) for seed in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(cache.size, sum(item.nbytes for item in cache.items.values()))
+
+class PulseShapeTest(unittest.TestCase):
+    def setUp(self):
+        envelopeCache.clear()
+
+    def testMatchesScalar(self):
+        t = numpy.arange(0, 100e-9, 1e-9)
+        envelope = pulseShapes['gaussian'](t, 50e-9, 10e-9)
+        self.assertTrue(numpy.allclose(envelope, [pulseShapes['gaussian'](x, 50e-9, 10e-9) for x in t]))
+        self.assertTrue(pulseShapes['gaussian'](t, 50e-9, 10e-9) is envelope) #from the cache
+
+    def testUnevenTimes(self):
+        #same first time, length and first step, but different times after that
+        even = numpy.array([0.0, 1e-9, 2e-9, 3e-9])
+        uneven = numpy.array([0.0, 1e-9, 5e-9, 9e-9])
+        self.assertFalse(numpy.allclose(pulseShapes['gaussian'](even, 0.0, 2e-9), pulseShapes['gaussian'](uneven, 0.0, 2e-9)))
+
+if __name__ == '__main__':
+    unittest.main()
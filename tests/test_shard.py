@@ -0,0 +1,84 @@
+import unittest
+import numpy
+from experiments import *
+from qubit_sweep import *
+from qubit_shard import *
+
+class ArrayManager(FakeManager):
+    """A FakeManager whose data for each point is a numpy array, like a setup that reads out several channels"""
+    def runPoint(self, parameters, uploads, telemetry):
+        return numpy.array([FakeManager.runPoint(self, parameters, uploads, telemetry), 1.0])
+
+class ShardedSweepTest(unittest.TestCase):
+    def setUp(self):
+        self.experiment = sampleExperiment()
+        self.sweep = sweepFromDict(self.experiment, {'axes': [{'parameter': 'amp', 'start': 0.0, 'stop': 1.0, 'steps': 4},
+                                                              {'parameter': 't1', 'points': [100, 200, 300, 400, 500]}]})
+        self.expected = ShardedSweep(self.sweep, [FakeManager('reference')]).run()
+
+    def testMatchesOneWorker(self):
+        workers = [FakeManager('a'), FakeManager('b'), FakeManager('c')]
+        sharded = ShardedSweep(self.sweep, workers)
+        self.assertEqual(sharded.run(), self.expected)
+        self.assertEqual(sum(w.pointsRun for w in workers), 20)
+        self.assertEqual(sharded.inFlight, 0)
+
+    def testNoWorkers(self):
+        self.assertRaises(ValueError, ShardedSweep, self.sweep, [])
+
+    def testWorkerDrops(self):
+        workers = [FakeManager('a', failAfter=1), FakeManager('b', delay=0.01)] #b is slow, so it doesn't steal all of a's points before a fails
+        sharded = ShardedSweep(self.sweep, workers)
+        self.assertEqual(sharded.run(), self.expected) #the other worker picks up its points
+        self.assertEqual(sharded.errors.keys(), [0])
+        self.assertTrue(isinstance(sharded.errors[0], WorkerDropped))
+        self.assertEqual(sharded.inFlight, 0)
+
+    def testEveryWorkerDrops(self):
+        sharded = ShardedSweep(self.sweep, [FakeManager('a', failAfter=2), FakeManager('b', failAfter=2)])
+        self.assertRaises(SweepFailed, sharded.run)
+        self.assertEqual(len(sharded.results), 4)
+        self.assertEqual(sharded.inFlight, 0)
+        self.assertTrue(sharded.telemetry.finished)
+
+    def testCompileFails(self):
+        #a point that can't be compiled drops each worker that tries it, rather than hanging the sweep
+        self.experiment.valueNamed('pulse').functionText = 'scale/(amp - 0.5)'
+        sweep = Sweep(self.experiment, [SweepAxis(self.experiment.valueNamed('amp'), [0.0, 0.5, 1.0])])
+        sharded = ShardedSweep(sweep, [FakeManager('a'), FakeManager('b')])
+        self.assertRaises(SweepFailed, sharded.run)
+        self.assertEqual(sorted(sharded.results), [(0,), (2,)])
+        self.assertEqual(sorted(sharded.errors), [0, 1])
+        self.assertTrue(all(isinstance(e, ZeroDivisionError) for e in sharded.errors.values()))
+        self.assertEqual(sharded.inFlight, 0)
+
+    def testSequenceErrorBeforeRunning(self):
+        worker = FakeManager('a')
+        sweep = Sweep(self.experiment, [SweepAxis(self.experiment.timeNamed('t1'), [100, 1200])])
+        self.assertRaises(SequenceError, ShardedSweep(sweep, [worker]).run)
+        self.assertEqual(worker.pointsRun, 0)
+
+    def testCache(self):
+        cache = ResultCache()
+        first = ShardedSweep(self.sweep, [ArrayManager('a'), ArrayManager('b')], cache=cache, settings={'repetitions': 100})
+        data = first.run()
+        self.assertEqual(len(first.cached), 0)
+        workers = [ArrayManager('a'), ArrayManager('b')]
+        again = ShardedSweep(self.sweep, workers, cache=cache, settings={'repetitions': 100})
+        self.assertEqual([(p, d.tolist()) for (p, d) in again.run()], [(p, d.tolist()) for (p, d) in data])
+        self.assertEqual(len(again.cached), 20)
+        self.assertEqual(sum(w.pointsRun for w in workers), 0)
+        other = ShardedSweep(self.sweep, [ArrayManager('a')], cache=cache, settings={'repetitions': 200})
+        other.run()
+        self.assertEqual(len(other.cached), 0)
+
+    def testAveraging(self):
+        workers = [FakeManager('a', noise=0.1), FakeManager('b', noise=0.1)]
+        sharded = ShardedSweep(self.sweep, workers, averaging=AdaptiveAveraging(0.02, 1000, batchShots=50))
+        for (point, data) in sharded.run():
+            self.assertTrue(isinstance(data, AveragedPoint))
+            self.assertTrue(data.converged)
+            self.assertTrue(data.standardError <= 0.02)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+import numpy
+from experiments import *
+from qubit_shard import *
+from qubit_shared import *
+
+class ChannelManager(FakeManager):
+    """A FakeManager whose data for each point is one number per readout channel"""
+    def runPoint(self, parameters, uploads, telemetry):
+        return numpy.array([FakeManager.runPoint(self, parameters, uploads, telemetry) % 7, 1.0])
+
+class UnplottableManager(FakeManager):
+    """A FakeManager whose data can't be turned in to a number"""
+    def runPoint(self, parameters, uploads, telemetry):
+        FakeManager.runPoint(self, parameters, uploads, telemetry)
+        return 'raw'
+
+def makeChannelManagers():
+    return [ChannelManager('a'), ChannelManager('b')]
+
+def makeUnplottableManagers():
+    return [UnplottableManager('a')]
+
+class PointValueTest(unittest.TestCase):
+    def testNumber(self):
+        self.assertEqual(pointValue(3), 3.0)
+
+    def testChannels(self):
+        self.assertEqual(pointValue(numpy.array([1.0, 3.0])), 2.0)
+
+    def testAveragedPoint(self):
+        self.assertEqual(pointValue(AveragedPoint(numpy.array([1.0, 2.0]), numpy.array([0.1, 0.1]), 100, True)), 1.5)
+
+class AcquisitionTest(unittest.TestCase):
+    def setUp(self):
+        self.experiment = sampleExperiment()
+        self.sweep = sweepFromDict(self.experiment, {'axes': [{'parameter': 'amp', 'start': 0.0, 'stop': 1.0, 'steps': 3},
+                                                              {'parameter': 't1', 'points': [100, 200, 300, 400]}]})
+
+    def acquire(self, makeWorkers):
+        (dataset, process) = startAcquisition(self.sweep, makeWorkers)
+        process.join(30)
+        return dataset
+
+    def testChannels(self):
+        dataset = self.acquire(makeChannelManagers)
+        self.assertEqual(dataset.state.value, SharedDataset.done)
+        expected = numpy.zeros(self.sweep.shape())
+        for (point, data) in ShardedSweep(self.sweep, makeChannelManagers()).run():
+            expected[point] = numpy.mean(data)
+        self.assertTrue(numpy.array_equal(dataset.data, expected))
+
+    def testUnplottable(self):
+        dataset = self.acquire(makeUnplottableManagers)
+        self.assertEqual(dataset.state.value, SharedDataset.done)
+        self.assertTrue(numpy.isnan(dataset.data).all())
+        self.assertTrue('12 points could not be plotted' in dataset.statusText())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+from experiments import *
+from qubit_sweep import *
+
+class SnakeOrderTest(unittest.TestCase):
+    def testEveryPointOnce(self):
+        for sizes in [[5], [3, 4], [2, 3, 4], [1, 5], [4, 1, 2]]:
+            order = snakeOrder(sizes)
+            self.assertEqual(sorted(order), nestedOrder(sizes))
+
+    def testOneIndexChangesByOne(self):
+        order = snakeOrder([3, 4, 2])
+        for (a, b) in zip(order, order[1:]):
+            steps = [abs(i - j) for (i, j) in zip(a, b)]
+            self.assertEqual(sorted(steps), [0, 0, 1])
+
+    def testTurnsAround(self):
+        self.assertEqual(snakeOrder([2, 3]), [(0, 0), (0, 1), (0, 2), (1, 2), (1, 1), (1, 0)])
+
+    def testEmpty(self):
+        self.assertEqual(snakeOrder([3, 0]), [])
+        self.assertEqual(snakeOrder([]), [()])
+
+class SweepTest(unittest.TestCase):
+    def setUp(self):
+        self.experiment = sampleExperiment()
+        self.sweep = sweepFromDict(self.experiment, {'axes': [{'parameter': 'amp', 'start': 0.0, 'stop': 1.0, 'steps': 3},
+                                                              {'parameter': 't1', 'points': [100, 200, 300, 400]}]})
+
+    def testShape(self):
+        self.assertEqual(self.sweep.shape(), (3, 4))
+
+    def testTouchedTraces(self):
+        self.assertEqual(sorted(t.name for t in self.sweep.touchedTraces(self.sweep.axes[0])), ['xy', 'z']) #amp is in the pulse too
+        self.assertEqual(sorted(t.name for t in self.sweep.touchedTraces(self.sweep.axes[1])), ['xy', 'z'])
+
+    def testScheduleCoversEveryPoint(self):
+        for optimize in (True, False):
+            self.assertEqual(sorted(self.sweep.schedule(optimize)), nestedOrder(self.sweep.shape()))
+
+    def testOptimizedUploadsFewer(self):
+        optimized = self.sweep.schedule(True).predictedUploads()
+        nested = self.sweep.schedule(False).predictedUploads()
+        self.assertEqual(optimized['points'], 12)
+        self.assertTrue(optimized['traceUploads'] <= nested['traceUploads'])
+
+    def testChangedAxes(self):
+        schedule = self.sweep.schedule(True)
+        self.assertEqual(schedule.changedAxes(0), [0, 1])
+        for step in range(1, len(schedule)):
+            self.assertEqual(len(schedule.changedAxes(step)), 1)
+
+if __name__ == '__main__':
+    unittest.main()
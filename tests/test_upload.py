@@ -0,0 +1,46 @@
+import time
+import unittest
+from experiments import *
+from qubit_upload import *
+from qubit_shard import *
+
+class ParallelUploaderTest(unittest.TestCase):
+    def setUp(self):
+        self.boards = [FakeBoard('a', 0.1), FakeBoard('b', 0.1), FakeBoard('c', 0.1, failOn='z2')]
+        self.uploader = ParallelUploader({'x': self.boards[0], 'y': self.boards[1], 'z1': self.boards[2], 'z2': self.boards[2]})
+
+    def tearDown(self):
+        self.uploader.close()
+
+    def testAllAtOnce(self):
+        start = time.time()
+        self.uploader.upload({'x': [1], 'y': [2], 'z1': [3]})
+        self.assertTrue(time.time() - start < 0.25) #about as long as one board, not three
+        self.assertEqual([b.loaded for b in self.boards], [{'x': [1]}, {'y': [2]}, {'z1': [3]}])
+
+    def testFailure(self):
+        try:
+            self.uploader.upload({'x': [1], 'z1': [3], 'z2': [4]})
+        except UploadFailed as err:
+            self.assertEqual(err.errors.keys(), ['c'])
+        else:
+            self.fail('UploadFailed not raised')
+        self.assertEqual(self.boards[0].loaded, {'x': [1]}) #the other boards still get theirs
+
+    def testUnknownTrace(self):
+        self.assertRaises(UploadFailed, self.uploader.upload, {'w': [1]})
+
+class FakeSetupsTest(unittest.TestCase):
+    def testBoards(self):
+        experiment = sampleExperiment()
+        sweep = sweepFromDict(experiment, {'axes': [{'parameter': 'amp', 'start': 0.0, 'stop': 1.0, 'steps': 4}]})
+        expected = ShardedSweep(sweep, FakeSetups(1)()).run()
+        workers = FakeSetups(2, boards={'xy': 'first', 'z': 'second'})()
+        self.assertEqual(ShardedSweep(sweep, workers).run(), expected)
+        for worker in workers:
+            self.assertEqual(sorted(worker.uploader.boards), ['xy', 'z'])
+            self.assertEqual(sorted(worker.uploader.histograms), ['first', 'second'])
+            self.assertTrue(all(h.count > 0 for h in worker.uploader.histograms.values()))
+
+if __name__ == '__main__':
+    unittest.main()
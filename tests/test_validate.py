@@ -0,0 +1,57 @@
+import unittest
+from experiments import *
+from qubit_sweep import *
+from qubit_validate import *
+
+class SequenceValidatorTest(unittest.TestCase):
+    def setUp(self):
+        self.experiment = sampleExperiment()
+
+    def sweepOver(self, name, points):
+        return Sweep(self.experiment, [SweepAxis(parameterNamed(self.experiment, name), points)])
+
+    def checks(self, sweep=None):
+        """Returns (check, where, count, firstPoint) for each violation"""
+        return sorted((v.check, v.where, v.count, v.firstPoint) for v in SequenceValidator(self.experiment, sweep).validate())
+
+    def testFine(self):
+        self.assertEqual(self.checks(), [])
+        self.assertEqual(self.checks(self.sweepOver('t1', [100, 200, 300])), [])
+        SequenceValidator(self.experiment).check()
+
+    def testOrder(self):
+        found = self.checks(self.sweepOver('t1', [100, 1200]))
+        self.assertTrue(('order', 't1 < end', 1, (1,)) in found)
+        self.assertEqual(set(v[3] for v in found), set([(1,)])) #the durations after t1 go backwards there too
+
+    def testGranularity(self):
+        found = self.checks(self.sweepOver('t1', [100, 102, 104]))
+        self.assertEqual(found, [('granularity', 'xy/a', 1, (1,)), ('granularity', 'xy/b', 1, (1,))])
+
+    def testMinDuration(self):
+        self.experiment.traceNamed('z').minDuration = 150
+        self.assertEqual(self.checks(self.sweepOver('t1', [100, 200])), [('duration', 'z/c', 1, (0,))])
+
+    def testSamples(self):
+        #the pulse from t1 to the end has no 4 ns sample times once t1 is past 996
+        sweep = self.sweepOver('t1', [996, 997, 999])
+        found = [v for v in self.checks(sweep) if v[0] == 'samples']
+        self.assertEqual(found, [('samples', 'xy/b', 2, (1,))])
+        for (i, t1) in enumerate(sweep.axes[0].points): #it agrees with compiling each point
+            sweep.axes[0].apply(i)
+            if i == 0:
+                self.experiment.traceNamed('xy').compile()
+            else:
+                self.assertRaises(SequenceError, self.experiment.traceNamed('xy').compile)
+
+    def testAmplitude(self):
+        self.experiment.traceNamed('xy').maxAmplitude = 1.5
+        found = self.checks(self.sweepOver('amp', [0.5, 0.7, 1.0]))
+        self.assertEqual(found, [('amplitude', 'xy/b', 1, (2,))]) #the pulse peaks at scale*amp
+
+    def testCheckRaises(self):
+        self.experiment.traceNamed('z').maxAmplitude = 0.5
+        self.assertRaises(SequenceError, SequenceValidator(self.experiment).check)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+import unittest
+from experiments import *
+
+class FakeTree:
+    """Stands in for the value frame's ttk.Treeview, giving the box of every cell that's in view"""
+    def __init__(self, inView):
+        self.inView = inView
+
+    def bbox(self, item, column):
+        return (10, 20 * self.inView.index(item), 100, 20) if item in self.inView else ''
+
+class CellEditorTest(unittest.TestCase):
+    def setUp(self):
+        self.experiment = sampleExperiment()
+        self.tree = FakeTree(['t1', 'amp'])
+
+    def testPlace(self):
+        self.assertEqual(cellEditorPlace(self.tree, 't1', '#1', self.experiment.timeNamed('t1')), ('200', 10, 0, 100, 20))
+        self.assertEqual(cellEditorPlace(self.tree, 'amp', '#0', self.experiment.valueNamed('amp')), ('amp', 10, 20, 100, 20))
+
+    def testOutOfView(self):
+        self.assertEqual(cellEditorPlace(self.tree, 'pulse', '#1', self.experiment.valueNamed('pulse')), None)
+
+    def testLocked(self):
+        self.assertEqual(cellEditorPlace(FakeTree(['start']), 'start', '#1', self.experiment.timeNamed('start')), None)
+
+    def testEdit(self):
+        value = self.experiment.valueNamed('amp')
+        text = cellEditorPlace(self.tree, 'amp', '#1', value)[0]
+        value.setCell('#1', text + '5')
+        self.assertEqual(value.value, 1.05)
+
+if __name__ == '__main__':
+    unittest.main()